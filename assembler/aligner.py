@@ -7,14 +7,39 @@ import os.path
 from sys import stderr, stdout, exit
 from collections import defaultdict
 import copy
+import bisect
 from typing import Union 
+import numpy as np
 import assembler.helpers as helpers
 
 from bdsg.bdsg import PackedGraph
-from assembler.anchor import Anchor
+from assembler.anchor import Anchor, assign_anchor_ids
 from assembler.node import Node
 from assembler.constants import *
 from assembler.anchor_coverage import AnchorCoverage
+from assembler.flat_dictionary import FlatAnchorDictionary
+from assembler.read_bitsets import ReadBitset, ReadInterner
+from assembler.parallel import map_on_fork, split_in_chunks
+from assembler.compatibility_cache import SnarlPairCache, are_partitions_compatible
+from assembler.snapshot import AnchorSnapshot, SnarlSnapshot
+from assembler.snarl_order import OrderedSnarlList
+from assembler.cs_avail import CsAvailability
+from assembler.chain_index import UnitigChainIndex, TopologyGraph
+from assembler.drop_log import ReadDropLog
+from assembler.merge_worklist import SnarlAdjacency, MergeWorklist
+
+
+def shard_overlaps_node_range(shard: dict, min_node_id: int, max_node_id: int) -> bool:
+    """
+    Whether one of the node id intervals of a shard of the manifest overlaps [min_node_id, max_node_id].
+    Manifests written before the intervals existed only have the node id range of the shard, which is used as its only interval.
+    """
+    if "node_id_interval_starts" not in shard:
+        shard.setdefault("node_id_intervals", [[shard["min_node_id"], shard["max_node_id"]]])
+        shard["node_id_interval_starts"] = [start for start, _ in shard["node_id_intervals"]]
+    # the intervals are sorted and disjoint: the last one starting at or before max_node_id is the only one that can overlap the range
+    interval_idx = bisect.bisect_right(shard["node_id_interval_starts"], max_node_id) - 1
+    return interval_idx >= 0 and shard["node_id_intervals"][interval_idx][1] >= min_node_id
 
 
 class AlignAnchor:
@@ -34,8 +59,10 @@ class AlignAnchor:
         self.next_handle_expand_boundary = None
         self.node_orientations_in_anchor_for_read1 = []
         self.anchor_coverage = AnchorCoverage()  # Add coverage tracking
-        self.anchor_read_tracking_dict = {} # Add coverage tracking for anchors
+        self.read_drop_log = ReadDropLog()   # reads dropped by the boundary extension, dumped as the anchor reads tracker
+        self.read_drops_out_file_path = None   # where the read drop events are also written one per line, if set
         self.independent_anchor_extension_tracking_dict = {}  # For independent anchor extension
+        self.before_extension_snapshot = {}   # {snarl_id: SnarlSnapshot}, see snapshot_before_extension
         ## For phasing consistency check
         self.reliable_snarls = []
         self.snarl_variant_type_dict = {}
@@ -45,30 +72,192 @@ class AlignAnchor:
         self.linked_snarls_compatibility_dict = {}   # {snarl_id: {linked_snarl_id1: True/False, linked_snarl_id2: True/False, ...}}
         self.snarl_common_reads_dict = {}
         self.snarl_read_partitions_dict = {} # {primary_snarl: {other_snarl: {"primary": [...], "other": [...]}}}
+        # inverted index of the valid anchors, see build_read_to_snarl_index
+        self.read_interner = ReadInterner()
+        self.read_to_snarl_anchors = []   # [[(snarl_id, anchor_idx), ...] for each interned read]
+        self.snarl_anchor_read_bitsets = {}   # {snarl_id: [ReadBitset of each anchor of the snarl]}
+        self.snarl_read_bitsets = {}   # {snarl_id: ReadBitset of all the reads of the snarl}
+        self.snarl_sort_positions = {}   # {snarl_id: position in snarl_ids_sorted}
+        self.threads = 1
+        # linkage mode of the reliable snarl detection: "reads" walks the read index, "window" compares each snarl with the snarls within a read length on the reference (build_snarl_windows)
+        self.linkage_mode = "reads"
+        # where find_reliable_snarls stores the SnarlPairCache, if set
+        self.snarl_pairs_out_file_path = None
+        self.max_read_length = 0
+        self.window_snarl_ids = []   # snarls placed on the reference, sorted by (chromosome, position)
+        self.snarl_window_ranges = {}   # {snarl_id: (start, end) of its window in window_snarl_ids}
+        self.unplaced_snarl_ids = []
         # for extended snarls
         self.extended_snarl_coverage_dict = {}
         self.extended_snarl_allelic_coverage_dict = {}
+        # sharded dictionary: shards listed in the manifest are loaded only when an alignment touches their node range
+        self.dictionary_shards = []
+        self.loaded_shards = set()
+        # topology stored by vg_anchor build next to the dictionary (prefix.topology.npz, listed in the manifest of sharded dictionaries), which replaces the graph once the alignments are matched (release_graph)
+        self.packed_graph_path = None
+        self.topology_path = None
+        # id given to the next anchor created by merging, see extend_and_merge_snarls
+        self.next_anchor_id = 0
 
-    def build(self, dict_path: str, packed_graph_path: str) -> None:
+    def build(self, dict_path: str, packed_graph_path: str, shared_dictionary_name: str = None) -> None:
 
         # loading dictionary
-        with open(dict_path, 'rb') as in_f:
-            self.sentinel_to_anchor = pickle.load(in_f)
+        if shared_dictionary_name is not None:
+            # attached to the copy held by vg_anchor share-dict; the anchors and their read lists are built when a sentinel is first hit
+            self.sentinel_to_anchor = FlatAnchorDictionary.attach(shared_dictionary_name)
+            print(f"Attached to the shared dictionary {shared_dictionary_name} ({len(self.sentinel_to_anchor)} sentinels)", file=stderr)
+        elif dict_path.endswith(".json"):
+            with open(dict_path) as in_f:
+                manifest = json.load(in_f)
+            self.dictionary_shards = manifest["shards"]
+            print(f"Dictionary manifest with {len(self.dictionary_shards)} shards loaded", file=stderr)
+            # merged topology of the shards, missing from manifests written before it existed
+            topology_path = manifest.get("topology")
+            if topology_path is not None and os.path.exists(topology_path):
+                self.topology_path = topology_path
+        else:
+            with open(dict_path, 'rb') as in_f:
+                self.sentinel_to_anchor = pickle.load(in_f)
+            # dictionaries built before the anchor ids existed
+            assign_anchor_ids(self.sentinel_to_anchor)
+            topology_path = os.path.splitext(dict_path)[0] + ".topology.npz"
+            if os.path.exists(topology_path):
+                self.topology_path = topology_path
 
         #loading packedgraph
         self.graph.deserialize(packed_graph_path)
+        self.packed_graph_path = packed_graph_path
 
         # initializing output dictionary
-        for sentinel, anchors in self.sentinel_to_anchor.items():
-            self.anchor_reads_dict[sentinel] = [[] for _ in range(len(anchors))]
+        if shared_dictionary_name is None:
+            for sentinel, anchors in self.sentinel_to_anchor.items():
+                self.anchor_reads_dict[sentinel] = [[] for _ in range(len(anchors))]
+
+    def load_shards_for_nodes(self, node_ids: list) -> None:
+        """
+        Loads the dictionary shards with a node id interval overlapping the range of the given nodes and that were not loaded yet.
+        The anchors of a shard are merged into sentinel_to_anchor. An anchor already present from another shard (same index, different path prefix) only gets its reference paths updated.
+
+        Parameters
+        ----------
+        node_ids : list
+            The node ids of an alignment path
+        """
+        min_node_id, max_node_id = min(node_ids), max(node_ids)
+        for shard in self.dictionary_shards:
+            if shard["shard_id"] in self.loaded_shards or not shard_overlaps_node_range(shard, min_node_id, max_node_id):
+                continue
+            t0 = time.time()
+            with open(shard["dictionary"], 'rb') as in_f:
+                shard_sentinel_to_anchor = pickle.load(in_f)
+            assign_anchor_ids(shard_sentinel_to_anchor, shard["shard_id"] * SHARD_SNARL_ID_OFFSET)
+            for sentinel, anchors in shard_sentinel_to_anchor.items():
+                if sentinel not in self.sentinel_to_anchor:
+                    self.sentinel_to_anchor[sentinel] = anchors
+                    self.anchor_reads_dict[sentinel] = [[] for _ in range(len(anchors))]
+                    continue
+                for anchor in anchors:
+                    for inserted_anchor in self.sentinel_to_anchor[sentinel]:
+                        if anchor == inserted_anchor:
+                            inserted_anchor.reference_paths_covered.extend(anchor.reference_paths_covered)
+                            break
+                    else:
+                        self.sentinel_to_anchor[sentinel].append(anchor)
+                        self.anchor_reads_dict[sentinel].append([])
+            self.loaded_shards.add(shard["shard_id"])
+            print(f"Dictionary shard {shard['shard_id']} ({len(shard_sentinel_to_anchor)} sentinels) loaded in {time.time()-t0:.2f}", file=stderr)
 
         # for sentinel in self.sentinel_to_anchor:
         #     print(f"S_T_A {sentinel} = {self.sentinel_to_anchor[sentinel]}")
         #     break
 
+    def release_graph(self) -> bool:
+        """
+        Replaces the PackedGraph with a TopologyGraph on the topology stored by vg_anchor build, once the alignments are matched: the anchor extension only needs the lengths, degrees and degree 1 neighbors of the nodes around the snarl boundaries.
+        The PackedGraph is loaded again only if the extension reaches a node missing from the topology.
+
+        Returns
+        -------
+        bool
+            True if the graph was released, False if there is no topology for the dictionary
+        """
+        if self.topology_path is None or isinstance(self.graph, TopologyGraph):
+            return False
+        t0 = time.time()
+        topology = UnitigChainIndex.load(self.topology_path)
+        self.graph = TopologyGraph(topology, self.packed_graph_path)
+        print(f"Graph released, anchor extension runs on the topology of {len(topology.node_rows)} nodes loaded in {time.time()-t0:.2f}", file=stderr)
+        return True
+
     def readFasta(self, fasta_path: str) -> None:
         self.fasta_path = fasta_path
 
+    def dump_checkpoint(self, out_file_path: str) -> None:
+        """
+        Stores the state left by the matching of the alignments (processGafLine), so that the post-processing (dump_valid_anchors) can be run again from it with load_checkpoint, without reading the GAF.
+        Only the sentinels with matched reads are stored, in the order of sentinel_to_anchor: their anchors, with the reads matched to them, and their read lists. The counters, the longest read length and the anchor coverage are stored too.
+        The file is written under a temporary name and then moved, so that a crash never leaves a partial checkpoint.
+
+        Parameters
+        ----------
+        out_file_path : string
+            Path of the checkpoint (.checkpoint.pkl)
+        """
+        t0 = time.time()
+        matched_sentinels = []
+        for sentinel in self.sentinel_to_anchor:
+            anchor_reads = self.anchor_reads_dict.get(sentinel)
+            if anchor_reads is not None and any(len(reads) > 0 for reads in anchor_reads):
+                matched_sentinels.append((sentinel, self.sentinel_to_anchor[sentinel], anchor_reads))
+        checkpoint = {
+            "version": CHECKPOINT_VERSION,
+            "matched_sentinels": matched_sentinels,
+            "reads_matching_anchor_path": self.reads_matching_anchor_path,
+            "reads_matching_anchor_sequence": self.reads_matching_anchor_sequence,
+            "max_read_length": self.max_read_length,
+            "anchor_coverage": self.anchor_coverage,
+            "topology_path": self.topology_path,
+        }
+        tmp_path = f"{out_file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as out_f:
+            pickle.dump(checkpoint, out_f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, out_file_path)
+        print(f"Checkpoint of {len(matched_sentinels)} matched sentinels written to {out_file_path} in {time.time()-t0:.2f}", file=stderr)
+
+    def load_checkpoint(self, checkpoint_path: str, packed_graph_path: str) -> None:
+        """
+        Restores the state stored by dump_checkpoint, in place of build and the matching of the alignments. sentinel_to_anchor then holds only the matched sentinels, the only ones dump_valid_anchors uses.
+        The graph is not deserialized if the topology stored by vg_anchor build is still available, the extension then runs on it (see release_graph).
+
+        Parameters
+        ----------
+        checkpoint_path : string
+            Path of the checkpoint written by dump_checkpoint
+        packed_graph_path : string
+            Path of the packedGraph the alignments were matched on
+        """
+        t0 = time.time()
+        with open(checkpoint_path, "rb") as in_f:
+            checkpoint = pickle.load(in_f)
+        if checkpoint.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"{checkpoint_path} is not a checkpoint of this version (found {checkpoint.get('version')}, expected {CHECKPOINT_VERSION}), run get-anchors on the alignments again")
+        self.sentinel_to_anchor = {}
+        self.anchor_reads_dict = {}
+        for sentinel, anchors, anchor_reads in checkpoint["matched_sentinels"]:
+            self.sentinel_to_anchor[sentinel] = anchors
+            self.anchor_reads_dict[sentinel] = anchor_reads
+        self.reads_matching_anchor_path = checkpoint["reads_matching_anchor_path"]
+        self.reads_matching_anchor_sequence = checkpoint["reads_matching_anchor_sequence"]
+        self.max_read_length = checkpoint["max_read_length"]
+        self.anchor_coverage = checkpoint["anchor_coverage"]
+
+        self.packed_graph_path = packed_graph_path
+        topology_path = checkpoint["topology_path"]
+        self.topology_path = topology_path if topology_path is not None and os.path.exists(topology_path) else None
+        if self.topology_path is None:
+            self.graph.deserialize(packed_graph_path)
+        print(f"Checkpoint of {len(self.sentinel_to_anchor)} matched sentinels loaded from {checkpoint_path} in {time.time()-t0:.2f}", file=stderr)
+
     def ingest(self, dictionary: dict, packed_graph_path: str) -> None:
         self.sentinel_to_anchor = dictionary
         self.graph.deserialize(packed_graph_path)
@@ -77,7 +266,7 @@ class AlignAnchor:
             self.anchor_reads_dict[sentinel] = [[] for _ in range(len(anchors))]
 
 
-    def _extending_anchors_by_merging(self, snarl_ids_sorted_list_up_to_date, snarl_ids_sorted_list_iterator_idx, current_snarl_id, other_snarl_id, current_snarl_anchors, extend_left, anchors_to_discard, snarl_orientation, merging_round) -> list:
+    def _extending_anchors_by_merging(self, snarl_order, current_snarl_id, other_snarl_id, current_snarl_anchors, extend_left, anchors_to_discard, snarl_orientation, merging_round) -> list:
         """
         Attempts to merge anchors from two adjacent snarls. This function is called when we want to combine anchors
         from neighboring snarls to create longer, more robust anchors.
@@ -90,10 +279,8 @@ class AlignAnchor:
 
         Parameters
         ----------
-        snarl_ids_sorted_list_up_to_date : list
-            List of all snarl IDs in sorted order
-        snarl_ids_sorted_list_iterator_idx : int
-            Current position in the snarl IDs list
+        snarl_order : OrderedSnarlList
+            All snarl IDs in sorted order
         current_snarl_id : str
             ID of the current snarl being processed
         other_snarl_id : str
@@ -111,13 +298,13 @@ class AlignAnchor:
         Returns
         -------
         tuple
-            (new_anchors_after_merging, updated_snarl_ids_list_iterator_idx)
+            (new_anchors_after_merging, cursor_snarl_id)
             - new_anchors_after_merging: List of newly created merged anchors
-            - updated_snarl_ids_list_iterator_idx: Updated position in snarl IDs list
+            - cursor_snarl_id: the snarl of snarl_order in the place of the current snarl, the merged snarl if the snarls were merged
         """
 
         print("current snarl being extended:- ", current_snarl_id)
-        print("surrounding snarls:- ", snarl_ids_sorted_list_up_to_date[snarl_ids_sorted_list_iterator_idx-5:min(len(snarl_ids_sorted_list_up_to_date), snarl_ids_sorted_list_iterator_idx+5)])
+        print("surrounding snarls:- ", snarl_order.neighborhood(current_snarl_id, 5, 5))
         
         # calculating if after merging, enough anchors (>=2) will remain 
         cnt_anchors_with_sufficient_read_overlap = 0
@@ -126,7 +313,7 @@ class AlignAnchor:
         # When merging in round=1 (i.e. lower MIN_READS_REQUIRED_FOR_MERGING value, hence less confidence), merge only if current anchor is heterozygous. 
         # Else, there is no point in sacrificing read coverage by such an amount, if it doesn't help in phasing. 
         if merging_round == 1 and len(current_snarl_anchors) < 2:
-            return (current_snarl_anchors, snarl_ids_sorted_list_iterator_idx)
+            return (current_snarl_anchors, current_snarl_id)
         MIN_READS_REQUIRED_FOR_MERGING = MIN_READS_REQUIRED_FOR_MERGING_R0 if merging_round == 0 else MIN_READS_REQUIRED_FOR_MERGING_R1
         
         for other_anchor in self.snarl_to_anchors_dictionary[other_snarl_id]:
@@ -163,7 +350,7 @@ class AlignAnchor:
         
         if cnt_anchors_with_sufficient_read_overlap < 2:
             print(f"Failed to merge snarls {current_snarl_id} and {other_snarl_id} because of insufficient anchors after merging")
-            return (current_snarl_anchors, snarl_ids_sorted_list_iterator_idx)
+            return (current_snarl_anchors, current_snarl_id)
         
         # meaning we found that after extension, heterozygosity of current snarl will be maintained.
         # extend this side
@@ -201,6 +388,8 @@ class AlignAnchor:
                     else:
                         print(f"{anchor!r}.bp_occupied_end_node={anchor.bp_occupied_end_node}, other_anchor.bp_occupied_start_node={other_anchor.bp_occupied_start_node}")
                     new_anchor = copy.deepcopy(anchor)
+                    new_anchor.anchor_id = self.next_anchor_id
+                    self.next_anchor_id += 1
                     # new_anchor = anchor
                     # find relative orientations of anchor and other anchor
                     new_anchor_orientation = True if (new_anchor[0].id < new_anchor[1].id) else False
@@ -211,7 +400,7 @@ class AlignAnchor:
                     if new_anchor_orientation != snarl_orientation:
                         insert_left = not insert_left
                     if not new_anchor.merge_anchor(other_anchor, insert_left=insert_left):
-                        return (current_snarl_anchors, snarl_ids_sorted_list_iterator_idx)
+                        return (current_snarl_anchors, current_snarl_id)
                     # new snarl id calculation
                     new_snarl_id = (str(other_anchor.snarl_id) + "-" + str(new_anchor.snarl_id)) if extend_left else (str(new_anchor.snarl_id) + "-" + str(other_anchor.snarl_id))
                     new_anchor.add_snarl_id(new_snarl_id)
@@ -249,19 +438,13 @@ class AlignAnchor:
         new_snarl_id_after_merge = new_anchors_after_merging[0].snarl_id
         print(f"Inside snarl merging, have >=2 new anchors after merging {current_snarl_id} and {other_snarl_id}. New snarl id should be: {new_snarl_id_after_merge}")
         self.snarl_to_anchors_dictionary[new_snarl_id_after_merge] = new_anchors_after_merging
-        # updating the snarl_ids_sorted_list_up_to_date, and fixing it's iterator
-        # inserting the new snarl id at the index iterator position
-        snarl_ids_sorted_list_up_to_date.insert(snarl_ids_sorted_list_iterator_idx, new_snarl_id_after_merge)
-        index_of_current_snarl_in_list = snarl_ids_sorted_list_up_to_date.index(current_snarl_id)
-        index_of_other_snarl_in_list = snarl_ids_sorted_list_up_to_date.index(other_snarl_id)
-        if index_of_current_snarl_in_list > index_of_other_snarl_in_list:
-            snarl_ids_sorted_list_iterator_idx -= 1
-        snarl_ids_sorted_list_up_to_date.remove(current_snarl_id)
-        snarl_ids_sorted_list_up_to_date.remove(other_snarl_id)
-        return (new_anchors_after_merging, snarl_ids_sorted_list_iterator_idx)
+        # updating snarl_order: the new snarl id takes the place of the current snarl, and becomes the cursor
+        snarl_order.replace(current_snarl_id, new_snarl_id_after_merge)
+        snarl_order.remove(other_snarl_id)
+        return (new_anchors_after_merging, new_snarl_id_after_merge)
     
 
-    def _extending_anchors_to_1_degree_node(self, node_handle_to_extend_to, current_snarl_boundary_handle, current_snarl_id, current_snarl_anchors, extend_left, anchors_to_discard, snarl_ids_sorted, snarl_ids_list_idx):
+    def _extending_anchors_to_1_degree_node(self, node_handle_to_extend_to, current_snarl_boundary_handle, current_snarl_id, current_snarl_anchors, extend_left, anchors_to_discard, snarl_order):
         """
         Extends anchors in a snarl into an adjacent 1-degree node. This function is called when we want to
         extend anchors into neighboring nodes that have only one connection (1-degree nodes).
@@ -286,10 +469,8 @@ class AlignAnchor:
             True if extending towards left, False if extending towards right
         anchors_to_discard : list
             List to store anchors that should be removed after extension
-        snarl_ids_sorted : list
-            List of all snarl IDs in sorted order
-        snarl_ids_list_idx : int
-            Current position in the snarl IDs list
+        snarl_order : OrderedSnarlList
+            All snarl IDs in sorted order
 
         Returns
         -------
@@ -344,6 +525,7 @@ class AlignAnchor:
         if num_anchors_remaining_after_extension >= 2:
             # calculating the new snarl id
             new_snarl_id = current_snarl_id
+            old_snarl_id = current_snarl_id
             current_snarl_id = current_snarl_id.split("-")
             if extend_left:
                 if "n" in current_snarl_id[0]:
@@ -357,7 +539,7 @@ class AlignAnchor:
                     new_snarl_id = "-".join(current_snarl_id[:-1] + ["n" + str(node_number)])
                 else:
                     new_snarl_id = "-".join(current_snarl_id + ["n1"])
-            snarl_ids_sorted[snarl_ids_list_idx] = new_snarl_id
+            snarl_order.replace(old_snarl_id, new_snarl_id)
 
             anchors_list_to_extend = [anchor for anchor,_ in anchors_to_extend]
             for anchor in current_snarl_anchors:
@@ -389,7 +571,7 @@ class AlignAnchor:
             return current_snarl_anchors
 
 
-    def _try_extension(self, current_snarl_anchors, current_snarl_id, other_snarl_id, anchors_to_discard, per_anchor_max_bps_to_extend, extend_left, extension_iteration):
+    def _try_extension(self, current_snarl_anchors, current_snarl_id, other_snarl_id, anchors_to_discard, per_anchor_max_bps_to_extend, extend_left, extension_iteration, per_anchor_cs_avail=None):
         """
         Attempts to extend anchors in a snarl towards an adjacent snarl. This function handles the actual
         extension process, including:
@@ -414,12 +596,16 @@ class AlignAnchor:
             True if extending towards left, False if extending towards right
         extension_iteration : int
             Current iteration number (0: no drops, 1: stricter drops, 2: relaxed drops)
+        per_anchor_cs_avail : list
+            CsAvailability of the reads of each anchor on the extended side, built from the reads if None
 
         Returns
         -------
         list
             List of extended anchors if extension was successful, otherwise returns the original anchors
         """
+        if per_anchor_cs_avail is None:
+            per_anchor_cs_avail = [CsAvailability(anchor.bp_matched_reads, extend_left) for anchor in current_snarl_anchors]
         other_snarl_closest_node_id = 0
         an_other_snarl_anchor = self.snarl_to_anchors_dictionary[other_snarl_id][0]
         a_current_snarl_anchor = self.snarl_to_anchors_dictionary[current_snarl_id][0]
@@ -489,7 +675,7 @@ class AlignAnchor:
                         anchor.bp_occupied_end_node = 0
 
 
-            for anchor in current_snarl_anchors:
+            for anchor_idx, (anchor, cs_avail) in enumerate(zip(current_snarl_anchors, per_anchor_cs_avail)):
                 # add bp_available_for_extension
                 if extend_left:
                     anchor.bp_occupied_start_node += final_bp_count_added_in_current_iteration
@@ -500,29 +686,13 @@ class AlignAnchor:
 
                 anchor.compute_bp_length()
 
-                # update bp_matched_reads (also update cs_avail_left/right accordingly)
-                new_bp_matched_reads = []
-                for read in anchor.bp_matched_reads:
-                    if extend_left:
-                        new_cs_avail_idx = (CS_LEFT_AVAIL if read[READ_STRAND] == 0 else CS_RIGHT_AVAIL)
-                        read[ANCHOR_START] = read[ANCHOR_START] - final_bp_count_added_in_current_iteration
-                    else:
-                        new_cs_avail_idx = (CS_RIGHT_AVAIL if read[READ_STRAND] == 0 else CS_LEFT_AVAIL)
-                        read[ANCHOR_END] = read[ANCHOR_END] + final_bp_count_added_in_current_iteration
-                    new_cs_avail = read[new_cs_avail_idx] - final_bp_count_added_in_current_iteration
-                    if new_cs_avail >= 0:
-                        read[new_cs_avail_idx] = new_cs_avail
-                        new_bp_matched_reads.append(read)
-                    else:
-                        if current_snarl_id not in self.anchor_read_tracking_dict:
-                            self.anchor_read_tracking_dict[current_snarl_id] = dict()
-                        if f"{anchor!r}" not in self.anchor_read_tracking_dict[current_snarl_id]:
-                            self.anchor_read_tracking_dict[current_snarl_id][f"{anchor!r}"] = {}
-                        if extension_iteration not in self.anchor_read_tracking_dict[current_snarl_id][f"{anchor!r}"]:
-                            self.anchor_read_tracking_dict[current_snarl_id][f"{anchor!r}"][extension_iteration] = []
-                        # add this read to anchor_read_tracking_dict
-                        self.anchor_read_tracking_dict[current_snarl_id][f"{anchor!r}"][extension_iteration].append(read[READ_ID])
-                anchor.bp_matched_reads = new_bp_matched_reads
+                # reads whose cs_avail does not cover the extension are dropped, the remaining reads are updated once the extension is done
+                dropped_read_positions = cs_avail.extend(final_bp_count_added_in_current_iteration)
+                if dropped_read_positions:
+                    self.read_drop_log.add(
+                        current_snarl_id, anchor_idx, f"{anchor!r}", extension_iteration,
+                        [anchor.bp_matched_reads[read_position][READ_ID] for read_position in dropped_read_positions], "boundary_extension"
+                    )
 
                 # update anchor.compute_bp_length() to have correct calculation for boundary nodes
                 # if anchor.basepairlength >= MIN_ANCHOR_LENGTH:
@@ -543,6 +713,10 @@ class AlignAnchor:
                     next_node_to_extend_node_id = self.graph.get_id(next_node_handle)
                 else:
                     break
+
+        # update bp_matched_reads (also update cs_avail_left/right accordingly)
+        for anchor, cs_avail in zip(current_snarl_anchors, per_anchor_cs_avail):
+            anchor.bp_matched_reads = cs_avail.apply_to_reads(anchor.bp_matched_reads)
                 
         return current_snarl_anchors
 
@@ -579,17 +753,15 @@ class AlignAnchor:
             #     return MAX_READ_DROPS_ALLOWED
 
 
-    def _get_max_cs_avail_in_anchor(self, current_anchor_cs_avail_list: list, read_drops_allowed: int) -> int:
+    def _get_max_cs_avail_in_anchor(self, current_anchor_cs_avail: CsAvailability, read_drops_allowed: int) -> int:
         """
         This function returns the max base pairs available for extension based on allowed read drops computed for that anchor
         """
 
-        current_anchor_cs_avail_list_sorted = sorted(current_anchor_cs_avail_list)
-        
-        return(current_anchor_cs_avail_list_sorted[read_drops_allowed])
+        return current_anchor_cs_avail.max_bps_after_drops(read_drops_allowed)
 
         
-    def _extending_snarl_boundaries(self, current_snarl_anchors, current_snarl_id, snarl_ids_sorted, snarl_ids_list_idx, anchors_to_discard, extension_iteration):
+    def _extending_snarl_boundaries(self, current_snarl_anchors, current_snarl_id, snarl_order, anchors_to_discard, extension_iteration):
         """
         Extends the boundaries of a snarl by attempting to extend its anchors. This function is the main
         coordinator for anchor extension, handling:
@@ -604,10 +776,8 @@ class AlignAnchor:
             List of Anchor objects in the current snarl
         current_snarl_id : str
             ID of the current snarl being processed
-        snarl_ids_sorted : list
-            List of all snarl IDs in sorted order
-        snarl_ids_list_idx : int
-            Current position in the snarl IDs list
+        snarl_order : OrderedSnarlList
+            All snarl IDs in sorted order
         anchors_to_discard : list
             List to store anchors that should be removed after extension
         extension_iteration : int
@@ -629,12 +799,13 @@ class AlignAnchor:
             allowed_read_drop_counts = [self._get_max_read_drop(current_anchor_readcov, extension_iteration) for current_anchor_readcov in current_snarl_anchor_readcov]
         allowed_read_drop_counts_iterator = iter(allowed_read_drop_counts)
         per_anchor_max_bps_to_extend_left = []    # storing for each anchor, max cs_avail for extension in the left_direction 
-        for anchor in current_snarl_anchors:    # for left extension
-            per_read_cs_avail_list = [(read[CS_LEFT_AVAIL] if (read[READ_STRAND] == 0) else read[CS_RIGHT_AVAIL]) for read in anchor.bp_matched_reads]
+        per_anchor_cs_avail_left = [CsAvailability(anchor.bp_matched_reads, extend_left=True) for anchor in current_snarl_anchors]
+        for current_anchor_cs_avail in per_anchor_cs_avail_left:    # for left extension
             current_allowed_read_drop_counts = next(allowed_read_drop_counts_iterator)
-            per_anchor_max_bps_to_extend_left.append(self._get_max_cs_avail_in_anchor(per_read_cs_avail_list, current_allowed_read_drop_counts))
-        if snarl_ids_list_idx > 0:
-            self._try_extension(current_snarl_anchors, current_snarl_id, snarl_ids_sorted[snarl_ids_list_idx - 1], anchors_to_discard, per_anchor_max_bps_to_extend_left, extend_left=True, extension_iteration = extension_iteration)   # for no_drop left extension
+            per_anchor_max_bps_to_extend_left.append(self._get_max_cs_avail_in_anchor(current_anchor_cs_avail, current_allowed_read_drop_counts))
+        left_snarl_id = snarl_order.prev(current_snarl_id)
+        if left_snarl_id is not None:
+            self._try_extension(current_snarl_anchors, current_snarl_id, left_snarl_id, anchors_to_discard, per_anchor_max_bps_to_extend_left, extend_left=True, extension_iteration = extension_iteration, per_anchor_cs_avail=per_anchor_cs_avail_left)   # for no_drop left extension
         
 
         current_snarl_anchor_readcov = []    # storing read coverage of each anchor
@@ -647,24 +818,25 @@ class AlignAnchor:
             allowed_read_drop_counts = [self._get_max_read_drop(current_anchor_readcov, extension_iteration) for current_anchor_readcov in current_snarl_anchor_readcov]
         allowed_read_drop_counts_iterator = iter(allowed_read_drop_counts)
         per_anchor_max_bps_to_extend_right = []    # storing for each anchor, max cs_avail for extension in the right_direction 
-        for anchor in current_snarl_anchors:    # for right extension
-            per_read_cs_avail_list = [(read[CS_RIGHT_AVAIL] if (read[READ_STRAND] == 0) else read[CS_LEFT_AVAIL]) for read in anchor.bp_matched_reads]
+        per_anchor_cs_avail_right = [CsAvailability(anchor.bp_matched_reads, extend_left=False) for anchor in current_snarl_anchors]
+        for current_anchor_cs_avail in per_anchor_cs_avail_right:    # for right extension
             current_allowed_read_drop_counts = next(allowed_read_drop_counts_iterator)
-            per_anchor_max_bps_to_extend_right.append(self._get_max_cs_avail_in_anchor(per_read_cs_avail_list, current_allowed_read_drop_counts))
+            per_anchor_max_bps_to_extend_right.append(self._get_max_cs_avail_in_anchor(current_anchor_cs_avail, current_allowed_read_drop_counts))
         
-        if snarl_ids_list_idx < len(snarl_ids_sorted) - 1:
-            self._try_extension(current_snarl_anchors, current_snarl_id, snarl_ids_sorted[snarl_ids_list_idx + 1], anchors_to_discard, per_anchor_max_bps_to_extend_right, extend_left=False, extension_iteration = extension_iteration)   # for no_drop left extension
+        right_snarl_id = snarl_order.next(current_snarl_id)
+        if right_snarl_id is not None:
+            self._try_extension(current_snarl_anchors, current_snarl_id, right_snarl_id, anchors_to_discard, per_anchor_max_bps_to_extend_right, extend_left=False, extension_iteration = extension_iteration, per_anchor_cs_avail=per_anchor_cs_avail_right)   # for no_drop left extension
 
     
-    def _helper_extension_loop(self, snarl_ids_sorted, anchors_to_remove, extension_iteration, is_het_round=True):
+    def _helper_extension_loop(self, snarl_order, anchors_to_remove, extension_iteration, is_het_round=True):
         """
         This function is a helper for extending snarl boundaries in a loop. It is used to
         perform boundary extension for all snarls in a sorted list, allowing for read drops
         based on the specified extension iteration.
         Parameters
         ----------
-        snarl_ids_sorted : list 
-            List of all snarl IDs in sorted order
+        snarl_order : OrderedSnarlList
+            All snarl IDs in sorted order
         anchors_to_remove : list
             List to store anchors that should be removed after extension
         extension_iteration : int
@@ -676,25 +848,124 @@ class AlignAnchor:
         None
             The function modifies the anchors in place and updates the snarl boundaries
         """
-        snarl_ids_list_idx = 0 
-        while snarl_ids_list_idx < len(snarl_ids_sorted):
-            current_snarl_id = snarl_ids_sorted[snarl_ids_list_idx]
+        if self.threads > 1:
+            blocks = self._helper_find_extension_blocks(snarl_order, is_het_round)
+            if len(blocks) > 1:
+                self._helper_parallel_extension_round(blocks, extension_iteration, is_het_round)
+                return
+
+        for current_snarl_id in snarl_order:
             print(f"Processing snarl ID: {current_snarl_id}")
             current_snarl_anchors = self.snarl_to_anchors_dictionary[current_snarl_id]
             print(f"..Running _extending_snarl_boundaries of snarl {current_snarl_id} with {len(current_snarl_anchors)} anchors")
             min_basepairlength_among_snarl_anchors = min([anchor.basepairlength for anchor in current_snarl_anchors])
             if min_basepairlength_among_snarl_anchors >= MIN_ANCHOR_LENGTH:
                 print(f"Skipping snarl ID {current_snarl_id} as it's already sufficiently long. Length: {min_basepairlength_among_snarl_anchors}")
-                snarl_ids_list_idx += 1
                 continue
             if is_het_round:
                 # we need to check if snarl is het snarl, i.e., has > 1 anchor
                 if len(current_snarl_anchors) > 1:
-                    self._extending_snarl_boundaries(current_snarl_anchors, current_snarl_id, snarl_ids_sorted, snarl_ids_list_idx, anchors_to_remove, extension_iteration)
+                    self._extending_snarl_boundaries(current_snarl_anchors, current_snarl_id, snarl_order, anchors_to_remove, extension_iteration)
             else:
                 if len(current_snarl_anchors) == 1:
-                    self._extending_snarl_boundaries(current_snarl_anchors, current_snarl_id, snarl_ids_sorted, snarl_ids_list_idx, anchors_to_remove, extension_iteration)
-            snarl_ids_list_idx += 1
+                    self._extending_snarl_boundaries(current_snarl_anchors, current_snarl_id, snarl_order, anchors_to_remove, extension_iteration)
+
+
+    def _helper_is_snarl_extended_in_round(self, current_snarl_anchors: list, is_het_round: bool) -> bool:
+        """
+        Tells if _helper_extension_loop extends the snarl in a het (is_het_round) or hom round: a snarl shorter than MIN_ANCHOR_LENGTH with more than one anchor, or with one anchor.
+        """
+        if min(anchor.basepairlength for anchor in current_snarl_anchors) >= MIN_ANCHOR_LENGTH:
+            return False
+        return (len(current_snarl_anchors) > 1) if is_het_round else (len(current_snarl_anchors) == 1)
+
+
+    def _helper_find_extension_blocks(self, snarl_order: OrderedSnarlList, is_het_round: bool) -> list:
+        """
+        Splits the snarls of an extension round in independent blocks.
+        Extending a snarl only changes its own anchors, and reads the boundaries of the snarls before and after it. The snarls not extended in the round (guard snarls) keep their boundaries during the whole round, so the runs of extended snarls between two guard snarls can be extended independently, each in order, with the same results as the serial loop.
+
+        Returns
+        -------
+        list
+            For each run of extended snarls, the snarl ids of the run between the guard snarls around it (missing at the ends of snarl_order)
+        """
+        blocks = []
+        current_block = []
+        previous_snarl_id = None
+        for snarl_id in snarl_order:
+            if self._helper_is_snarl_extended_in_round(self.snarl_to_anchors_dictionary[snarl_id], is_het_round):
+                if not current_block and previous_snarl_id is not None:
+                    current_block.append(previous_snarl_id)    # left guard snarl
+                current_block.append(snarl_id)
+            elif current_block:
+                current_block.append(snarl_id)    # right guard snarl
+                blocks.append(current_block)
+                current_block = []
+            previous_snarl_id = snarl_id
+        if current_block:
+            blocks.append(current_block)
+        return blocks
+
+
+    def _extension_round_chunk(self, chunk: tuple) -> list:
+        """
+        Extends the snarls of a chunk of independent blocks (see _helper_find_extension_blocks). Run by map_on_fork in a worker process, so the results are returned and not stored.
+        The extension only inserts nodes at the ends of the anchors, so the nodes of each anchor are returned as the ones inserted on its left and right.
+
+        Parameters
+        ----------
+        chunk : tuple
+            (extension_iteration, is_het_round, blocks)
+
+        Returns
+        -------
+        tuple
+            (snarl results, read drop events of the chunk as ReadDropLog.events), with for each extended snarl (snarl_id, anchor changes) and for each anchor ((id, length, orientation) of the nodes inserted on the left, on the right, bp_occupied_start_node, bp_occupied_end_node, basepairlength, bp_matched_reads)
+        """
+        extension_iteration, is_het_round, blocks = chunk
+        anchors_to_remove = []    # the boundary extension does not discard anchors
+        chunk_results = []
+        num_read_drops_before = len(self.read_drop_log)
+        for block in blocks:
+            block_order = OrderedSnarlList(block)
+            for snarl_id in block:
+                current_snarl_anchors = self.snarl_to_anchors_dictionary[snarl_id]
+                if not self._helper_is_snarl_extended_in_round(current_snarl_anchors, is_het_round):
+                    continue
+                nodes_before_extension = [(anchor[0], len(anchor)) for anchor in current_snarl_anchors]
+                self._extending_snarl_boundaries(current_snarl_anchors, snarl_id, block_order, anchors_to_remove, extension_iteration)
+                anchor_changes = []
+                for anchor, (first_node, num_nodes) in zip(current_snarl_anchors, nodes_before_extension):
+                    num_nodes_inserted_left = next(idx for idx, node in enumerate(anchor._nodes) if node is first_node)
+                    anchor_changes.append((
+                        [(node.id, node.length, node.orientation) for node in anchor._nodes[:num_nodes_inserted_left]],
+                        [(node.id, node.length, node.orientation) for node in anchor._nodes[num_nodes_inserted_left + num_nodes:]],
+                        anchor.bp_occupied_start_node,
+                        anchor.bp_occupied_end_node,
+                        anchor.basepairlength,
+                        anchor.bp_matched_reads,
+                    ))
+                chunk_results.append((snarl_id, anchor_changes))
+        return (chunk_results, list(self.read_drop_log.events(num_read_drops_before)))
+
+
+    def _helper_parallel_extension_round(self, blocks: list, extension_iteration: int, is_het_round: bool) -> None:
+        """
+        Runs an extension round of _helper_extension_loop on the independent blocks of snarls in parallel, then applies the changes of each extended snarl to its anchors, in the order of the snarls, so that read_drop_log is the one of the serial loop.
+        """
+        chunks = [(extension_iteration, is_het_round, chunk_blocks) for chunk_blocks in split_in_chunks(blocks, self.threads * EXTENSION_CHUNKS_PER_THREAD)]
+        for chunk_results, read_drop_events in map_on_fork(self, "_extension_round_chunk", chunks, self.threads):
+            for snarl_id, anchor_changes in chunk_results:
+                for anchor, (left_nodes, right_nodes, bp_occupied_start_node, bp_occupied_end_node, basepairlength, bp_matched_reads) in zip(self.snarl_to_anchors_dictionary[snarl_id], anchor_changes):
+                    anchor._nodes[:0] = [Node(node_id, length, orientation) for node_id, length, orientation in left_nodes]
+                    anchor._nodes.extend(Node(node_id, length, orientation) for node_id, length, orientation in right_nodes)
+                    anchor.invalidate_repr()
+                    anchor.bp_occupied_start_node = bp_occupied_start_node
+                    anchor.bp_occupied_end_node = bp_occupied_end_node
+                    anchor.basepairlength = basepairlength
+                    anchor.bp_matched_reads = bp_matched_reads
+            self.read_drop_log.extend(read_drop_events)
 
 
     def _helper_find_relevant_boundary_node_details_for_current_snarl(self, current_snarl_anchors, which_boundary):
@@ -728,11 +999,9 @@ class AlignAnchor:
 
 
     def _helper_find_bps_available_for_extension(self, current_snarl_id: int, other_snarl_id: Union[str, int], extend_left: bool):
-        current_snarl_anchors_from_before_extension = self.before_extension_snarl_to_anchors_dictionary[current_snarl_id]
-        current_snarl_boundary_node_id, current_snarl_boundary_node_bps_occupied = self._helper_find_relevant_boundary_node_details_for_current_snarl(current_snarl_anchors_from_before_extension, 'left' if extend_left else 'right')
-        for anchor in current_snarl_anchors_from_before_extension:
-            anchor.compute_bp_length()
-        initial_bps_count = min([anchor.basepairlength for anchor in current_snarl_anchors_from_before_extension])
+        current_snarl_before_extension = self.before_extension_snapshot[current_snarl_id]
+        current_snarl_boundary_node_id, current_snarl_boundary_node_bps_occupied = current_snarl_before_extension.left_boundary if extend_left else current_snarl_before_extension.right_boundary
+        initial_bps_count = current_snarl_before_extension.min_basepairlength()
         current_bps_count = initial_bps_count
         other_snarl_anchors = self.snarl_to_anchors_dictionary[other_snarl_id]
         other_snarl_boundary_node_id, other_snarl_boundary_node_bp_occupied = self._helper_find_relevant_boundary_node_details_for_current_snarl(other_snarl_anchors, 'right' if extend_left else 'left')
@@ -787,6 +1056,38 @@ class AlignAnchor:
         return current_bps_count - initial_bps_count
 
 
+    def _helper_find_best_subsequence_left_side_offset(self, current_anchor, bps_available_on_left_side: int, bps_available_on_right_side: int) -> tuple:
+        """
+        Finds, for the independent extension of an anchor to MIN_ANCHOR_LENGTH, the left side offset of the subsequence supported by the most reads.
+        The offsets are tried from the largest to the smallest one allowed by the bps available on both sides; a read supports an offset if its cs_avail covers the offset on the left side and the rest of MIN_ANCHOR_LENGTH on the right side (swapped for the reverse strand reads).
+        All offsets are scored at once on a (offsets x reads) NumPy table; on ties the largest offset is kept.
+
+        Returns
+        -------
+        tuple
+            (best_subsequence_left_side_offset, best_subsequence_supporting_reads), (MIN_ANCHOR_LENGTH, []) if no read supports any offset
+        """
+        offsets = np.arange(max(0, min(MIN_ANCHOR_LENGTH - current_anchor.basepairlength, bps_available_on_left_side)), max(0, MIN_ANCHOR_LENGTH - (bps_available_on_right_side + current_anchor.basepairlength)), -1)
+        reads = current_anchor.bp_matched_reads
+        if len(offsets) == 0 or len(reads) == 0:
+            return (MIN_ANCHOR_LENGTH, [])
+
+        # cs avail on the left and right side of the anchor, reverse strand reads have them swapped
+        is_forward = np.fromiter((read[READ_STRAND] == 0 for read in reads), dtype=bool, count=len(reads))
+        cs_left_avail = np.fromiter((read[CS_LEFT_AVAIL] for read in reads), dtype=np.int64, count=len(reads))
+        cs_right_avail = np.fromiter((read[CS_RIGHT_AVAIL] for read in reads), dtype=np.int64, count=len(reads))
+        left_side_avail = np.where(is_forward, cs_left_avail, cs_right_avail)
+        right_side_avail = np.where(is_forward, cs_right_avail, cs_left_avail)
+
+        right_side_cs_avail_required = MIN_ANCHOR_LENGTH - offsets - current_anchor.basepairlength
+        supports = (left_side_avail[None, :] >= offsets[:, None]) & (right_side_avail[None, :] >= right_side_cs_avail_required[:, None])
+        supporting_read_counts = supports.sum(axis=1)
+        best_offset_idx = int(np.argmax(supporting_read_counts))    # first maximum, i.e. the largest offset
+        if supporting_read_counts[best_offset_idx] == 0:
+            return (MIN_ANCHOR_LENGTH, [])
+        return (int(offsets[best_offset_idx]), [read for read, supported in zip(reads, supports[best_offset_idx].tolist()) if supported])
+
+
     def extend_and_insert_node(self, current_extended_anchor, current_snarl_boundary_node_id, current_snarl_boundary_bps_occupied, additional_bps_to_cover, extend_left):
         print(f"DEBUG: extend_and_insert_node called - node_id: {current_snarl_boundary_node_id}, bps_occupied: {current_snarl_boundary_bps_occupied}, additional_bps_to_cover: {additional_bps_to_cover}, extend_left: {extend_left}")
         current_node_handle = self.graph.get_handle(current_snarl_boundary_node_id)
@@ -870,7 +1171,7 @@ class AlignAnchor:
         return
 
 
-    def extend_anchors_independently(self, snarl_ids_sorted: list, valid_anchors: list) -> list:
+    def extend_anchors_independently(self, snarl_order: OrderedSnarlList, valid_anchors: list) -> list:
         """
         This function extends the anchors independently for each snarl.
         It first finds the bps available for extension in both directions, and then finds the best subsequence for each anchor.
@@ -879,7 +1180,7 @@ class AlignAnchor:
         extension_round = ["HET", "HOM"]
         for round in extension_round:
             print(f"DEBUG: Processing {round}s for independent extension")
-            for current_snarl_idx, current_snarl_id in enumerate(snarl_ids_sorted):
+            for current_snarl_idx, current_snarl_id in enumerate(snarl_order):
                 if (len(self.snarl_to_anchors_dictionary[current_snarl_id]) == 1 and round == "HOM") or (len(self.snarl_to_anchors_dictionary[current_snarl_id]) > 1 and round == "HET"):
                     print(f"DEBUG: Processing snarl {current_snarl_id} for independent extension (index {current_snarl_idx})")
                     if isinstance(current_snarl_id, str) and ('-' in current_snarl_id):  # merged snarl
@@ -899,21 +1200,21 @@ class AlignAnchor:
                         continue
                     
                     # find bps available to extend in both directions
-                    left_snarl_idx = (current_snarl_idx - 1) if (current_snarl_idx > 0) else -1
-                    if left_snarl_idx < 0:
+                    left_snarl_id = snarl_order.prev(current_snarl_id)
+                    if left_snarl_id is None:
                         bps_available_for_extension_on_left_side = 0
                     else:
-                        bps_available_for_extension_on_left_side = self._helper_find_bps_available_for_extension(current_snarl_id, snarl_ids_sorted[left_snarl_idx], extend_left=True) if (left_snarl_idx >= 0) else 0
-                        print(f"DEBUG: Snarl {current_snarl_id} - left_snarl: {snarl_ids_sorted[left_snarl_idx]}, bps_available_for_extension_on_left_side: {bps_available_for_extension_on_left_side}")
+                        bps_available_for_extension_on_left_side = self._helper_find_bps_available_for_extension(current_snarl_id, left_snarl_id, extend_left=True)
+                        print(f"DEBUG: Snarl {current_snarl_id} - left_snarl: {left_snarl_id}, bps_available_for_extension_on_left_side: {bps_available_for_extension_on_left_side}")
                     
-                    right_snarl_idx = (current_snarl_idx + 1) if (current_snarl_idx < len(snarl_ids_sorted) - 1) else len(snarl_ids_sorted)
-                    if right_snarl_idx >= len(snarl_ids_sorted):
+                    right_snarl_id = snarl_order.next(current_snarl_id)
+                    if right_snarl_id is None:
                         bps_available_for_extension_on_right_side = 0
                     else:
-                        bps_available_for_extension_on_right_side = self._helper_find_bps_available_for_extension(current_snarl_id, snarl_ids_sorted[right_snarl_idx], extend_left=False) if (right_snarl_idx < len(snarl_ids_sorted)) else 0
-                        print(f"DEBUG: Snarl {current_snarl_id} - right_snarl: {snarl_ids_sorted[right_snarl_idx]}, bps_available_for_extension_on_right_side: {bps_available_for_extension_on_right_side}")
+                        bps_available_for_extension_on_right_side = self._helper_find_bps_available_for_extension(current_snarl_id, right_snarl_id, extend_left=False)
+                        print(f"DEBUG: Snarl {current_snarl_id} - right_snarl: {right_snarl_id}, bps_available_for_extension_on_right_side: {bps_available_for_extension_on_right_side}")
                     
-                    min_anchor_length = min([anchor.basepairlength for anchor in self.before_extension_snarl_to_anchors_dictionary[current_snarl_id]])
+                    min_anchor_length = self.before_extension_snapshot[current_snarl_id].min_basepairlength()
                     total_available = bps_available_for_extension_on_left_side + bps_available_for_extension_on_right_side + min_anchor_length
                     print(f"DEBUG: Snarl {current_snarl_id} - min_anchor_length: {min_anchor_length}, total_available: {total_available}, MIN_ANCHOR_LENGTH: {MIN_ANCHOR_LENGTH}")
                     
@@ -922,28 +1223,10 @@ class AlignAnchor:
                         continue
 
                     print(f"DEBUG: Processing snarl {current_snarl_id} for independent extension")
-                    for current_anchor_idx, current_anchor in enumerate(self.before_extension_snarl_to_anchors_dictionary[current_snarl_id]):
+                    for current_anchor_idx, current_anchor in enumerate(self.before_extension_snapshot[current_snarl_id].anchors):
                         print(f"DEBUG: Processing anchor {current_anchor!r} for snarl {current_snarl_id}")
                         # record the offset of the best subsequence (i.e., the one with most reads retained) STARTING FROM THE current snarl left boundary start node (the one before any kind of extension), and increasing in the LEFT DIRECTION            
-                        best_subsequence_left_side_offset = MIN_ANCHOR_LENGTH
-                        best_subsequence_supporting_reads = []
-                        current_anchor.compute_bp_length()
-                        for current_subsequence_left_side_offset in range(max(0, min(MIN_ANCHOR_LENGTH - current_anchor.basepairlength, bps_available_for_extension_on_left_side)), max(0, MIN_ANCHOR_LENGTH - (bps_available_for_extension_on_right_side + current_anchor.basepairlength)), -1):
-                            reads_supporting_current_subsequence = []
-                            for read in current_anchor.bp_matched_reads:
-                                right_side_cs_avail_required = MIN_ANCHOR_LENGTH - current_subsequence_left_side_offset - current_anchor.basepairlength
-                                if read[READ_STRAND] == 0:  # forward strand
-                                    if read[CS_LEFT_AVAIL] >= current_subsequence_left_side_offset and read[CS_RIGHT_AVAIL] >= right_side_cs_avail_required:
-                                        reads_supporting_current_subsequence.append(read)
-                                else:  # reverse strand
-                                    # reverse strand reads have their left and right CS avail swapped
-                                    # so we check CS_RIGHT_AVAIL for left side offset and CS_LEFT_AVAIL for right side offset
-                                    if read[CS_RIGHT_AVAIL] >= current_subsequence_left_side_offset and read[CS_LEFT_AVAIL] >= right_side_cs_avail_required:
-                                        reads_supporting_current_subsequence.append(read)
-                                
-                            if len(reads_supporting_current_subsequence) > len(best_subsequence_supporting_reads):
-                                best_subsequence_left_side_offset = current_subsequence_left_side_offset
-                                best_subsequence_supporting_reads = reads_supporting_current_subsequence
+                        best_subsequence_left_side_offset, best_subsequence_supporting_reads = self._helper_find_best_subsequence_left_side_offset(current_anchor, bps_available_for_extension_on_left_side, bps_available_for_extension_on_right_side)
                         
                         # now update the current_anchor to have the boundaries defined by the best_subsequence_left_side_offset, and reads as best_subsequence_supporting_reads
                         if len(best_subsequence_supporting_reads) < MIN_ANCHOR_READCOV_FOR_INDEPENDENT_ANCHOR_EXTENSION:
@@ -955,11 +1238,12 @@ class AlignAnchor:
                             self.independent_anchor_extension_tracking_dict[current_snarl_id] = dict()
                         if current_anchor_idx not in self.independent_anchor_extension_tracking_dict[current_snarl_id]:
                             self.independent_anchor_extension_tracking_dict[current_snarl_id][current_anchor_idx] = dict()
-                        self.independent_anchor_extension_tracking_dict[current_snarl_id][current_anchor_idx]["primary_anchor"] = [f"{self.before_extension_snarl_to_anchors_dictionary[current_snarl_id][current_anchor_idx]!r}", {"anchor_length": self.before_extension_snarl_to_anchors_dictionary[current_snarl_id][current_anchor_idx].basepairlength}, {"read_cov": len(self.before_extension_snarl_to_anchors_dictionary[current_snarl_id][current_anchor_idx].bp_matched_reads)}]
+                        self.independent_anchor_extension_tracking_dict[current_snarl_id][current_anchor_idx]["primary_anchor"] = [f"{current_anchor!r}", {"anchor_length": current_anchor.basepairlength}, {"read_cov": len(current_anchor.bp_matched_reads)}]
                         self.independent_anchor_extension_tracking_dict[current_snarl_id][current_anchor_idx]["extension_around_sentinel"] = [f"{self.snarl_to_anchors_dictionary[current_snarl_id][current_anchor_idx]!r}", {"anchor_length": self.snarl_to_anchors_dictionary[current_snarl_id][current_anchor_idx].basepairlength}, {"read_cov": len(self.snarl_to_anchors_dictionary[current_snarl_id][current_anchor_idx].bp_matched_reads)}]
 
                         # calculate correct boundaries of the current anchor in the reads belonging to best_subsequence_supporting_reads, and also their cs_avails
                         for read_idx, read in enumerate(best_subsequence_supporting_reads):
+                            read = list(read)   # the reads of the snapshot are frozen
                             read[ANCHOR_START] -= best_subsequence_left_side_offset
                             read[ANCHOR_END] += MIN_ANCHOR_LENGTH - best_subsequence_left_side_offset - current_anchor.basepairlength
                             if read[READ_STRAND] == 0:
@@ -973,7 +1257,7 @@ class AlignAnchor:
                         # updates the original anchor (i.e., the instance which had been extended previously through drops) with the new boundaries
                         # this way, we don't have to create a new anchor object and worry about managing its presence in valid_anchors.
                         print(f"Selected best subsequence left side offset: {best_subsequence_left_side_offset} for snarl {current_snarl_id} anchor {current_anchor!r}")
-                        self.update_current_anchor_details_with_new_boundary(self.snarl_to_anchors_dictionary[current_snarl_id][current_anchor_idx], self.before_extension_snarl_to_anchors_dictionary[current_snarl_id][current_anchor_idx], best_subsequence_left_side_offset, best_subsequence_supporting_reads)
+                        self.update_current_anchor_details_with_new_boundary(self.snarl_to_anchors_dictionary[current_snarl_id][current_anchor_idx], current_anchor.to_anchor(), best_subsequence_left_side_offset, best_subsequence_supporting_reads)
                         self.independent_anchor_extension_tracking_dict[current_snarl_id][current_anchor_idx]["fake_anchor_generation"] = [f"{self.snarl_to_anchors_dictionary[current_snarl_id][current_anchor_idx]!r}", {"anchor_length": self.snarl_to_anchors_dictionary[current_snarl_id][current_anchor_idx].basepairlength}, {"read_cov": len(self.snarl_to_anchors_dictionary[current_snarl_id][current_anchor_idx].bp_matched_reads)}]
 
                         # TODO:
@@ -1079,36 +1363,31 @@ class AlignAnchor:
         return intervals
 
 
-    def prune_repeat_anchors(self, snarl_ids_sorted: list, valid_anchors: list) -> list:
+    def prune_repeat_anchors(self, snarl_order: OrderedSnarlList, valid_anchors: list) -> list:
         """
         This function prunes repeat anchors from the valid_anchors list.
         """
         print(f"#### PRUNING REPEAT ANCHORS ######")
         valid_anchors_after_pruning = []
         anchors_pruned = []
-        snarl_id_idx = 0
-        while snarl_id_idx < len(snarl_ids_sorted):
-            snarl_id = snarl_ids_sorted[snarl_id_idx]
+        for snarl_id in snarl_order:
             print()
             print(f"#### PRUNING: Processing snarl {snarl_id} ######")
             # not considering merged anchors, directly adding them to final valid anchors list
             if isinstance(snarl_id, str) and '-' in snarl_id:
                 print(f"#### PRUNING: Snarl {snarl_id} is a merged snarl. Skipping... ######")
                 [valid_anchors_after_pruning.append(anchor) for anchor in self.snarl_to_anchors_dictionary[snarl_id]]
-                snarl_id_idx += 1
                 continue
             current_snarl_anchors = self.snarl_to_anchors_dictionary[snarl_id]
             if len(current_snarl_anchors) == 1:  # homozygous snarl
                 print(f"#### PRUNING: Snarl {snarl_id} is a homozygous snarl. Skipping... ######")
                 valid_anchors_after_pruning.append(current_snarl_anchors[0])
-                snarl_id_idx += 1
                 continue
             
             if self._helper_determine_if_snarl_underwent_independent_extension(current_snarl_anchors):
                 print(f"#### PRUNING: Snarl {snarl_id} was extended in independent extension. Skipping... ######")
                 # means this snarl was extended in independent extension
                 [valid_anchors_after_pruning.append(anchor) for anchor in current_snarl_anchors]
-                snarl_id_idx += 1
                 continue
             else:
                 # determine if this snarl has repeat anchors
@@ -1129,51 +1408,76 @@ class AlignAnchor:
                     [valid_anchors_after_pruning.append(anchor) for anchor in current_snarl_anchors]
                 else:
                     print(f"#### PRUNING: Snarl {snarl_id} has repeat anchors. Adding all anchors to anchors_pruned, and removing snarl from snarl_ids_sorted... ######")
-                    snarl_ids_sorted.remove(snarl_id)
-                    snarl_id_idx -= 1
+                    snarl_order.remove(snarl_id)
                     [anchors_pruned.append(anchor) for anchor in current_snarl_anchors]
-                snarl_id_idx += 1
         return valid_anchors_after_pruning, anchors_pruned
 
 
+    def snapshot_before_extension(self) -> None:
+        """
+        Stores in before_extension_snapshot the state before the extension of the snarls extend_anchors_independently can work on: the heterozygous snarls with an anchor shorter than MIN_ANCHOR_LENGTH.
+        The extension only makes anchors longer and drops anchors, so the other snarls are never considered for the independent extension and are not copied.
+        """
+        self.before_extension_snapshot = {}
+        for snarl_id, snarl_anchors in self.snarl_to_anchors_dictionary.items():
+            if len(snarl_anchors) < 2:
+                continue
+            anchor_snapshots = tuple(AnchorSnapshot(anchor) for anchor in snarl_anchors)
+            if min(anchor_snapshot.basepairlength for anchor_snapshot in anchor_snapshots) >= MIN_ANCHOR_LENGTH:
+                continue
+            self.before_extension_snapshot[snarl_id] = SnarlSnapshot(
+                anchor_snapshots,
+                self._helper_find_relevant_boundary_node_details_for_current_snarl(snarl_anchors, 'left'),
+                self._helper_find_relevant_boundary_node_details_for_current_snarl(snarl_anchors, 'right'),
+            )
+        print(f"{len(self.before_extension_snapshot)} of {len(self.snarl_to_anchors_dictionary)} snarls stored before the extension", file=stderr)
+
+
     def extend_and_merge_snarls(self, valid_anchors: list) -> list:
         """
         This function performs snarl boundary extension and merging
         """
         anchors_to_remove = []   # {(snarl_id, anchor)}
-        self.before_extension_snarl_to_anchors_dictionary = copy.deepcopy(self.snarl_to_anchors_dictionary)
+        self.snapshot_before_extension()
+        # the anchors created by merging get ids after the ones of the anchors being extended
+        self.next_anchor_id = max(
+            [self.next_anchor_id] + [anchor.anchor_id + 1 for anchors in self.snarl_to_anchors_dictionary.values() for anchor in anchors]
+        )
+        # the passes below merge, rename and remove snarls, snarl_ids_sorted is updated at the end
+        snarl_order = OrderedSnarlList(self.snarl_ids_sorted)
         
         ### First, performing perfect bp match extension (no read drop allowed) for all snarls
         print(f"#### RUNNING EXTENSION WITH NO DROPS, FRACTIONAL ALLOWED DROPS AND THEN MORE DROPS FOR HET ANCHORS ONLY ####")
         t0 = time.time()
-        self._helper_extension_loop(self.snarl_ids_sorted, anchors_to_remove, extension_iteration=0, is_het_round=True)
-        self._helper_extension_loop(self.snarl_ids_sorted, anchors_to_remove, extension_iteration=1, is_het_round=True)
-        self._helper_extension_loop(self.snarl_ids_sorted, anchors_to_remove, extension_iteration=2, is_het_round=True)
+        self._helper_extension_loop(snarl_order, anchors_to_remove, extension_iteration=0, is_het_round=True)
+        self._helper_extension_loop(snarl_order, anchors_to_remove, extension_iteration=1, is_het_round=True)
+        self._helper_extension_loop(snarl_order, anchors_to_remove, extension_iteration=2, is_het_round=True)
         print(f"..Regular extension of HET anchors took {time.time() - t0} seconds", flush=True, file=stderr)
 
         print(f"#### RUNNING EXTENSION WITH NO DROPS, FRACTIONAL ALLOWED DROPS AND THEN MORE DROPS FOR HOM ANCHORS ONLY ####")
         t1 = time.time()
-        self._helper_extension_loop(self.snarl_ids_sorted, anchors_to_remove, extension_iteration=0, is_het_round=False)
-        self._helper_extension_loop(self.snarl_ids_sorted, anchors_to_remove, extension_iteration=1, is_het_round=False)
-        self._helper_extension_loop(self.snarl_ids_sorted, anchors_to_remove, extension_iteration=2, is_het_round=False)            
+        self._helper_extension_loop(snarl_order, anchors_to_remove, extension_iteration=0, is_het_round=False)
+        self._helper_extension_loop(snarl_order, anchors_to_remove, extension_iteration=1, is_het_round=False)
+        self._helper_extension_loop(snarl_order, anchors_to_remove, extension_iteration=2, is_het_round=False)            
         print(f"..Regular extension of HOM anchors took {time.time() - t1} seconds", flush=True, file=stderr)
 
         print(f"#### TRY TO MERGE SHORTER ANCHORS ######")
         t2 = time.time()
-        valid_anchors = self.merge_anchors(valid_anchors, anchors_to_remove, self.snarl_ids_sorted, merging_round=0)
-        # valid_anchors = self.merge_anchors(valid_anchors, anchors_to_remove, snarl_ids_sorted, merging_round=1)   # Turned off for now as it yielded poor results
+        valid_anchors = self.merge_anchors(valid_anchors, anchors_to_remove, snarl_order, merging_round=0)
+        # valid_anchors = self.merge_anchors(valid_anchors, anchors_to_remove, snarl_order, merging_round=1)   # Turned off for now as it yielded poor results
         print(f"..Merging anchors took {time.time() - t2} seconds", flush=True, file=stderr)
 
         t3 = time.time()
         print(f"#### RUNNING INDEPENDENT ANCHOR EXTENSION ######")
         # Note: Now that snarl boundaries will not be the same as its anchors' boundaries, we will use 
         # self._helper_find_relevant_boundary_node_details_for_current_snarl() to calculate snarl's extreme boundaries on the fly
-        valid_anchors = self.extend_anchors_independently(snarl_ids_sorted=self.snarl_ids_sorted, valid_anchors=valid_anchors)
+        valid_anchors = self.extend_anchors_independently(snarl_order=snarl_order, valid_anchors=valid_anchors)
         print(f"..Independent anchor extension took {time.time() - t3} seconds", flush=True, file=stderr)
 
         print(f"#### PRUNING REPEAT ANCHORS ######")
         # Remove anchors with simple-repeat and homopolymer differences
-        valid_anchors_after_pruning, _ = self.prune_repeat_anchors(snarl_ids_sorted=self.snarl_ids_sorted, valid_anchors=valid_anchors)
+        valid_anchors_after_pruning, _ = self.prune_repeat_anchors(snarl_order=snarl_order, valid_anchors=valid_anchors)
+        self.snarl_ids_sorted = list(snarl_order)
 
         # Note: valid_anchors is a list of lists, where each nested list contains an anchor object and a list of reads
         for idx in range(len(valid_anchors)):
@@ -1192,13 +1496,69 @@ class AlignAnchor:
         return valid_anchors, valid_anchors_after_pruning    #### change this later to calculate valid_anchors_extended, when we will have anchor drops because of merging
 
 
-    def merge_anchors(self, valid_anchors: list, anchors_to_remove: list, snarl_ids_sorted: list, merging_round: int) -> list:
+    def _helper_is_short_het_snarl(self, snarl_id) -> bool:
+        """
+        Whether a snarl has more than one anchor and one of them is shorter than MIN_ANCHOR_LENGTH, i.e. merge_anchors tries to merge it with its neighbors.
+        """
+        snarl_anchors = self.snarl_to_anchors_dictionary.get(snarl_id, [])
+        return len(snarl_anchors) > 1 and min(anchor.basepairlength for anchor in snarl_anchors) < MIN_ANCHOR_LENGTH
+
+    def _helper_snarl_adjacency(self, left_snarl_id, right_snarl_id, snarl_read_ids: dict) -> SnarlAdjacency:
+        """
+        Computes the SnarlAdjacency of two consecutive snarls. The boundary nodes and occupied basepairs are the ones of the first anchor of each snarl.
+
+        Parameters
+        ----------
+        snarl_read_ids : dict
+            {snarl_id: ids of the reads of its anchors}, filled for the snarls not in it yet
+        """
+        left_snarl_anchors = self.snarl_to_anchors_dictionary.get(left_snarl_id, [])
+        right_snarl_anchors = self.snarl_to_anchors_dictionary.get(right_snarl_id, [])
+        if len(left_snarl_anchors) == 0 or len(right_snarl_anchors) == 0:
+            return SnarlAdjacency()
+        for snarl_id, snarl_anchors in ((left_snarl_id, left_snarl_anchors), (right_snarl_id, right_snarl_anchors)):
+            if snarl_id not in snarl_read_ids:
+                snarl_read_ids[snarl_id] = {read[READ_POSITION] for anchor in snarl_anchors for read in anchor.bp_matched_reads}
+        common_reads = len(snarl_read_ids[left_snarl_id] & snarl_read_ids[right_snarl_id])
+
+        left_snarl_end_node_id = max(left_snarl_anchors[0][0].id, left_snarl_anchors[0][-1].id)
+        right_snarl_start_node_id = min(right_snarl_anchors[0][0].id, right_snarl_anchors[0][-1].id)
+        if left_snarl_end_node_id != right_snarl_start_node_id:
+            return SnarlAdjacency(common_reads=common_reads)
+        shared_node_handle = self.graph.get_handle(left_snarl_end_node_id)
+        return SnarlAdjacency(
+            shared_node_id=left_snarl_end_node_id,
+            left_degree=self.graph.get_degree(shared_node_handle, True),
+            right_degree=self.graph.get_degree(shared_node_handle, False),
+            bp_occupied_fits=left_snarl_anchors[0].bp_occupied_end_node + right_snarl_anchors[0].bp_occupied_start_node == self.graph.get_length(shared_node_handle),
+            common_reads=common_reads,
+        )
+
+    def _helper_push_merge_candidates(self, merge_worklist: MergeWorklist, left_snarl_id, right_snarl_id, snarl_read_ids: dict) -> None:
+        """
+        Adds to merge_worklist the merges of two consecutive snarls allowed by their adjacency: the left snarl extended to the right and the right snarl extended to the left, for the short het ones.
+        The read drop of a candidate is the number of reads of the extended snarl not shared with the other snarl.
+        """
+        is_left_snarl_short_het = self._helper_is_short_het_snarl(left_snarl_id)
+        is_right_snarl_short_het = self._helper_is_short_het_snarl(right_snarl_id)
+        if not (is_left_snarl_short_het or is_right_snarl_short_het):
+            return
+        adjacency = self._helper_snarl_adjacency(left_snarl_id, right_snarl_id, snarl_read_ids)
+        if is_left_snarl_short_het and adjacency.can_merge(extend_left=False):
+            merge_worklist.push(len(snarl_read_ids[left_snarl_id]) - adjacency.common_reads, left_snarl_id, right_snarl_id, False)
+        if is_right_snarl_short_het and adjacency.can_merge(extend_left=True):
+            merge_worklist.push(len(snarl_read_ids[right_snarl_id]) - adjacency.common_reads, right_snarl_id, left_snarl_id, True)
+
+
+    def merge_anchors(self, valid_anchors: list, anchors_to_remove: list, snarl_order: OrderedSnarlList, merging_round: int) -> list:
         """
         * Iterate over shorter anchors, find adjacent snarls (+1/-1). If read drop from one snarl to the other is within the defined threshold,
         then merge the snarls. Get all combinations of anchors (required it belongs to atleast one path) and re-define this as a new anchor,
         with common reads and newly computed bplength, snarl_id and pathnames.
 
-        * If both left, right anchors are available for merging, choose the direction where read coverage drop is minimum
+        * If both left, right anchors are available for merging, choose the direction where read coverage drop is minimum.
+        The candidate merges are taken from the adjacency of consecutive snarls (SnarlAdjacency) and processed from a MergeWorklist, lowest read drop first.
+        A merged snarl and its neighbors get new candidates, so no snarl is rescanned.
             # get snarl direction (0 -> forward, 1 -> backward)
             # when merging anchors, if orientation of other anchor is opposite to that of current, do the following:-
             # 1.) flip other anchor
@@ -1210,110 +1570,40 @@ class AlignAnchor:
         # anchors_to_remove = []   # {(snarl_id, anchor)}
         snarl_orientation = True
 
-        # snarl_ids_sorted = sorted(list(self.snarl_to_anchors_dictionary.keys()))
-        snarl_ids_list_idx = 0    # we need to use this index counter (and can't simply use an iterator) because we will be inserting/deleting the snarl_ids_sorted list on the go
-        # Note: Remember to update the snarl_ids_list_idx appropriately when merging snarls
-        while snarl_ids_list_idx < len(snarl_ids_sorted):
-            current_snarl_id = snarl_ids_sorted[snarl_ids_list_idx]
-            last_snarl_id = -1
-            current_snarl_anchors = self.snarl_to_anchors_dictionary[current_snarl_id]
-            min_anchor_length_in_snarl = min([anchor.basepairlength for anchor in current_snarl_anchors])
-            # if len(current_snarl_anchors) > 1 and min_anchor_length_in_snarl < MIN_ANCHOR_LENGTH:
-
-            while (
-                len(current_snarl_anchors) > 1 
-                and (min_anchor_length_in_snarl < MIN_ANCHOR_LENGTH
-                and last_snarl_id != current_snarl_id)
-            ):
-                current_snarl_id = snarl_ids_sorted[snarl_ids_list_idx]
-                last_snarl_id = current_snarl_id
-
-                # recalculating left and right nodes in graph for extension/merging
-                if snarl_orientation:
-                    # even if 0-th anchor of snarl is reversed, snarl_start and snarl_end should be in increasing order of node ids (if snarl_orientation = True)
-                    print(f"########################", end="\n")
-                    print(f"Processing SNARL ID: {current_snarl_id}")
-                    print(f"####### Trying left 1-degree node extension")
-                    current_snarl_start_id = min(current_snarl_anchors[0][0].id, current_snarl_anchors[0][-1].id)   # change this variable to current_snarl_start_node_id
-                    print(f"Current snarl start node is {current_snarl_start_id}")
-                    go_left_bool = True
-                    current_snarl_start_handle = self.graph.get_handle(current_snarl_start_id)
-                    extend_left = True
-
-                    # Get left snarl's ID
-                    left_snarl_id = snarl_ids_sorted[snarl_ids_sorted.index(current_snarl_id) - 1] if (snarl_ids_sorted.index(current_snarl_id) - 1 >= 0) else -1 
-                    left_snarl_end_node_id = -1
-                    if (
-                            self.snarl_to_anchors_dictionary.get(left_snarl_id) != None
-                            and len(self.snarl_to_anchors_dictionary[left_snarl_id]) > 0
-                        ):
-                        # Get left snarl's end node. We need this to later check if our current snarl could be extended in the left direction 
-                        # or not, i.e. if the left snarl has already extended it's end boundary, we need that information.
-                        left_snarl_end_node_id =  max(self.snarl_to_anchors_dictionary[left_snarl_id][0][0].id, self.snarl_to_anchors_dictionary[left_snarl_id][0][-1].id)
-                        print(f"Snarl on the left is {left_snarl_id}, and it's end node is {left_snarl_end_node_id}")
-                    
-                    left_degree = self.graph.get_degree(current_snarl_start_handle, go_left_bool)
-                    print(f"..left_degree of {current_snarl_start_id} is {left_degree}")
-                    if (
-                        left_degree == 2
-                        and left_snarl_end_node_id != -1
-                        and left_snarl_end_node_id == current_snarl_start_id
-                        and self.snarl_to_anchors_dictionary[left_snarl_id][0].bp_occupied_end_node + self.snarl_to_anchors_dictionary[current_snarl_id][0].bp_occupied_start_node == self.graph.get_length(current_snarl_start_handle)
-                    ):
-                        # try merging to one direction
-                        print(f"    ..Trying _extending_anchors_by_merging in left")
-                        current_snarl_anchors, snarl_ids_list_idx = self._extending_anchors_by_merging(snarl_ids_sorted, snarl_ids_list_idx, current_snarl_id, left_snarl_id, current_snarl_anchors, extend_left=extend_left, anchors_to_discard=anchors_to_remove, snarl_orientation=snarl_orientation, merging_round=merging_round)
-                        print(f"    ..#anchors returned after merging snarls {current_snarl_id} and {left_snarl_id}: ", len(current_snarl_anchors))
-                        print(f"    ..new snarl id after merging is: {current_snarl_anchors[0].snarl_id}")
-                        if current_snarl_anchors[0].snarl_id != current_snarl_id:
-                            valid_anchors.extend([[anchor_i, anchor_i.bp_matched_reads] for anchor_i in current_snarl_anchors])
-                    min_anchor_length_in_snarl = min([anchor.basepairlength for anchor in current_snarl_anchors])
-                    if min_anchor_length_in_snarl >= MIN_ANCHOR_LENGTH:
-                        break
-
-                    extend_left = not extend_left
-                    current_snarl_id = snarl_ids_sorted[snarl_ids_list_idx]
-                    current_snarl_end_id = max(current_snarl_anchors[0][0].id, current_snarl_anchors[0][-1].id)
-                    print(f"Current snarl end node is {current_snarl_end_id}")
-                    current_snarl_end_handle = self.graph.get_handle(current_snarl_end_id)
-                    
-                    right_snarl_id = snarl_ids_sorted[snarl_ids_sorted.index(current_snarl_id) + 1] if (snarl_ids_sorted.index(current_snarl_id) + 1 < len(snarl_ids_sorted)) else -1 
-                    right_snarl_start_node_id = 100000000000000
-                    if (
-                        self.snarl_to_anchors_dictionary.get(right_snarl_id) != None
-                        and len(self.snarl_to_anchors_dictionary[right_snarl_id]) > 0
-                    ):
-                        right_snarl_start_node_id = min(self.snarl_to_anchors_dictionary[right_snarl_id][0][0].id, self.snarl_to_anchors_dictionary[right_snarl_id][0][-1].id) 
-                        print(f"Snarl on the right is {right_snarl_id}, and it's start node is {right_snarl_start_node_id}")
-
-                    right_degree = self.graph.get_degree(current_snarl_end_handle, not go_left_bool)
-                    print(f"..right_degree of {current_snarl_end_id} is {right_degree}")
-                    if (
-                        right_degree == 2
-                        and right_snarl_start_node_id != 100000000000000
-                        and right_snarl_start_node_id == current_snarl_end_id
-                        and self.snarl_to_anchors_dictionary[right_snarl_id][0].bp_occupied_start_node + self.snarl_to_anchors_dictionary[current_snarl_id][0].bp_occupied_end_node == self.graph.get_length(current_snarl_end_handle)
-                    ):
-                        # current_snarl_id is fetched from list again, as it might have been updated in left-extension
-                        current_snarl_id = snarl_ids_sorted[snarl_ids_list_idx]
-                        print(f"    ..Trying _extending_anchors_by_merging in right")
-                        current_snarl_anchors, snarl_ids_list_idx = self._extending_anchors_by_merging(snarl_ids_sorted, snarl_ids_list_idx, current_snarl_id, right_snarl_id, current_snarl_anchors, extend_left=extend_left, anchors_to_discard=anchors_to_remove, snarl_orientation=snarl_orientation, merging_round=merging_round)
-                        print(f"    ..#anchors returned after merging snarls {current_snarl_id} and {right_snarl_id}: ", len(current_snarl_anchors))
-                        print(f"    ..new snarl id after merging is: {current_snarl_anchors[0].snarl_id}")
-
-                        if current_snarl_anchors[0].snarl_id != current_snarl_id:
-                            valid_anchors.extend([[anchor_i, anchor_i.bp_matched_reads] for anchor_i in current_snarl_anchors])
-                        print(f"finished extending snarl {current_snarl_id}")
-                    min_anchor_length_in_snarl = min([anchor.basepairlength for anchor in current_snarl_anchors])
-                current_snarl_id = snarl_ids_sorted[snarl_ids_list_idx]
-
-            snarl_ids_list_idx += 1
+        # the merge candidates of the short het snarls with their neighbors, from the adjacency of consecutive snarls, lowest read drop first
+        merge_worklist = MergeWorklist(snarl_order)
+        snarl_read_ids = {}   # {snarl_id: ids of the reads of its anchors}
+        ordered_snarl_ids = list(snarl_order)
+        for left_snarl_id, right_snarl_id in zip(ordered_snarl_ids, ordered_snarl_ids[1:]):
+            self._helper_push_merge_candidates(merge_worklist, left_snarl_id, right_snarl_id, snarl_read_ids)
+        print(f"{len(merge_worklist)} merge candidates found", file=stderr)
+
+        merge_candidate = merge_worklist.pop()
+        while merge_candidate is not None:
+            current_snarl_id, other_snarl_id, extend_left = merge_candidate
+            print(f"########################", end="\n")
+            print(f"Processing SNARL ID: {current_snarl_id}")
+            print(f"    ..Trying _extending_anchors_by_merging in", "left" if extend_left else "right", f"with snarl {other_snarl_id}")
+            current_snarl_anchors, merged_snarl_id = self._extending_anchors_by_merging(snarl_order, current_snarl_id, other_snarl_id, self.snarl_to_anchors_dictionary[current_snarl_id], extend_left=extend_left, anchors_to_discard=anchors_to_remove, snarl_orientation=snarl_orientation, merging_round=merging_round)
+            print(f"    ..#anchors returned after merging snarls {current_snarl_id} and {other_snarl_id}: ", len(current_snarl_anchors))
+            if merged_snarl_id != current_snarl_id:
+                print(f"    ..new snarl id after merging is: {merged_snarl_id}")
+                valid_anchors.extend([[anchor_i, anchor_i.bp_matched_reads] for anchor_i in current_snarl_anchors])
+                # the candidates of the merged snarl and of its neighbors towards it
+                left_snarl_id = snarl_order.prev(merged_snarl_id)
+                if left_snarl_id is not None:
+                    self._helper_push_merge_candidates(merge_worklist, left_snarl_id, merged_snarl_id, snarl_read_ids)
+                right_snarl_id = snarl_order.next(merged_snarl_id)
+                if right_snarl_id is not None:
+                    self._helper_push_merge_candidates(merge_worklist, merged_snarl_id, right_snarl_id, snarl_read_ids)
+            merge_candidate = merge_worklist.pop()
 
         # now loop over valid_anchors dict to drop all anchors in anchors_to_remove
+        anchor_ids_to_remove = {anchor.anchor_id for anchor in anchors_to_remove}
         for anchor, reads in valid_anchors:
             if isinstance(anchor.snarl_id, str) and "-" in anchor.snarl_id:
                 print(f"snarl {anchor.snarl_id} before adding")
-            if anchor not in anchors_to_remove:
+            if anchor.anchor_id not in anchor_ids_to_remove:
                 if isinstance(anchor.snarl_id, str) and "-" in anchor.snarl_id:
                     print(f"snarl {anchor.snarl_id} after adding")
                 read_info_for_anchor_to_shasta = [read[:4] for read in anchor.bp_matched_reads]
@@ -1357,9 +1647,10 @@ class AlignAnchor:
         
         valid_anchors = []
         valid_anchors_to_extend = []
+        self.release_graph()
 
-        for sentinel in self.anchor_reads_dict:
-            for id, reads in enumerate(self.anchor_reads_dict[sentinel]):   # A sentinel could have multiple anchors. Those are interated over by the "id"
+        for sentinel in self.sentinel_to_anchor:
+            for id, reads in enumerate(self.anchor_reads_dict.get(sentinel, [])):   # A sentinel could have multiple anchors. Those are interated over by the "id"
                 if len(reads) > MIN_ANCHOR_READS:
                     anchor = self.sentinel_to_anchor[sentinel][id]
                     snarl_id = anchor.snarl_id
@@ -1371,7 +1662,7 @@ class AlignAnchor:
                         read[1] = 0 if read[1] else 1
                         anchor_reads.append(read)
                         # Record final coverage
-                        self.anchor_coverage.record_final_coverage(f"{anchor!r}", read[0])
+                        self.anchor_coverage.record_final_coverage(anchor, read[0])
 
                     anchor = self.sentinel_to_anchor[sentinel][id]
                     valid_anchors.append([anchor, anchor_reads])
@@ -1380,6 +1671,9 @@ class AlignAnchor:
         dump_to_jsonl([[f"{anchor!r}", reads] for anchor, reads in valid_anchors], out_file_path)   # dump valid_anchors (primary-anchors pre-extension and unreliable snarl filtering)
         
         self.snarl_ids_sorted = sorted(list(self.snarl_to_anchors_dictionary.keys()))
+        self.build_read_to_snarl_index()
+        if self.linkage_mode == "window":
+            self.build_snarl_windows()
         
         print(f"######### FINDING RELIABLE SNARLS #########")
         t0 = time.time()
@@ -1417,7 +1711,9 @@ class AlignAnchor:
         print(f"######### DUMPING OUTPUTS #########")
         dump_to_jsonl([[f"{anchor!r}", reads] for anchor, reads in self.valid_anchors_extended], extended_out_file_path)   # also dumping valid_anchors_extended
         dump_to_jsonl([[f"{anchor!r}", reads] for anchor, reads in self.valid_anchors_extended_pruned], extended_pruned_out_file_path)   # also dumping valid_anchors_extended_pruned
-        dump_to_jsonl(self.anchor_read_tracking_dict, anchor_read_tracking_file_path)    # currently, read drop during snarl merging is not being tracked
+        dump_to_jsonl(self.read_drop_log.to_tracking_dict(), anchor_read_tracking_file_path)    # currently, read drop during snarl merging is not being tracked
+        if self.read_drops_out_file_path is not None:
+            self.read_drop_log.dump_jsonl(self.read_drops_out_file_path)
         dump_to_jsonl(self.independent_anchor_extension_tracking_dict, independent_anchor_read_tracking_file_path)    # dumping independent anchor extension tracking
 
         # Save coverage statistics
@@ -1426,19 +1722,80 @@ class AlignAnchor:
         return valid_anchors
 
 
-    def _find_linked_snarls_for_current_snarl(self, current_snarl_id: str) -> dict:
+    def build_read_to_snarl_index(self) -> None:
+        """
+        Builds, once the valid anchors are collected in snarl_to_anchors_dictionary, the read bitsets of the anchors of each snarl in snarl_ids_sorted and the inverted index from each read to the (snarl_id, anchor_idx) of the anchors it matches.
+        The reads are interned walking the snarls in order, so that the reads of an anchor get close ids and its bitset stays small.
+        The linked snarls of a snarl are then found from the snarls its reads hit, instead of comparing it with every other snarl.
+        """
+        self.read_interner = ReadInterner()
+        self.read_to_snarl_anchors = []
+        self.snarl_anchor_read_bitsets = {}
+        self.snarl_read_bitsets = {}
+        self.snarl_sort_positions = {snarl_id: position for position, snarl_id in enumerate(self.snarl_ids_sorted)}
+        for snarl_id in self.snarl_ids_sorted:
+            anchor_read_bitsets = []
+            for anchor_idx, anchor in enumerate(self.snarl_to_anchors_dictionary[snarl_id]):
+                anchor_read_ids = {self.read_interner.intern(read[READ_ID]) for read in anchor.bp_matched_reads}
+                while len(self.read_to_snarl_anchors) < len(self.read_interner.read_names):
+                    self.read_to_snarl_anchors.append([])
+                for read_id in anchor_read_ids:
+                    self.read_to_snarl_anchors[read_id].append((snarl_id, anchor_idx))
+                anchor_read_bitsets.append(ReadBitset.from_ids(anchor_read_ids))
+            self.snarl_anchor_read_bitsets[snarl_id] = anchor_read_bitsets
+            self.snarl_read_bitsets[snarl_id] = ReadBitset.union(anchor_read_bitsets)
+
+
+    def build_snarl_windows(self) -> None:
+        """
+        Places the snarls of snarl_ids_sorted on the reference, at the genomic_position of their first placed anchor, and finds with a sweep over the sorted positions the window of each snarl: the snarls of the same chromosome within max_read_length * (1 + LINKAGE_WINDOW_SLACK) basepairs, the only ones that can share reads with it.
+        Snarls without a placed anchor cannot be windowed: they are compared with all the snarls, and all the snarls with them.
+        """
+        placed_snarls = []
+        self.unplaced_snarl_ids = []
+        for snarl_id in self.snarl_ids_sorted:
+            placed_anchor = next((anchor for anchor in self.snarl_to_anchors_dictionary[snarl_id] if anchor.genomic_position > 0), None)
+            if placed_anchor is None:
+                self.unplaced_snarl_ids.append(snarl_id)
+            else:
+                placed_snarls.append((placed_anchor.chromosome, placed_anchor.genomic_position, self.snarl_sort_positions[snarl_id], snarl_id))
+        placed_snarls.sort()
+        self.window_snarl_ids = [snarl_id for _, _, _, snarl_id in placed_snarls]
+
+        window_size = int(self.max_read_length * (1 + LINKAGE_WINDOW_SLACK))
+        self.snarl_window_ranges = {}
+        window_start = window_end = 0
+        for idx, (chromosome, position, _, snarl_id) in enumerate(placed_snarls):
+            while placed_snarls[window_start][0] != chromosome or placed_snarls[window_start][1] < position - window_size:
+                window_start += 1
+            window_end = max(window_end, idx + 1)
+            while window_end < len(placed_snarls) and placed_snarls[window_end][0] == chromosome and placed_snarls[window_end][1] <= position + window_size:
+                window_end += 1
+            self.snarl_window_ranges[snarl_id] = (window_start, window_end)
+
+        mean_window = sum(end - start for start, end in self.snarl_window_ranges.values()) / max(1, len(self.snarl_window_ranges))
+        print(f"Linkage windows of {window_size} bp: {len(self.window_snarl_ids)} placed snarls ({mean_window:.1f} snarls per window), {len(self.unplaced_snarl_ids)} unplaced snarls", file=stderr)
+
+
+    def _window_candidate_snarls(self, snarl_id) -> list:
+        """
+        Returns the snarls that can be linked to a snarl in window linkage mode.
+        """
+        if snarl_id not in self.snarl_window_ranges:
+            return self.snarl_ids_sorted
+        window_start, window_end = self.snarl_window_ranges[snarl_id]
+        return self.window_snarl_ids[window_start:window_end] + self.unplaced_snarl_ids
+
+
+    def _find_linked_snarls_for_current_snarl(self, current_snarl_id: str, linkage_threshold: int = MIN_SNARL_LINKAGE_THRESHOLD) -> dict:
         """
         Find snarls linked to the current snarl and count the common reads. 
-        For S an informative linked snarl T is one such that there exist at least k shared reads and in each of S and T the shared reads are partitioned into at least two alleles/anchors.
+        For S an informative linked snarl T is one such that there exist at least k (linkage_threshold) shared reads and in each of S and T the shared reads are partitioned into at least two alleles/anchors.
+        The shared reads are counted walking the read_to_snarl_anchors index from the reads of the current snarl or, in window linkage mode, intersecting its reads with the ones of the snarls in its window. The linked snarls are returned in snarl_ids_sorted order.
         """
         linked_snarl_counts = {}
 
-        # Precompute read sets for each anchor in the current snarl
-        current_snarl_anchor_sets = [
-            {read[0] for read in anchor.bp_matched_reads}
-            for anchor in self.snarl_to_anchors_dictionary[current_snarl_id]
-        ]
-        all_current_reads = set().union(*current_snarl_anchor_sets)
+        all_current_reads = self.snarl_read_bitsets[current_snarl_id]
 
         # Populate the snarl_coverage dictionary
         self.snarl_coverage_dict[current_snarl_id] = len(all_current_reads)
@@ -1449,32 +1806,50 @@ class AlignAnchor:
             for idx, anchor in enumerate(self.snarl_to_anchors_dictionary[current_snarl_id])
         }
 
-        for other_snarl_id in self.snarl_ids_sorted:
-            if other_snarl_id == current_snarl_id:
-                continue  # skip self-comparison
-
-            other_snarl_anchors = self.snarl_to_anchors_dictionary[other_snarl_id]
-            # Precompute read sets for other snarl anchors
-            other_snarl_anchor_sets = [
-                {read[0] for read in anchor.bp_matched_reads}
-                for anchor in other_snarl_anchors
-            ]
-            all_other_reads = set().union(*other_snarl_anchor_sets)
+        # for each other snarl hit by the reads of the current snarl: the number of shared reads and the anchors of both snarls the shared reads are in, as bit masks of the anchor indexes
+        common_read_counts = defaultdict(int)
+        current_snarl_partitions = defaultdict(int)
+        other_snarl_partitions = defaultdict(int)
+        if self.linkage_mode == "window":
+            current_snarl_bitsets = self.snarl_anchor_read_bitsets[current_snarl_id]
+            for other_snarl_id in self._window_candidate_snarls(current_snarl_id):
+                shared_reads = all_current_reads & self.snarl_read_bitsets[other_snarl_id]
+                if other_snarl_id == current_snarl_id or not shared_reads:
+                    continue
+                common_read_counts[other_snarl_id] = len(shared_reads)
+                for anchor_idx, anchor_read_bitset in enumerate(current_snarl_bitsets):
+                    if anchor_read_bitset & shared_reads:
+                        current_snarl_partitions[other_snarl_id] |= 1 << anchor_idx
+                for anchor_idx, anchor_read_bitset in enumerate(self.snarl_anchor_read_bitsets[other_snarl_id]):
+                    if anchor_read_bitset & shared_reads:
+                        other_snarl_partitions[other_snarl_id] |= 1 << anchor_idx
 
-            shared_reads = all_current_reads & all_other_reads
-            total_common_reads = len(shared_reads)
-
-            if total_common_reads < MIN_SNARL_LINKAGE_THRESHOLD:
+        else:
+            for read_id in all_current_reads.ids():
+                current_anchor_mask = 0
+                other_snarl_anchor_masks = {}
+                for snarl_id, anchor_idx in self.read_to_snarl_anchors[read_id]:
+                    if snarl_id == current_snarl_id:
+                        current_anchor_mask |= 1 << anchor_idx
+                    elif snarl_id in self.snarl_sort_positions:
+                        other_snarl_anchor_masks[snarl_id] = other_snarl_anchor_masks.get(snarl_id, 0) | (1 << anchor_idx)
+                for other_snarl_id, anchor_mask in other_snarl_anchor_masks.items():
+                    common_read_counts[other_snarl_id] += 1
+                    current_snarl_partitions[other_snarl_id] |= current_anchor_mask
+                    other_snarl_partitions[other_snarl_id] |= anchor_mask
+
+        for other_snarl_id in sorted(common_read_counts, key=self.snarl_sort_positions.get):
+            total_common_reads = common_read_counts[other_snarl_id]
+
+            if total_common_reads < linkage_threshold:
                 continue
             
             # Check that shared reads are partitioned into at least two alleles in the current snarl
-            current_snarl_partitions = sum(1 for anchor_read_set in current_snarl_anchor_sets if anchor_read_set & shared_reads)
-            if current_snarl_partitions < 2:
+            if bin(current_snarl_partitions[other_snarl_id]).count("1") < 2:
                 continue
 
             # Check that shared reads are partitioned into at least two alleles in the other snarl
-            other_snarl_partitions = sum(1 for anchor_read_set in other_snarl_anchor_sets if anchor_read_set & shared_reads)
-            if other_snarl_partitions < 2:
+            if bin(other_snarl_partitions[other_snarl_id]).count("1") < 2:
                 continue
 
             # print(f"Found {total_common_reads} common reads between {current_snarl_id} and {other_snarl_id}")
@@ -1508,42 +1883,21 @@ class AlignAnchor:
         return False
        
 
-    def _are_snarls_compatible(self, primary_snarl: str, other_snarl: str) -> bool:
+    def _snarl_pair_read_partitions(self, primary_snarl: str, other_snarl: str) -> tuple:
         """
-        Check if two snarls are compatible: 
-        S and T linked snarls are consistent if the partition of the shared reads is the "same" in both.
-        This means the shared reads should be partitioned identically across the anchors in both snarls.
-        For example:
-            * Primary snarl has read partitions {1,2,3} and {4,5,6} and other snarl has read partitions {4,5,6} and {1,2,3}, then they are compatible.
-            * Primary snarl has read partitions {1,2,3} and {4,5,6} and other snarl has read partitions {4,5,6} and {1,2,3,7}, then they are not compatible.
-            * Primary snarl has read partitions {1,2,3}, {4,5,6}, {7,8,9} and other snarl has read partitions {1,2,3,4,5,6}, {7,8,9} then they are not compatible.
+        Returns the partitions of the reads shared by two snarls: for each snarl, the non empty sets of shared reads of its anchors.
+        The read sets are the ReadBitset of the anchors built by build_read_to_snarl_index, intersections are ANDs.
         """
-
-        # Collect all read IDs in other_snarl
-        other_snarl_reads = {
-            read[READ_ID]
-            for anchor in self.snarl_to_anchors_dictionary[other_snarl]
-            for read in anchor.bp_matched_reads
-        }
+        primary_snarl_bitsets = self.snarl_anchor_read_bitsets[primary_snarl]
+        other_snarl_bitsets = self.snarl_anchor_read_bitsets[other_snarl]
 
         # Find common reads between primary and other snarls
-        common_reads = {
-            read[READ_ID]
-            for anchor in self.snarl_to_anchors_dictionary[primary_snarl]
-            for read in anchor.bp_matched_reads
-            if read[READ_ID] in other_snarl_reads
-        }
-        # print(f".. {len(common_reads)} Common reads: {common_reads}")
+        common_reads = ReadBitset.union(primary_snarl_bitsets) & ReadBitset.union(other_snarl_bitsets)
+        # print(f".. {len(common_reads)} Common reads: {self.read_interner.names(common_reads)}")
 
         # Filter both snarls' anchors to include only common reads
-        primary_sets = [
-            {read[READ_ID] for read in anchor.bp_matched_reads if read[READ_ID] in common_reads}
-            for anchor in self.snarl_to_anchors_dictionary[primary_snarl]
-        ]
-        other_sets = [
-            {read[READ_ID] for read in anchor.bp_matched_reads if read[READ_ID] in common_reads}
-            for anchor in self.snarl_to_anchors_dictionary[other_snarl]
-        ]
+        primary_sets = [read_bitset & common_reads for read_bitset in primary_snarl_bitsets]
+        other_sets = [read_bitset & common_reads for read_bitset in other_snarl_bitsets]
 
         # Remove empty sets (anchors with no common reads)
         primary_sets = [s for s in primary_sets if s]
@@ -1552,52 +1906,97 @@ class AlignAnchor:
         # print(f"Current primary snarl: {primary_snarl}, other snarl: {other_snarl}")
         # print(f"..Primary sets: {primary_sets}")
         # print(f"..Other sets: {other_sets}")
+        return primary_sets, other_sets
+
 
-        # Store the partitions for debugging and analysis
+    def _record_snarl_read_partitions(self, primary_snarl: str, other_snarl: str, primary_partitions: list, other_partitions: list) -> None:
+        """
+        Stores the read partitions (lists of read names) of a pair of linked snarls for debugging and analysis, once per pair, under the snarl with the smaller id.
+        """
         if (int(primary_snarl.split("-")[0]) if isinstance(primary_snarl, str) else primary_snarl) < (int(other_snarl.split("-")[0]) if isinstance(other_snarl, str) else other_snarl):
             if primary_snarl not in self.snarl_read_partitions_dict:
                 self.snarl_read_partitions_dict[primary_snarl] = {}
             if other_snarl not in self.snarl_read_partitions_dict[primary_snarl]:
                 self.snarl_read_partitions_dict[primary_snarl][other_snarl] = {
-                    "primary": [list(s) for s in primary_sets],
-                    "other": [list(s) for s in other_sets]
+                    "primary": primary_partitions,
+                    "other": other_partitions
                 }
 
-        def _are_sets_equal_with_error_tolerance(primary_sets, other_sets, error_tolerance=0.1):
-            """
-            Check if two sets are equal with error tolerance.
-            """
-            if len(primary_sets) != len(other_sets):
-                return (False, "False")
-                # return (self._are_unequal_number_of_sets_compatible(primary_sets, other_sets) if ENABLE_UNEQUAL_SET_COMPATIBILITY else False)
-            other_sets_copy = copy.deepcopy(other_sets)
-            for primary_set in primary_sets:
-                best_matched_intersection_set_size = 0
-                best_matched_other_set = None
-                for other_set in other_sets_copy:
-                    intersection_set = primary_set & other_set 
-                    tolerated_error_read_count_primary = len(primary_set) * error_tolerance
-                    tolerated_error_read_count_other = len(other_set) * error_tolerance
-                    if (len(primary_set) - len(intersection_set) <= tolerated_error_read_count_primary) and (len(other_set) - len(intersection_set) <= tolerated_error_read_count_other):
-                        if len(intersection_set) > best_matched_intersection_set_size:
-                            best_matched_intersection_set_size = len(intersection_set)
-                            best_matched_other_set = other_set
-                if best_matched_intersection_set_size == 0:
-                    return (False, "False")
-                other_sets_copy.remove(best_matched_other_set)
-            # Check if all read sets are above a coverage threshold
-            for primary_set in primary_sets:
-                if len(primary_set) < MIN_READS_FOR_PARTITION_COMPATIBILITY:
-                    return (False, "False_lowCov") # if the primary set has less than MIN_READS_FOR_PARTITION_COMPATIBILITY, then the partitions are not compatible
-            return (True, "True")
-
-        is_compatible, desc = _are_sets_equal_with_error_tolerance(primary_sets, other_sets, error_tolerance=ERROR_TOLERANCE_IN_COMPATIBILITY_CHECK)
-        if is_compatible:
-            return (True, "True")
-        else:
-            if desc == "False_lowCov":
-                return (False, "False_lowCov")
-            return (False, "False")
+
+    def _are_partitions_compatible(self, primary_sets: list, other_sets: list) -> tuple:
+        """
+        Check if two snarls are compatible: 
+        S and T linked snarls are consistent if the partition of the shared reads is the "same" in both.
+        This means the shared reads should be partitioned identically across the anchors in both snarls.
+        For example:
+            * Primary snarl has read partitions {1,2,3} and {4,5,6} and other snarl has read partitions {4,5,6} and {1,2,3}, then they are compatible.
+            * Primary snarl has read partitions {1,2,3} and {4,5,6} and other snarl has read partitions {4,5,6} and {1,2,3,7}, then they are not compatible.
+            * Primary snarl has read partitions {1,2,3}, {4,5,6}, {7,8,9} and other snarl has read partitions {1,2,3,4,5,6}, {7,8,9} then they are not compatible.
+
+        The partitions are the ones returned by _snarl_pair_read_partitions, intersections and sizes are ANDs and popcounts, and the check itself is compatibility_cache.are_partitions_compatible, which vg_anchor reliable-snarls replays on the stored sizes.
+        """
+        primary_sizes, other_sizes, intersection_sizes = self._partition_sizes(primary_sets, other_sets)
+        return are_partitions_compatible(primary_sizes, other_sizes, intersection_sizes)
+
+
+    def _partition_sizes(self, primary_sets: list, other_sets: list) -> tuple:
+        """
+        Returns the sizes of the read partitions of two snarls and of their intersections (primary x other), all the compatibility check needs.
+        """
+        primary_sizes = [len(primary_set) for primary_set in primary_sets]
+        other_sizes = [len(other_set) for other_set in other_sets]
+        intersection_sizes = [[len(primary_set & other_set) for other_set in other_sets] for primary_set in primary_sets]
+        return primary_sizes, other_sizes, intersection_sizes
+
+
+    def _find_reliable_snarls_chunk(self, chunk_snarl_ids: list) -> list:
+        """
+        Finds the linked snarls, the coverages and the compatibility of the owned pairs of the snarls of a chunk of snarl_ids_sorted. Run by map_on_fork, possibly in a worker process, so the results are returned and not stored.
+        A pair of linked snarls is owned by the snarl coming later in snarl_ids_sorted: the serial loop checked each pair from both snarls and kept the check of the later one.
+
+        Returns
+        -------
+        list
+            For each snarl, a dictionary with its coverage, allelic coverage, linked snarls with their common read counts, for each owned pair (is_compatible, desc, read partitions of the snarl, read partitions of the linked snarl) and, when snarl_pairs_out_file_path is set, the summaries of its owned pairs for the SnarlPairCache
+        """
+        chunk_results = []
+        for snarl_id in chunk_snarl_ids:
+            if self.snarl_pairs_out_file_path is None:
+                linked_snarls_with_counts = self._find_linked_snarls_for_current_snarl(snarl_id)
+                candidate_snarls_with_counts = linked_snarls_with_counts
+            else:
+                # the pairs sharing a single read are kept for the snarl pair cache, so that it can be evaluated with lower linkage thresholds
+                candidate_snarls_with_counts = self._find_linked_snarls_for_current_snarl(snarl_id, linkage_threshold=1)
+                linked_snarls_with_counts = {
+                    linked_snarl_id: count for linked_snarl_id, count in candidate_snarls_with_counts.items() if count >= MIN_SNARL_LINKAGE_THRESHOLD
+                }
+            pair_compatibility = {}
+            snarl_pairs = []
+            for linked_snarl_id, count in candidate_snarls_with_counts.items():
+                if self.snarl_sort_positions[linked_snarl_id] > self.snarl_sort_positions[snarl_id]:
+                    continue
+                primary_sets, other_sets = self._snarl_pair_read_partitions(snarl_id, linked_snarl_id)
+                primary_sizes, other_sizes, intersection_sizes = self._partition_sizes(primary_sets, other_sets)
+                if self.snarl_pairs_out_file_path is not None:
+                    snarl_pairs.append((linked_snarl_id, count, other_sizes, primary_sizes, intersection_sizes))
+                if linked_snarl_id not in linked_snarls_with_counts:
+                    continue
+                is_compatible, desc = are_partitions_compatible(primary_sizes, other_sizes, intersection_sizes)
+                pair_compatibility[linked_snarl_id] = (
+                    is_compatible,
+                    desc,
+                    [self.read_interner.names(s) for s in primary_sets],
+                    [self.read_interner.names(s) for s in other_sets],
+                )
+            chunk_results.append({
+                "snarl_id": snarl_id,
+                "coverage": self.snarl_coverage_dict[snarl_id],
+                "allelic_coverage": self.snarl_allelic_coverage_dict[snarl_id],
+                "linked_snarl_counts": linked_snarls_with_counts,
+                "pair_compatibility": pair_compatibility,
+                "snarl_pairs": snarl_pairs,
+            })
+        return chunk_results
 
 
     def find_reliable_snarls(self, valid_anchors: list, reliable_snarls_out_file_path: str, snarl_variant_type_out_file_path: str, snarl_compatibility_out_file_path: str, snarl_common_reads_out_file_path: str, snarl_read_partitions_out_file_path: str, snarl_coverage_out_file_path: str, snarl_allelic_coverage_out_file_path: str) -> list:
@@ -1607,7 +2006,15 @@ class AlignAnchor:
         self.snarl_common_reads_dict = {}
         self.snarl_read_partitions_dict = {}
         valid_anchors_from_reliable_snarls = []
-        
+
+        # linkage and compatibility, computed on contiguous chunks of snarls (in parallel with threads > 1)
+        snarl_results = {}
+        snarl_chunks = split_in_chunks(self.snarl_ids_sorted, self.threads * RELIABLE_SNARL_CHUNKS_PER_THREAD)
+        for chunk_results in map_on_fork(self, "_find_reliable_snarls_chunk", snarl_chunks, self.threads):
+            for snarl_result in chunk_results:
+                snarl_results[snarl_result["snarl_id"]] = snarl_result
+
+        # the results are merged following the order of the serial loop, so that the dictionaries (and their dumps) do not depend on the number of threads
         for snarl_id in self.snarl_ids_sorted:
             # Populate the snarl_variant_type dictionary (SNP or INDEL)
             anchor_sentinel_lengths = []
@@ -1623,7 +2030,10 @@ class AlignAnchor:
                 self.snarl_variant_type_dict[snarl_id] = "INDEL"
             
             #### 1. Find linked snarls and their common read counts
-            linked_snarls_with_counts = self._find_linked_snarls_for_current_snarl(snarl_id)
+            snarl_result = snarl_results[snarl_id]
+            self.snarl_coverage_dict[snarl_id] = snarl_result["coverage"]
+            self.snarl_allelic_coverage_dict[snarl_id] = snarl_result["allelic_coverage"]
+            linked_snarls_with_counts = snarl_result["linked_snarl_counts"]
             self.snarl_common_reads_dict[snarl_id] = linked_snarls_with_counts
             linked_snarls_for_current_snarl = list(linked_snarls_with_counts.keys())
             self.linked_snarls_dictionary[snarl_id] = linked_snarls_for_current_snarl
@@ -1637,8 +2047,12 @@ class AlignAnchor:
                 if linked_snarl_id not in self.linked_snarls_compatibility_dict:
                     self.linked_snarls_compatibility_dict[linked_snarl_id] = {}
 
-                # 2.1. Check if the snarls are compatible
-                is_compatible, desc = self._are_snarls_compatible(primary_snarl = snarl_id, other_snarl = linked_snarl_id)
+                # 2.1. Check if the snarls are compatible, as computed by the snarl owning the pair
+                if self.snarl_sort_positions[linked_snarl_id] < self.snarl_sort_positions[snarl_id]:
+                    is_compatible, desc, primary_partitions, other_partitions = snarl_results[snarl_id]["pair_compatibility"][linked_snarl_id]
+                else:
+                    is_compatible, desc, other_partitions, primary_partitions = snarl_results[linked_snarl_id]["pair_compatibility"][snarl_id]
+                self._record_snarl_read_partitions(snarl_id, linked_snarl_id, primary_partitions, other_partitions)
                 if is_compatible:
                     self.linked_snarls_compatibility_dict[snarl_id][linked_snarl_id] = True
                     self.linked_snarls_compatibility_dict[linked_snarl_id][snarl_id] = True
@@ -1650,6 +2064,16 @@ class AlignAnchor:
                         self.linked_snarls_compatibility_dict[snarl_id][linked_snarl_id] = False
                         self.linked_snarls_compatibility_dict[linked_snarl_id][snarl_id] = False
 
+        if self.snarl_pairs_out_file_path is not None:
+            snarl_pair_cache = SnarlPairCache()
+            snarl_pair_cache.snarl_ids = list(self.snarl_ids_sorted)
+            snarl_pair_cache.zygosity = [len(self.snarl_to_anchors_dictionary[snarl_id]) for snarl_id in self.snarl_ids_sorted]
+            for snarl_id in self.snarl_ids_sorted:
+                for linked_snarl_id, count, linked_sizes, sizes, intersection_sizes in snarl_results[snarl_id]["snarl_pairs"]:
+                    snarl_pair_cache.add_pair(self.snarl_sort_positions[linked_snarl_id], self.snarl_sort_positions[snarl_id], count, linked_sizes, sizes, intersection_sizes)
+            snarl_pair_cache.dump(self.snarl_pairs_out_file_path)
+            print(f"{len(snarl_pair_cache.pairs)} snarl pairs stored in {self.snarl_pairs_out_file_path}", file=stderr)
+
         #### 3. Find whether the current snarl is "reliable" using number of compatilible linked snarls
         with open(reliable_snarls_out_file_path, "w") as f:
             print("snarl_id\tzygosity\tis_reliable\tlinked_snarls", file=f)
@@ -1755,6 +2179,10 @@ class AlignAnchor:
         walked_length = 0
         read_id = alignment_l[READ_POSITION]
         print(f"Processing read {read_id}.....")
+        self.max_read_length = max(self.max_read_length, alignment_l[R_LEN_POSITION])
+
+        if len(self.loaded_shards) < len(self.dictionary_shards):
+            self.load_shards_for_nodes(alignment_l[NODE_POSITION])
 
         for position, node_id in enumerate(alignment_l[NODE_POSITION]):
 
@@ -1769,6 +2197,8 @@ class AlignAnchor:
             anchors = self.sentinel_to_anchor.get(node_id)
             
             if anchors:
+                if node_id not in self.anchor_reads_dict:
+                    self.anchor_reads_dict[node_id] = [[] for _ in range(len(anchors))]
                 for index, anchor in enumerate(anchors):
                     # print(f"For read {read_id}, checking path concordance for anchor {anchor!r}")
 
@@ -1835,7 +2265,7 @@ class AlignAnchor:
                                 ]
                             )
                             # Record initial coverage
-                            self.anchor_coverage.record_initial_coverage(f"{anchor!r}", alignment_l[READ_POSITION])
+                            self.anchor_coverage.record_initial_coverage(anchor, alignment_l[READ_POSITION])
                             self.sentinel_to_anchor[node_id][index].add_sequence()
                             # found, no need to check in other anchors
                             break
@@ -1,5 +1,11 @@
 from sys import stderr
+from assembler.node import Node
+
+
 class Anchor:
+    # class level defaults, for the anchors pickled before these attributes existed
+    anchor_id: int = -1             # stable integer id given at dictionary build time, see assign_anchor_ids
+    _repr: str = None               # cached string form of the path, reset when the nodes change
 
     def __init__(self) -> None:
         self._nodes: list = []
@@ -10,6 +16,7 @@ class Anchor:
         self.sentinel_length: int = 0
         self.num_sequences: int = 0
         self.chromosome: str = ""
+        self.reference_positions: dict = {}    # {reference_path_name: position}, see AnchorDictionary.add_positions_to_anchors
         self.reference_paths_covered: list = []
         # self.path_matched_reads: list = []
         self.bp_matched_reads: list = []        # [READ_ID, READ_STRAND, ANCHOR_START, ANCHOR_END, MATCH_LIMIT, CS_LEFT_AVAIL, CS_RIGHT_AVAIL]
@@ -30,14 +37,28 @@ class Anchor:
     def __getitem__(self, position):
         return self._nodes[position]
 
+    def __getstate__(self) -> dict:
+        # the cached string form is not pickled (dictionaries, worker processes)
+        state = self.__dict__.copy()
+        state.pop("_repr", None)
+        return state
+
+    def invalidate_repr(self) -> None:
+        """
+        Resets the cached string form, to be called after changing the nodes of the anchor.
+        """
+        self._repr = None
+
     def add(self, node):
         self._nodes.append(node)
+        self._repr = None
 
     def insert_node_through_extension(self, node, insert_left):
         if ((insert_left) and (self._nodes[-1].id > self._nodes[0].id)) or ((not insert_left) and (self._nodes[-1].id < self._nodes[0].id)):
             self._nodes.insert(0, node)
         else:
             self._nodes.append(node)
+        self._repr = None
 
     def merge_anchor(self, new_anchor, insert_left=False) -> bool:
         if insert_left:
@@ -48,22 +69,21 @@ class Anchor:
             if self._nodes[-1].id != new_anchor[0].id:
                 return False
             self._nodes.extend(new_anchor[1:])
+        self._repr = None
         return True
 
     def flip_anchor(self):
-        self._nodes = self._nodes[::-1]
-        for node in self._nodes:
-            node.orientation = not node.orientation
+        # new Node objects, as merge_anchor shares the nodes of the merged anchor: flipping them in place would change the path of the other anchor
+        self._nodes = [Node(node.id, node.length, not node.orientation) for node in reversed(self._nodes)]
+        self._repr = None
 
     def add_snarl_id(self, snarl_id) -> None:
         self.snarl_id = snarl_id
     
     def __repr__(self) -> str:
-        anchor_str = ""
-        for node in self._nodes:
-            orientaiton = ">" if node.orientation else "<"
-            anchor_str += orientaiton + str(node.id)
-        return anchor_str
+        if self._repr is None:
+            self._repr = "".join((">" if node.orientation else "<") + str(node.id) for node in self._nodes)
+        return self._repr
 
     def bandage_representation(self) -> str:
         bandage_nodes_str = ""
@@ -211,6 +231,32 @@ class Anchor:
         return out_s[:-1]
 
 
-    def get_bed(self):
+    def get_bed(self, reference_path_name: str = None):
         #CHROM CHROM_START CHROM_END NAME
-        return f"{self.chromosome}\t{self.genomic_position}\t{self.genomic_position+self.baseparilength}\t{self.__repr__}"
+        if reference_path_name is None:
+            chromosome, position = self.chromosome, self.genomic_position
+        else:
+            chromosome, position = reference_path_name, self.reference_positions[reference_path_name]
+        return f"{chromosome}\t{position}\t{position+self.basepairlength}\t{self!r}"
+
+
+def assign_anchor_ids(sentinel_to_anchor: dict, first_anchor_id: int = 0) -> int:
+    """
+    This function gives a stable integer anchor_id to the anchors of a sentinel_to_anchor dictionary which do not have one yet, in the order of the dictionary.
+    The ids already given (e.g. to the anchors of a dictionary updated with --update-from) are kept, the new ones start after them and at first_anchor_id.
+
+    Returns
+    -------
+    next_anchor_id: int
+    The id following the largest one given
+    """
+    next_anchor_id = first_anchor_id
+    for anchors in sentinel_to_anchor.values():
+        for anchor in anchors:
+            next_anchor_id = max(next_anchor_id, anchor.anchor_id + 1)
+    for anchors in sentinel_to_anchor.values():
+        for anchor in anchors:
+            if anchor.anchor_id < 0:
+                anchor.anchor_id = next_anchor_id
+                next_anchor_id += 1
+    return next_anchor_id
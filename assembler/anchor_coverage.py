@@ -4,37 +4,53 @@ import json
 
 class AnchorCoverage:
     def __init__(self):
-        self.initial_coverage: Dict[str, int] = defaultdict(int)  # anchor_id -> read count
-        self.final_coverage: Dict[str, int] = defaultdict(int)    # anchor_id -> read count
-        self.anchor_reads: Dict[str, List[str]] = defaultdict(list)  # anchor_id -> list of read IDs
+        self.initial_coverage: Dict[int, int] = defaultdict(int)  # anchor_id -> read count
+        self.final_coverage: Dict[int, int] = defaultdict(int)    # anchor_id -> read count
+        self.anchor_reads: Dict[int, List[str]] = defaultdict(list)  # anchor_id -> list of read IDs
+        self.anchor_labels: Dict[int, str] = {}  # anchor_id -> anchor path string, used in the saved statistics
         
-    def record_initial_coverage(self, anchor_id: str, read_id: str):
+    def _record_label(self, anchor):
+        if anchor.anchor_id not in self.anchor_labels:
+            self.anchor_labels[anchor.anchor_id] = f"{anchor!r}"
+
+    def record_initial_coverage(self, anchor, read_id: str):
         """Record initial read coverage for an anchor"""
-        self.initial_coverage[anchor_id] += 1
-        self.anchor_reads[anchor_id].append(read_id)
+        self._record_label(anchor)
+        self.initial_coverage[anchor.anchor_id] += 1
+        self.anchor_reads[anchor.anchor_id].append(read_id)
         
-    def record_final_coverage(self, anchor_id: str, read_id: str):
+    def record_final_coverage(self, anchor, read_id: str):
         """Record final read coverage for an anchor after extension/merging"""
-        self.final_coverage[anchor_id] += 1
+        self._record_label(anchor)
+        self.final_coverage[anchor.anchor_id] += 1
         
-    def get_coverage_stats(self) -> Tuple[Dict[str, int], Dict[str, int]]:
+    def get_coverage_stats(self) -> Tuple[Dict[int, int], Dict[int, int]]:
         """Get both initial and final coverage statistics"""
         return self.initial_coverage, self.final_coverage
+
+    def _by_label(self, per_anchor_id: dict, empty) -> dict:
+        """Group per anchor id values by the anchor path string"""
+        per_label = {}
+        for anchor_id, value in per_anchor_id.items():
+            label = self.anchor_labels.get(anchor_id, anchor_id)
+            per_label[label] = per_label.get(label, empty) + value
+        return per_label
     
     def save_coverage_stats(self, output_file: str):
-        """Save coverage statistics to a JSON file"""
+        """Save coverage statistics to a JSON file, keyed by the anchor path strings"""
         stats = {
-            'initial_coverage': dict(self.initial_coverage),
-            'final_coverage': dict(self.final_coverage),
-            'anchor_reads': dict(self.anchor_reads)
+            'initial_coverage': self._by_label(self.initial_coverage, 0),
+            'final_coverage': self._by_label(self.final_coverage, 0),
+            'anchor_reads': self._by_label(self.anchor_reads, [])
         }
         with open(output_file, 'w') as f:
             json.dump(stats, f, indent=2)
             
     def load_coverage_stats(self, input_file: str):
-        """Load coverage statistics from a JSON file"""
+        """Load coverage statistics from a JSON file, the anchors are then keyed by their path strings"""
         with open(input_file, 'r') as f:
             stats = json.load(f)
             self.initial_coverage = defaultdict(int, stats['initial_coverage'])
             self.final_coverage = defaultdict(int, stats['final_coverage'])
-            self.anchor_reads = defaultdict(list, stats['anchor_reads']) 
+            self.anchor_reads = defaultdict(list, stats['anchor_reads'])
+            self.anchor_labels = {label: label for label in self.initial_coverage}
@@ -9,19 +9,30 @@ from assembler.constants import (
     # MAX_PATHS_IN_SNARLS,
     MIN_ANCHOR_LENGTH,
     MIN_NODES_IN_ANCHOR,
+    TOPOLOGY_MAX_STEPS,
     FORWARD_DICTIONARY,
     REVERSE_DICTIONARY,
     PEEK_SIZE,
     END_NODE_POS,
     SNARL_ID_POS,
+    SHARD_SNARL_ID_OFFSET,
+    SHARD_NODE_INTERVAL_GAP,
+    PATH_NAME_DELIMITERS,
 )
 from assembler.node import Node
-from assembler.anchor import Anchor
+from assembler.anchor import Anchor, assign_anchor_ids
+from assembler.gfa_reader import GfaReader
+from assembler.cache import file_digest, load_snarl_cache, store_snarl_cache
+from assembler.coordinates import ReferenceCoordinateIndex
+from assembler.chain_index import UnitigChainIndex
 
 # other imports
 import time
 from sys import stderr
 import pickle
+import json
+from multiprocessing import Pool
+import numpy as np
 
 
 class AnchorDictionary:
@@ -48,6 +59,7 @@ class AnchorDictionary:
 
         # important generated_data
         self.leaf_snarls: list = []
+        self.leaf_snarl_bounds: list = []
         self.sentinel_to_anchor: dict = {}
         self.main_path = []
         self.snarl_boundaries: list = [dict(), dict()]
@@ -66,8 +78,32 @@ class AnchorDictionary:
         self.current_anchor: Anchor = Anchor()
         self.curr_path_name = ""
         self.verbose = False
-        self.ref_path_name = "CHM13".casefold()
+        # anchors are placed on the paths containing these names, the first one gives genomic_position and chromosome
+        self.reference_names: list = ["CHM13"]
+        self.coordinate_index: ReferenceCoordinateIndex = None
+        # degree 1 chains around the snarl boundaries, used by the boundary extension
+        self.chain_index: UnitigChainIndex = None
+        # guards of the boundary extension: number of leaf snarls bounded by each node and nodes already taken by an extension
+        self.leaf_snarl_boundary_counts: dict = {}
+        self.extension_claimed_nodes: set = set()
+        self.extension_stop_reason: str = ""
+        # extend flag the snarl boundaries were computed with, stored with them by dump_snarl_boundaries
+        self.boundaries_extended: bool = False
+        self.extension_stats: list = []   # [(snarl_id, start, end, extended_start, extended_end, boundary_bp, extended_bp, stop_reason)]
         self.path_names = []
+        # paths already scanned in a previous dictionary (incremental update)
+        self.previously_covered_paths: set = set()
+        # sharded builds: only paths starting with one of these prefixes are scanned, snarl ids are shifted by the offset
+        self.path_prefixes: list = []
+        self.snarl_id_offset: int = 0
+        # the anchor ids given by fill_anchor_dictionary start here (shards do not share the id range)
+        self.anchor_id_offset: int = 0
+        # set when building from a GFA (build_from_gfa): the paths are streamed from the file and the graph is not loaded
+        self.gfa_reader: GfaReader = None
+        # the leaf snarls and their boundaries are cached in a sidecar of the index (see assembler.cache)
+        self.index_path: str = ""
+        self.graph_path: str = ""
+        self.use_snarl_cache: bool = True
 
         # variables used for debugging
         self.used_bubbles = dict()
@@ -86,8 +122,144 @@ class AnchorDictionary:
         t0=time.time()
         self.graph.deserialize(packed_graph_path)
         self.index.deserialize(index_path)
+        self.index_path = index_path
+        self.graph_path = packed_graph_path
         print(f"Graph files loaded in {time.time()-t0:.2f}", file=stderr)
 
+    def build_from_gfa(self, gfa_path: str, index_path: str) -> None:
+        """
+        Deserializes the SnarlIndex and indexes the paths of the GFA the graph was built from, instead of loading the packedGraph.
+        The snarl boundaries are read from the index only and the paths are streamed from the P/W lines, producing the same dictionary as build followed by fill_anchor_dictionary without boundary extension.
+
+        Parameters
+        ----------
+        gfa_path : string
+            Path to the GFA file (.gfa or .gfa.gz) used to build the index
+        index_path : string
+            Path to SnarlIndex object (.dist)
+        """
+        t0=time.time()
+        self.index.deserialize(index_path)
+        self.index_path = index_path
+        self.graph_path = gfa_path
+        self.gfa_reader = GfaReader(gfa_path)
+        self.gfa_reader.index()
+        print(f"Index loaded and {len(self.gfa_reader.path_offsets)} GFA paths indexed in {time.time()-t0:.2f}", file=stderr)
+
+    def load_previous_dictionary(self, dictionary_path: str, boundaries_path: str = None, extend: bool = False) -> None:
+        """
+        Loads a dictionary built by a previous run so that only new paths are scanned. The anchors of the old dictionary are kept and the new ones are merged in by the path scan.
+        The paths recorded in the reference_paths_covered of the old anchors are skipped when traversing the graph paths.
+        If the snarl boundaries of the previous run are available and were computed with the same extend flag they are reused, else they are recomputed from the index.
+
+        Parameters
+        ----------
+        dictionary_path : string
+            Path to the dictionary (.pkl) produced by a previous build
+        boundaries_path : string
+            Path to the snarl boundaries (.boundaries.pkl) produced by the same build
+        extend : bool
+            Whether the boundaries of this build are extended to reach MIN_ANCHOR_LENGTH
+        """
+        t0 = time.time()
+        with open(dictionary_path, "rb") as in_f:
+            self.sentinel_to_anchor = pickle.load(in_f)
+
+        for anchor_list in self.sentinel_to_anchor.values():
+            for anchor in anchor_list:
+                self.previously_covered_paths.update(anchor.reference_paths_covered)
+                self.used_bubbles[anchor.snarl_id] = True
+
+        if boundaries_path is not None:
+            self.load_snarl_boundaries(boundaries_path, extend)
+
+        print(
+            f"Previous dictionary loaded in {time.time()-t0:.2f}: {len(self.sentinel_to_anchor)} sentinels, {len(self.previously_covered_paths)} paths already covered",
+            file=stderr,
+        )
+
+    def dump_snarl_boundaries(self, out_file_path: str) -> None:
+        """
+        Serializes the FORWARD and REVERSE snarl boundary dictionaries, with the leaf snarl bounds, the boundary extension outcome and the extend flag they were computed with, so that a later build on the same index can reuse them.
+        """
+        with open(out_file_path, "wb") as out_f:
+            pickle.dump(
+                {
+                    "extend": self.boundaries_extended,
+                    "snarl_boundaries": self.snarl_boundaries,
+                    "num_usable_bubbles": self.num_usable_bubbles,
+                    "leaf_snarl_bounds": self.leaf_snarl_bounds,
+                    "leaf_snarl_boundary_counts": self.leaf_snarl_boundary_counts,
+                    "extension_stats": self.extension_stats,
+                },
+                out_f,
+            )
+
+    def load_snarl_boundaries(self, in_file_path: str, extend: bool = False) -> bool:
+        """
+        Loads the snarl boundary dictionaries written by dump_snarl_boundaries. When loaded, fill_anchor_dictionary skips the leaf snarls and boundaries computation.
+        Boundaries computed with another extend flag (or by a build that did not record it) are not loaded, they are recomputed.
+
+        Returns
+        -------
+        bool
+        True if the boundaries were loaded
+        """
+        with open(in_file_path, "rb") as in_f:
+            boundaries = pickle.load(in_f)
+        if boundaries.get("extend") != extend:
+            print(
+                f"WARNING: the snarl boundaries in {in_file_path} were not computed with extend={extend}, they will be recomputed",
+                file=stderr,
+            )
+            return False
+        self.boundaries_extended = extend
+        self.snarl_boundaries = boundaries["snarl_boundaries"]
+        self.num_usable_bubbles = boundaries["num_usable_bubbles"]
+        self.leaf_snarl_bounds = boundaries["leaf_snarl_bounds"]
+        self.leaf_snarl_boundary_counts = boundaries["leaf_snarl_boundary_counts"]
+        self.extension_stats = boundaries["extension_stats"]
+        return True
+
+    def load_cached_snarls(self, extend: bool, index_digest: str, graph_digest: str) -> bool:
+        """
+        Loads the leaf snarls bounds and the snarl boundary dictionaries from the sidecar of the index, if it was computed with the same parameters on the same graph.
+
+        Returns
+        -------
+        bool
+        True if the sidecar was found and loaded
+        """
+        cache_entry = load_snarl_cache(self.index_path, extend, self.snarl_id_offset, index_digest, graph_digest)
+        if cache_entry is None:
+            return False
+        self.leaf_snarl_bounds = cache_entry["leaf_snarl_bounds"]
+        self.snarl_boundaries = cache_entry["snarl_boundaries"]
+        self.num_usable_bubbles = cache_entry["num_usable_bubbles"]
+        self.leaf_snarl_boundary_counts = cache_entry["leaf_snarl_boundary_counts"]
+        self.extension_stats = cache_entry["extension_stats"]
+        return True
+
+    def store_cached_snarls(self, extend: bool, index_digest: str, graph_digest: str) -> str:
+        """
+        Writes the leaf snarls bounds and the snarl boundary dictionaries to the sidecar of the index.
+        """
+        return store_snarl_cache(
+            self.index_path,
+            {
+                "index_digest": index_digest,
+                "graph_digest": graph_digest,
+                "min_anchor_length": MIN_ANCHOR_LENGTH,
+                "extend": extend,
+                "snarl_id_offset": self.snarl_id_offset,
+                "leaf_snarl_bounds": self.leaf_snarl_bounds,
+                "snarl_boundaries": self.snarl_boundaries,
+                "num_usable_bubbles": self.num_usable_bubbles,
+                "leaf_snarl_boundary_counts": self.leaf_snarl_boundary_counts,
+                "extension_stats": self.extension_stats,
+            },
+        )
+
     def check_snarl_in_children_iteratee(self, child_net_handle) -> bool:
         """
         It iterates on the children of each snarl child (check ) to verify that the snalr does not contain any other snarl and is therefore a snarl leave. If it seesa a snarl it sets the variable contains_child_snarls as true.
@@ -195,23 +367,50 @@ class AnchorDictionary:
 
         """
         node_handle = self.graph.get_handle_of_step(step_handle)
-        node_id = self.graph.get_id(node_handle)
+        return self.scan_path_step(
+            self.graph.get_id(node_handle),
+            self.graph.get_length(node_handle),
+            not (self.graph.get_is_reverse(node_handle)),
+        )
+
+    def scan_gfa_path(self, node_ids: list, orientations: list) -> None:
+        """
+        Scans a path read from the GFA in the current path_orientation. Outside of a snarl only the boundary nodes change the scan state, so the other steps are skipped without calling scan_path_step.
+        """
+        boundaries = self.snarl_boundaries[self.path_orientation]
+        for node_id, orientation in zip(node_ids, orientations):
+            if self.keep_path_scan and node_id not in boundaries:
+                continue
+            self.scan_path_step(node_id, self.gfa_reader.get_node_length(node_id), orientation)
+
+    def scan_path_step(self, node_id: int, node_length: int, orientation: bool) -> bool:
+        """
+        Processes one step of the path being scanned, shared by the packedGraph (traverse_step_iteratee) and the GFA (scan_gfa_path) traversals.
 
-        print(f"In current path, traversing node id {node_id}", end="\n")
+        Parameters
+        ----------
+        node_id: int
+            id of the node in the step
+        node_length: int
+            length of the node in basepairs
+        orientation: bool
+            True if the node is traversed forward
+
+        Returns
+        -------
+        True to keep the iteration going
+        """
+        if self.verbose:
+            print(f"In current path, traversing node id {node_id}", end="\n")
 
         if (
             not self.keep_path_scan
             and self.snarl_boundaries[self.path_orientation][self.current_snarl_start][END_NODE_POS] != node_id
             and node_id in self.snarl_boundaries[self.path_orientation][self.current_snarl_start][2]
         ):
-            self.current_anchor.add(
-                Node(
-                    self.graph.get_id(node_handle),
-                    self.graph.get_length(node_handle),
-                    not (self.graph.get_is_reverse(node_handle)),
-                )
-            )
-            print(f"Adding node {self.graph.get_id(node_handle)} to anchor gets {self.current_anchor!r}", end="\n")
+            self.current_anchor.add(Node(node_id, node_length, orientation))
+            if self.verbose:
+                print(f"Adding node {node_id} to anchor gets {self.current_anchor!r}", end="\n")
 
             return True
 
@@ -219,13 +418,7 @@ class AnchorDictionary:
             not self.keep_path_scan
         ):
             if self.snarl_boundaries[self.path_orientation][self.current_snarl_start][END_NODE_POS] == node_id:
-                self.current_anchor.add(
-                    Node(
-                        self.graph.get_id(node_handle),
-                        self.graph.get_length(node_handle),
-                        not (self.graph.get_is_reverse(node_handle)),
-                    )
-                )
+                self.current_anchor.add(Node(node_id, node_length, orientation))
                 
                 self.current_anchor.compute_snarl_boundary()
                 self.current_anchor.bp_occupied_start_node = (0 if self.current_anchor.snarl_start_node.length == 1 else 1)
@@ -267,14 +460,9 @@ class AnchorDictionary:
         ):
 
             self.current_snarl_start = node_id
-            self.current_anchor.add(
-                Node(
-                    self.graph.get_id(node_handle),
-                    self.graph.get_length(node_handle),
-                    not (self.graph.get_is_reverse(node_handle)),
-                )
-            )
-            print(f"Adding node {self.graph.get_id(node_handle)} to anchor. Corresponding boundary node is {self.snarl_boundaries[self.path_orientation][self.current_snarl_start][END_NODE_POS]}", end="\n")
+            self.current_anchor.add(Node(node_id, node_length, orientation))
+            if self.verbose:
+                print(f"Adding node {node_id} to anchor. Corresponding boundary node is {self.snarl_boundaries[self.path_orientation][self.current_snarl_start][END_NODE_POS]}", end="\n")
             self.current_anchor.add_snarl_id(
                 self.snarl_boundaries[self.path_orientation][node_id][SNARL_ID_POS]
             )
@@ -304,26 +492,25 @@ class AnchorDictionary:
         
         if extend:
             start_node_handle, end_node_handle, nodes_inside = self.get_snarl_boundaries_extend(snarl_net_handle)
+            start_node_id, end_node_id = self.graph.get_id(start_node_handle), self.graph.get_id(end_node_handle)
         else:
-            start_node_handle, end_node_handle, nodes_inside = self.get_snarl_boundaries_handle(snarl_net_handle)
+            start_node_id, end_node_id, nodes_inside = self.get_snarl_boundaries_ids(snarl_net_handle)
 
         snarl_boundary = (
-            (self.graph.get_id(end_node_handle), self.graph.get_id(start_node_handle))
-            if self.graph.get_id(end_node_handle) < self.graph.get_id(start_node_handle)
-            else (
-                self.graph.get_id(start_node_handle),
-                self.graph.get_id(end_node_handle),
-            )
+            (end_node_id, start_node_id)
+            if end_node_id < start_node_id
+            else (start_node_id, end_node_id)
         )
         
+        snarl_id = self.snarl_id_offset + self.num_usable_bubbles
         self.snarl_boundaries[FORWARD_DICTIONARY][snarl_boundary[0]] = (
             snarl_boundary[1],
-            self.num_usable_bubbles,    # SNARL ID
+            snarl_id,    # SNARL ID
             nodes_inside
         )
         self.snarl_boundaries[REVERSE_DICTIONARY][snarl_boundary[1]] = (
             snarl_boundary[0],
-            self.num_usable_bubbles,
+            snarl_id,
             nodes_inside
         )
         return
@@ -368,18 +555,30 @@ class AnchorDictionary:
         """
 
         #collecting path handles to scan in the graph
-        for node in self.snarl_boundaries[0]:
-            self.graph.for_each_step_on_handle(self.graph.get_handle(node), self.collect_path_handles)
+        if self.gfa_reader is not None:
+            self.path_names = self.gfa_reader.get_path_names()
+        else:
+            for node in self.snarl_boundaries[0]:
+                self.graph.for_each_step_on_handle(self.graph.get_handle(node), self.collect_path_handles)
 
         print(f"TOT PATHS COLLECTED: {len(self.path_names)}")
         self.path_names = sorted(list(set(self.path_names)))
+        # in an incremental update, the paths already in the previous dictionary are not scanned again
+        paths_to_scan = [path_name for path_name in self.path_names if path_name not in self.previously_covered_paths]
+        if len(paths_to_scan) != len(self.path_names):
+            print(f"Skipping {len(self.path_names) - len(paths_to_scan)} paths already covered by the previous dictionary")
+        if self.path_prefixes:
+            num_paths_before_prefix_filter = len(paths_to_scan)
+            paths_to_scan = [path_name for path_name in paths_to_scan if any(path_has_prefix(path_name, path_prefix) for path_prefix in self.path_prefixes)]
+            print(f"Skipping {num_paths_before_prefix_filter - len(paths_to_scan)} paths not matching the path prefixes {self.path_prefixes}")
         #scan path handles to obtain the alleles in the snarls.
-        print(f"Ready to process {len(self.path_names)} paths...", end = ' ')
+        print(f"Ready to process {len(paths_to_scan)} paths...", end = ' ')
         t_0 = time.time()
-        for path_name in self.path_names:
+        for path_name in paths_to_scan:
+            if self.gfa_reader is not None:
+                node_ids, orientations = self.gfa_reader.read_path(path_name)
             for path_orientation in [REVERSE_DICTIONARY, FORWARD_DICTIONARY]:
 
-                path_handle = self.graph.get_path_handle(path_name)
                 self.curr_path_name = path_name
                 print(f"Currently processing path {self.curr_path_name}...", end="\n")
                 self.current_snarl_start = -1
@@ -390,9 +589,14 @@ class AnchorDictionary:
                 self.path_orientation=path_orientation
 
                 print(f"With path_orientation {self.path_orientation}", end="\n")
-                self.graph.for_each_step_in_path(path_handle, self.traverse_step_iteratee)
+                if self.gfa_reader is not None:
+                    self.scan_gfa_path(node_ids, orientations)
+                else:
+                    self.graph.for_each_step_in_path(self.graph.get_path_handle(path_name), self.traverse_step_iteratee)
 
             print(f"done in {time.time()-t_0}")
+        if self.gfa_reader is not None:
+            self.gfa_reader.close()
 
 
     def generate_anchors_boundaries(self, extend=False):
@@ -405,17 +609,35 @@ class AnchorDictionary:
         snarl1_snarl_net_handle, snarl2_snarl_net_handle = self.leaf_snarls[0], self.leaf_snarls[1]
 
         # snarl1 start node
-        snarl1_start_bound_net_handle = self.index.get_start_bound(snarl1_snarl_net_handle)
-        snarl1_start_bound_handle = self.index.get_handle(snarl1_start_bound_net_handle, self.graph)
-        snarl1_start_node = self.graph.get_id(snarl1_start_bound_handle)
+        snarl1_start_node = self.get_net_handle_id(self.index.get_start_bound(snarl1_snarl_net_handle))
         # snarl2 start node
-        snarl2_start_bound_net_handle = self.index.get_start_bound(snarl2_snarl_net_handle)
-        snarl2_start_bound_handle = self.index.get_handle(snarl2_start_bound_net_handle, self.graph)
-        snarl2_start_node = self.graph.get_id(snarl2_start_bound_handle)
+        snarl2_start_node = self.get_net_handle_id(self.index.get_start_bound(snarl2_snarl_net_handle))
 
         if snarl1_start_node > snarl2_start_node:
             self.leaf_snarls = self.leaf_snarls[::-1]
 
+        self.leaf_snarl_bounds = [
+            (
+                self.get_net_handle_id(self.index.get_start_bound(snarl_net_handle)),
+                self.get_net_handle_id(self.index.get_end_bound(snarl_net_handle)),
+            )
+            for snarl_net_handle in self.leaf_snarls
+        ]
+        self.leaf_snarl_boundary_counts = {}
+        for snarl_bounds in self.leaf_snarl_bounds:
+            for node_id in set(snarl_bounds):
+                self.leaf_snarl_boundary_counts[node_id] = self.leaf_snarl_boundary_counts.get(node_id, 0) + 1
+        if extend and self.chain_index is None:
+            # an extension step adds at least 1bp, so it never goes further than MIN_ANCHOR_LENGTH nodes from the boundary
+            t0 = time.time()
+            self.chain_index = UnitigChainIndex()
+            self.chain_index.build(
+                self.graph,
+                seed_node_ids=[node_id for snarl_bounds in self.leaf_snarl_bounds for node_id in snarl_bounds],
+                max_steps=MIN_ANCHOR_LENGTH,
+            )
+            print(f"Chain index of {len(self.chain_index.node_rows)} nodes built in {time.time()-t0:.2f}", file=stderr)
+
         for _, snarl_net_handle in enumerate(self.leaf_snarls):
             self.get_edge_snarl(snarl_net_handle, extend)
 
@@ -428,24 +650,46 @@ class AnchorDictionary:
         -------
         None
         """
-        # in case the leaf snarls were not already computed
+        if extend and self.gfa_reader is not None:
+            raise ValueError("Boundary extension needs the graph topology, build from the packedGraph (.vg) to extend the snarl boundaries")
+
         t0 = time.time()
-        if len(self.leaf_snarls) == 0:
-            self.process_snarls()
-        print(
-            f"Leaf Snarls Computed in {time.time()-t0:.2f}",
-            file=stderr,
-        )
+        self.boundaries_extended = extend
+        index_digest = file_digest(self.index_path) if self.use_snarl_cache and self.index_path else None
+        graph_digest = file_digest(self.graph_path) if index_digest is not None and self.graph_path else None
+        # boundaries loaded from a previous build do not need the snarl decomposition
+        if len(self.snarl_boundaries[FORWARD_DICTIONARY]) > 0:
+            print(
+                f"Reusing {len(self.snarl_boundaries[FORWARD_DICTIONARY])} precomputed snarl boundaries",
+                file=stderr,
+            )
+        elif index_digest is not None and self.load_cached_snarls(extend, index_digest, graph_digest):
+            print(
+                f"Loaded {len(self.snarl_boundaries[FORWARD_DICTIONARY])} snarl boundaries from the index sidecar in {time.time()-t0:.2f}",
+                file=stderr,
+            )
+        else:
+            # in case the leaf snarls were not already computed
+            if len(self.leaf_snarls) == 0:
+                self.process_snarls()
+            print(
+                f"Leaf Snarls Computed in {time.time()-t0:.2f}",
+                file=stderr,
+            )
 
-        t1 = time.time()
-        self.generate_anchors_boundaries(extend)
-        print(
-            f"Snarl Boundaries computed in {time.time()-t1:.2f}",
-            file=stderr,
-        )
+            t1 = time.time()
+            self.generate_anchors_boundaries(extend)
+            print(
+                f"Snarl Boundaries computed in {time.time()-t1:.2f}",
+                file=stderr,
+            )
+            if index_digest is not None:
+                cache_path = self.store_cached_snarls(extend, index_digest, graph_digest)
+                print(f"Snarl boundaries cached in {cache_path}", file=stderr)
 
         t2 = time.time()
         self.get_snalrs_from_paths()
+        assign_anchor_ids(self.sentinel_to_anchor, self.anchor_id_offset)
 
         print(
             f"Snarl dictionary computed in {time.time()-t2:.2f}. Total time: {time.time()-t0:.2f}.",
@@ -463,11 +707,34 @@ class AnchorDictionary:
             snarl_net_handle,  
             snarl_iteratee=lambda s: True,  # Ignore snarls
             chain_iteratee=lambda c: True,  # Ignore chains
-            node_iteratee=lambda n: nodes_inside.append(self.graph.get_id(self.index.get_handle(n, self.graph))) or True
+            node_iteratee=lambda n: nodes_inside.append(self.get_net_handle_id(n)) or True
         )
 
         return nodes_inside  # Return the collected node IDs
 
+    def get_net_handle_id(self, net_handle) -> int:
+        """
+        Returns the id of the node of a net_handle. When building from a GFA the graph is not loaded, so the id is read from the index.
+        """
+        if self.gfa_reader is not None:
+            return self.index.node_id(net_handle)
+        return self.graph.get_id(self.index.get_handle(net_handle, self.graph))
+
+    def get_snarl_boundaries_ids(self, snarl_net_handle) -> tuple:
+        """
+        Same as get_snarl_boundaries_handle, but returns the ids of the boundary nodes so that it does not need the graph.
+
+        Returns
+        -------
+        boundary : tuple
+        the ids of the nodes preceding and succeding the snarl and the list of node ids inside it
+        """
+        start_bound_id = self.get_net_handle_id(self.index.get_start_bound(snarl_net_handle))
+        end_bound_id = self.get_net_handle_id(self.index.get_end_bound(snarl_net_handle))
+        nodes_inside_snarl = self.get_nodes_in_snarl(snarl_net_handle)
+
+        return (start_bound_id, end_bound_id, nodes_inside_snarl)
+
     def get_snarl_boundaries_handle(self, snarl_net_handle) -> tuple:
         """
         This function takes a snarl net_handle and returns the boundary nodes of the snarl, i.e. preceding and succeding the snarl. This is used in the candidate anchor generation when traversing the paths to record only the portion of path in the snarl.
@@ -590,6 +857,7 @@ class AnchorDictionary:
         """
         This function takes a snarl net_handle and returns the boundary nodes of the snarl, i.e. preceding and succeding the snarl, allowing for boundary extension in case the boundary nodes length is not enough to generate an anchor. 
         This is used in the candidate anchor generation when traversing the paths to record only the portion of path in the snarl.
+        The outcome of the extension of each snarl is recorded in extension_stats.
 
         Parameters
         ----------
@@ -609,7 +877,8 @@ class AnchorDictionary:
         start_bound_handle = self.index.get_handle(start_bound_net_handle, self.graph)
         end_bound_handle = self.index.get_handle(end_bound_net_handle, self.graph)
 
-        print(f"In snarl with boundary ({self.graph.get_id(start_bound_handle)},{self.graph.get_id(end_bound_handle)}).", flush=True)
+        if self.verbose:
+            print(f"In snarl with boundary ({self.graph.get_id(start_bound_handle)},{self.graph.get_id(end_bound_handle)}).", flush=True)
 
 
         #TODO: COMPLETE
@@ -618,11 +887,13 @@ class AnchorDictionary:
         
         # if the boundary nodes are long enough, return them
         if boundary_nodes_length >= MIN_ANCHOR_LENGTH:
-            return (start_bound_handle,end_bound_handle,nodes_inside_snarl) 
+            boundary = (start_bound_handle,end_bound_handle,nodes_inside_snarl)
+            stop_reasons = []
         
         # else, try to extend the boundary to nearby nodes, if and only if the node degree is 1.
         else:
-            print(f"Running extention for snarl, since boundary nodes lengths summed up to {boundary_nodes_length}")
+            if self.verbose:
+                print(f"Running extention for snarl, since boundary nodes lengths summed up to {boundary_nodes_length}")
             go_left = False
             #1) start expansion by the longer node
             if self.graph.get_length(start_bound_handle) > self.graph.get_length(end_bound_handle):
@@ -634,43 +905,93 @@ class AnchorDictionary:
             # First expand boundary on the longest node direction and try to reach MIN_ANCHOR_LENGTH
             current_handle = start_bound_handle if go_left else end_bound_handle
             computed_handle, nodes_inside_snarl_extended = self.expand_bounary(current_handle, go_left, nodes_inside_snarl)
+            stop_reasons = [self.extension_stop_reason]
 
             if self.anchor_length_occupied >= MIN_ANCHOR_LENGTH:
                 boundary = (computed_handle, end_bound_handle, nodes_inside_snarl_extended) if go_left else (start_bound_handle, computed_handle, nodes_inside_snarl)
-                return boundary
-            
-            #If not enough, try the other side
-            go_left = not(go_left)
-
-            current_handle = start_bound_handle if go_left else end_bound_handle
-            other_computed_handle, nodes_inside_snarl_extended = self.expand_bounary(current_handle, go_left, nodes_inside_snarl)
-            boundary = (other_computed_handle, computed_handle, nodes_inside_snarl_extended) if go_left else (computed_handle, other_computed_handle, nodes_inside_snarl)
+            else:
+                #If not enough, try the other side
+                go_left = not(go_left)
+
+                current_handle = start_bound_handle if go_left else end_bound_handle
+                other_computed_handle, nodes_inside_snarl_extended = self.expand_bounary(current_handle, go_left, nodes_inside_snarl)
+                stop_reasons.append(self.extension_stop_reason)
+                boundary = (other_computed_handle, computed_handle, nodes_inside_snarl_extended) if go_left else (computed_handle, other_computed_handle, nodes_inside_snarl)
+
+        self.extension_stats.append(
+            (
+                self.snarl_id_offset + self.num_usable_bubbles,
+                self.graph.get_id(start_bound_handle),
+                self.graph.get_id(end_bound_handle),
+                self.graph.get_id(boundary[0]),
+                self.graph.get_id(boundary[1]),
+                boundary_nodes_length,
+                self.anchor_length_occupied if stop_reasons else boundary_nodes_length,
+                ",".join(stop_reasons) if stop_reasons else "not_needed",
+            )
+        )
         return boundary
     
     def expand_bounary(self, current_handle, go_left_bool, nodes_inside_snarl):
+        """
+        Walks the degree 1 chain on the go_left_bool side of a snarl boundary, adding the nodes passed to nodes_inside_snarl, until the anchor reaches MIN_ANCHOR_LENGTH.
+        The walk does not enter a node that is the boundary of another leaf snarl (already in the snarl dictionaries or not, so that the result does not depend on the order of the snarls) or that was taken by the extension of another snarl.
+        The reason the walk stopped is left in extension_stop_reason.
+        """
+        if self.chain_index is None:
+            self.chain_index = UnitigChainIndex()
+            self.chain_index.build(self.graph)
+        # the walk is done on (node_id, is_reverse) pairs looked up in the chain index
+        current = (self.graph.get_id(current_handle), self.graph.get_is_reverse(current_handle))
+        # the first node is the boundary of the snarl being extended, it must not be shared with another snarl
+        other_snarls_bounded = 1
+        self.extension_stop_reason = "length_reached"
         while self.anchor_length_occupied < MIN_ANCHOR_LENGTH:
-            current_handle_id = self.graph.get_id(current_handle)
-            print(f" Seeing {current_handle_id}", flush=True)
+            current_handle_id = current[0]
+            if self.verbose:
+                print(f" Seeing {current_handle_id}", flush=True)
             # if current handle is present in either the forward or reverse dict
             if self.snarl_boundaries[FORWARD_DICTIONARY].get(current_handle_id) != None or self.snarl_boundaries[REVERSE_DICTIONARY].get(current_handle_id) != None:
-                print(f"{current_handle_id} that is in the dictionary. Stopping", flush=True)
+                if self.verbose:
+                    print(f"{current_handle_id} that is in the dictionary. Stopping", flush=True)
+                self.extension_stop_reason = "snarl_boundary"
+                break
+            if self.leaf_snarl_boundary_counts.get(current_handle_id, 0) > other_snarls_bounded:
+                self.extension_stop_reason = "snarl_boundary"
                 break
-            degree = self.graph.get_degree(current_handle, go_left_bool)
+            if current_handle_id in self.extension_claimed_nodes:
+                self.extension_stop_reason = "claimed_by_other_snarl"
+                break
+            other_snarls_bounded = 0
+            degree = self.chain_index.degree(current_handle_id, current[1], go_left_bool)
 
             if degree == 1:
-                print(f"inside extension, current 1-degree node being checked: {current_handle_id}")
-                self.graph.follow_edges(current_handle, go_left_bool, self.next_handle_iteratee)
-                if self.next_handle_expand_boundary is None or self.next_handle_expand_boundary == current_handle:
+                if self.verbose:
+                    print(f"inside extension, current 1-degree node being checked: {current_handle_id}")
+                next_node = self.chain_index.follow(current_handle_id, current[1], go_left_bool)
+                if next_node == current:
+                    self.extension_stop_reason = "self_loop"
                     break
                 else:
-                    self.anchor_length_occupied += self.graph.get_length(current_handle) - (self.graph.get_length(current_handle) // 2) + (self.graph.get_length(self.next_handle_expand_boundary) // 2)
-                    nodes_inside_snarl.append(self.graph.get_id(current_handle))
-                    # nodes_inside_snarl.append(self.graph.get_id(self.next_handle_expand_boundary))
-                    current_handle = self.next_handle_expand_boundary
+                    current_length = self.chain_index.length(current_handle_id)
+                    self.anchor_length_occupied += current_length - (current_length // 2) + (self.chain_index.length(next_node[0]) // 2)
+                    nodes_inside_snarl.append(current_handle_id)
+                    self.extension_claimed_nodes.add(current_handle_id)
+                    current = next_node
 
             else:
+                self.extension_stop_reason = "branching"
                 break
-        return current_handle, nodes_inside_snarl
+        return self.graph.get_handle(current[0], current[1]), nodes_inside_snarl
+
+    def print_extension_stats(self, out_file_path: str) -> None:
+        """
+        Writes the outcome of the boundary extension of each snarl, if the dictionary was built with extend=True.
+        """
+        with open(out_file_path, "w") as out_f:
+            print("snarl_id\tstart_node\tend_node\textended_start_node\textended_end_node\tboundary_bp\textended_bp\tstop_reason", file=out_f)
+            for snarl_stats in self.extension_stats:
+                print("\t".join(str(value) for value in snarl_stats), file=out_f)
     
 
     def next_handle_iteratee(self, next_boundary):
@@ -714,51 +1035,108 @@ class AnchorDictionary:
             pickle.dump(self.sentinel_to_anchor, out_f)
 
 
+    def get_path_end_offsets(self, path_name: str) -> tuple:
+        """
+        Returns the node ids of a path and the offset of the end of each of its steps, from the GFA line or walking the path in the graph.
+        """
+        if self.gfa_reader is not None:
+            node_ids, _ = self.gfa_reader.read_path(path_name)
+            node_lengths = np.frombuffer(self.gfa_reader.node_lengths, dtype=np.uint32)
+            node_ids = np.asarray(node_ids, dtype=np.int64)
+            return node_ids, np.cumsum(node_lengths[node_ids], dtype=np.int64)
+
+        # generate main path (node_id, length_in_path)
+        self.main_path = []
+        self.graph.for_each_step_in_path(self.graph.get_path_handle(path_name), self.steps_path_iteratee)
+        return [node_id for node_id, _ in self.main_path], [pos for _, pos in self.main_path]
+
+    def build_coordinate_index(self) -> None:
+        """
+        Indexes the offsets of the nodes on every path whose name contains one of the reference_names (case insensitive).
+        """
+        t0 = time.time()
+        self.coordinate_index = ReferenceCoordinateIndex()
+        for reference_name in self.reference_names:
+            for path_name in self.path_names:
+                if reference_name.casefold() in path_name.casefold():
+                    print(f"Found path {path_name}", file=stderr)
+                    node_ids, end_offsets = self.get_path_end_offsets(path_name)
+                    self.coordinate_index.add_path(reference_name, path_name, node_ids, end_offsets)
+        if self.gfa_reader is not None:
+            self.gfa_reader.close()
+        print(f"Coordinate index of {len(self.coordinate_index.path_node_ids)} reference paths built in {time.time()-t0:.2f}", file=stderr)
+
+    def dump_coordinate_index(self, out_file_path: str) -> None:
+        self.coordinate_index.dump(out_file_path)
+
+    def dump_topology(self, out_file_path: str) -> None:
+        """
+        Stores the length, the degree of each side and the only neighbor of the degree 1 sides of the nodes within TOPOLOGY_MAX_STEPS degree 1 steps from the leaf snarl boundaries (a UnitigChainIndex), which is all the anchor extension of vg_anchor get_anchors needs from the graph.
+        """
+        t0 = time.time()
+        topology = UnitigChainIndex()
+        topology.build(
+            self.graph,
+            seed_node_ids=[node_id for snarl_bounds in self.leaf_snarl_bounds for node_id in snarl_bounds],
+            max_steps=TOPOLOGY_MAX_STEPS,
+        )
+        topology.dump(out_file_path)
+        print(f"Topology of {len(topology.node_rows)} nodes stored in {time.time()-t0:.2f}", file=stderr)
+
     def add_positions_to_anchors(self, graph_path_name: str = "") -> None:
         """
-        This function populates the anchors with their (average) position in the CHM13 path
+        This function populates the anchors with their (average) position on each path of the references in reference_names, stored in anchor.reference_positions ({path_name: position}).
+        The genomic_position and chromosome of the anchor are the ones on the first reference (CHM13 by default).
+        An anchor is placed at the middle of its boundary nodes if both are on the path, else at the largest offset of its nodes.
 
         Parameters
         ----------
         graph_path_name: string
-            The name of the path used as referencing for the position (I use CHM13)
+            Not used, the paths are chosen by reference_names
 
         Returns
         -------
         None
         """
+        if self.coordinate_index is None:
+            self.build_coordinate_index()
 
-        graph_path_name = ""
-        # path_names = self.get_path_names()
-
-        for path in self.path_names:
-            if self.ref_path_name in path.casefold():
-                graph_path_name = path
-
-        if self.graph.has_path(graph_path_name):
-            print(f"Found path {graph_path_name}", file=stderr)
-            path_handle = self.graph.get_path_handle(graph_path_name)
-        else:
-            print(f"WARNING: Could not find CHM13 path in graph", file=stderr)
+        anchors = [anchor for anchor_list in self.sentinel_to_anchor.values() for anchor in anchor_list]
+        if len(anchors) == 0:
             return
-
-        # generate main path (node_id, length_in_chm13)
-        self.graph.for_each_step_in_path(path_handle, self.steps_path_iteratee)
-        size_dict = dict()
-
-        for node_id, pos in self.main_path:
-            size_dict[node_id] = pos
-
-        for _, anchor_list in self.sentinel_to_anchor.items():
-            for anchor in anchor_list:
-                start_node_pos = size_dict.get(anchor[0].id, -1)
-                end_node_pos = size_dict.get(anchor[-1].id, -1)
-                if start_node_pos > 0 and end_node_pos > 0:
-                    anchor.genomic_position = (start_node_pos + end_node_pos) // 2
-                else:
-                    pos = max(size_dict.get(x.id, -1) for x in anchor)
-                    anchor.genomic_position = max(pos, 0)
-                anchor.chromosome = graph_path_name
+        node_ids = np.fromiter((node.id for anchor in anchors for node in anchor), dtype=np.int64)
+        anchor_starts = np.zeros(len(anchors), dtype=np.int64)
+        anchor_starts[1:] = np.cumsum([len(anchor) for anchor in anchors[:-1]])
+
+        for anchor in anchors:
+            anchor.reference_positions = {}
+        for reference_name in self.reference_names:
+            for path_name in self.coordinate_index.reference_paths.get(reference_name, []):
+                positions = self.coordinate_index.anchor_positions(path_name, node_ids, anchor_starts)
+                for anchor_idx in np.flatnonzero(positions > 0):
+                    anchors[anchor_idx].reference_positions[path_name] = int(positions[anchor_idx])
+
+        primary_paths = self.coordinate_index.reference_paths.get(self.reference_names[0], [])
+        if len(primary_paths) == 0:
+            print(f"WARNING: Could not find {self.reference_names[0]} path in graph", file=stderr)
+            return
+        for anchor in anchors:
+            anchor.genomic_position = 0
+            anchor.chromosome = primary_paths[-1]
+            for path_name in primary_paths:
+                if path_name in anchor.reference_positions:
+                    anchor.genomic_position = anchor.reference_positions[path_name]
+                    anchor.chromosome = path_name
+
+    def print_anchors_bed(self, out_file_path: str) -> None:
+        """
+        Writes the anchors in BED format, one line for each reference path the anchor is placed on.
+        """
+        with open(out_file_path, "w") as out_f:
+            for anchor_list in self.sentinel_to_anchor.values():
+                for anchor in anchor_list:
+                    for path_name in anchor.reference_positions:
+                        print(anchor.get_bed(path_name), file=out_f)
 
     ### PRINTING FUNCTIONS FOR DEBUG - VISUALIZATION ###
 
@@ -813,6 +1191,33 @@ class AnchorDictionary:
     def get_dict(self) -> dict:
         return self.sentinel_to_anchor
 
+    def get_node_id_range(self) -> tuple:
+        """
+        Returns the smallest and largest node id used by the anchors in the dictionary, (-1, -1) if the dictionary is empty.
+        """
+        min_node_id, max_node_id = -1, -1
+        for anchor_list in self.sentinel_to_anchor.values():
+            for anchor in anchor_list:
+                for node in anchor:
+                    if min_node_id == -1 or node.id < min_node_id:
+                        min_node_id = node.id
+                    if node.id > max_node_id:
+                        max_node_id = node.id
+        return (min_node_id, max_node_id)
+
+    def get_node_id_intervals(self, max_gap: int = SHARD_NODE_INTERVAL_GAP) -> list:
+        """
+        Returns the node ids used by the anchors in the dictionary as sorted [start, end] intervals, joining the node ids less than max_gap apart.
+        """
+        node_ids = sorted({node.id for anchor_list in self.sentinel_to_anchor.values() for anchor in anchor_list for node in anchor})
+        node_id_intervals = []
+        for node_id in node_ids:
+            if node_id_intervals and node_id - node_id_intervals[-1][1] < max_gap:
+                node_id_intervals[-1][1] = node_id
+            else:
+                node_id_intervals.append([node_id, node_id])
+        return node_id_intervals
+
     def get_path_names(self):
         path_names = []
 
@@ -832,3 +1237,111 @@ class AnchorDictionary:
                         f"{sentinel}\t{anchor.snarl_id}\t{anchor.basepairlength}\t{anchor.genomic_position}\t{anchor!r}\t{anchor.bandage_representation()}\t{anchor.get_reference_paths()}",
                         file=f,
                     )
+
+
+def path_has_prefix(path_name: str, path_prefix: str) -> bool:
+    """
+    Whether a path name is path_prefix or starts with it followed by one of PATH_NAME_DELIMITERS (or path_prefix ends with one), so that the prefix chr1 matches chr1 and CHM13#chr1 matches CHM13#chr1:0-100, but not chr10.
+    """
+    if not path_name.startswith(path_prefix):
+        return False
+    if len(path_name) == len(path_prefix) or path_prefix.endswith(tuple(PATH_NAME_DELIMITERS)):
+        return True
+    return path_name[len(path_prefix)] in PATH_NAME_DELIMITERS
+
+
+def build_shard(shard: dict) -> dict:
+    """
+    Builds the dictionary of one shard and writes it to disk. It is run in a separate process for each shard, so that only one graph and distance index are loaded per process.
+
+    Parameters
+    ----------
+    shard : dict
+        Contains the keys "graph", "index", "output_prefix", "path_prefixes", "reference_names", "extend", "snarl_id_offset" and "shard_id"
+
+    Returns
+    -------
+    manifest_entry : dict
+        The description of the shard to store in the manifest
+    """
+    t0 = time.time()
+    dictionary_builder = AnchorDictionary()
+    dictionary_builder.path_prefixes = shard["path_prefixes"]
+    dictionary_builder.snarl_id_offset = shard["snarl_id_offset"]
+    dictionary_builder.anchor_id_offset = shard["shard_id"] * SHARD_SNARL_ID_OFFSET
+    dictionary_builder.reference_names = shard["reference_names"]
+    dictionary_builder.build(shard["graph"], shard["index"])
+    dictionary_builder.fill_anchor_dictionary(extend=shard["extend"])
+    dictionary_builder.add_positions_to_anchors()
+
+    output_dictionary = shard["output_prefix"] + ".pkl"
+    output_boundaries = shard["output_prefix"] + ".boundaries.pkl"
+    output_coordinates = shard["output_prefix"] + ".coords.npz"
+    output_topology = shard["output_prefix"] + ".topology.npz"
+    dictionary_builder.dump_dictionary(output_dictionary)
+    dictionary_builder.dump_snarl_boundaries(output_boundaries)
+    dictionary_builder.dump_coordinate_index(output_coordinates)
+    dictionary_builder.dump_topology(output_topology)
+    dictionary_builder.print_anchors_bed(shard["output_prefix"] + ".bed")
+    if shard["extend"]:
+        dictionary_builder.print_extension_stats(shard["output_prefix"] + ".extension_stats.tsv")
+    min_node_id, max_node_id = dictionary_builder.get_node_id_range()
+    print(
+        f"Shard {shard['shard_id']} with {len(dictionary_builder.sentinel_to_anchor)} sentinels built in {time.time()-t0:.2f}",
+        flush=True,
+        file=stderr,
+    )
+
+    return {
+        "shard_id": shard["shard_id"],
+        "dictionary": output_dictionary,
+        "boundaries": output_boundaries,
+        "coordinates": output_coordinates,
+        "topology": output_topology,
+        "graph": shard["graph"],
+        "index": shard["index"],
+        "path_prefixes": shard["path_prefixes"],
+        "snarl_id_offset": shard["snarl_id_offset"],
+        "extend": shard["extend"],
+        "num_sentinels": len(dictionary_builder.sentinel_to_anchor),
+        "min_node_id": min_node_id,
+        "max_node_id": max_node_id,
+        "node_id_intervals": dictionary_builder.get_node_id_intervals(),
+    }
+
+
+def build_sharded_dictionary(graphs: list, indexes: list, path_prefixes: list, output_prefix: str, threads: int = 1, reference_names: list = None, extend: bool = False) -> str:
+    """
+    Builds one dictionary per shard in parallel and writes a manifest mapping the node id range of each shard to its dictionary.
+    The topologies of the shards are merged in prefix.topology.npz, listed in the manifest, on which get_anchors runs the anchor extension.
+    A shard is either a (graph, index) pair, when several pairs are given (e.g. one per chromosome), or a path name prefix on a single graph.
+    The snarl ids of graph shards are shifted by SHARD_SNARL_ID_OFFSET so that they do not collide, while prefix shards share the same index and keep the same snarl ids.
+
+    Returns
+    -------
+    manifest_path : string
+        The path of the manifest (.manifest.json)
+    """
+    shards = []
+    if len(graphs) > 1:
+        for shard_id, (graph, index) in enumerate(zip(graphs, indexes)):
+            shards.append({"graph": graph, "index": index, "path_prefixes": list(path_prefixes), "snarl_id_offset": shard_id * SHARD_SNARL_ID_OFFSET})
+    else:
+        for path_prefix in path_prefixes:
+            shards.append({"graph": graphs[0], "index": indexes[0], "path_prefixes": [path_prefix], "snarl_id_offset": 0})
+    for shard_id, shard in enumerate(shards):
+        shard["shard_id"] = shard_id
+        shard["output_prefix"] = f"{output_prefix}.shard{shard_id}"
+        shard["reference_names"] = list(reference_names) if reference_names else ["CHM13"]
+        shard["extend"] = extend
+
+    with Pool(processes=max(1, min(threads, len(shards)))) as pool:
+        manifest_entries = pool.map(build_shard, shards, chunksize=1)
+
+    output_topology = output_prefix + ".topology.npz"
+    UnitigChainIndex.merge([UnitigChainIndex.load(manifest_entry["topology"]) for manifest_entry in manifest_entries]).dump(output_topology)
+
+    manifest_path = output_prefix + ".manifest.json"
+    with open(manifest_path, "w") as out_f:
+        json.dump({"shards": manifest_entries, "topology": output_topology}, out_f, indent=4)
+    return manifest_path
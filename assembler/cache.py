@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+
+import assembler.constants as constants
+
+DIGEST_CHUNK_SIZE = 1 << 24
+# constants.py values changing the built dictionary, part of the BuildCache key
+BUILD_CONSTANTS = ("MIN_ANCHOR_LENGTH", "MIN_NODES_IN_ANCHOR")
+
+
+def file_digest(file_path: str) -> str:
+    """
+    Returns the blake2b hex digest of the content of a file, read in chunks so that large graphs and indexes are not loaded in memory.
+    """
+    digest = hashlib.blake2b()
+    with open(file_path, "rb") as in_f:
+        for chunk in iter(lambda: in_f.read(DIGEST_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snarl_cache_path(index_path: str, index_digest: str) -> str:
+    """
+    Returns the path of the snarl sidecar of a distance index, stored next to it: index.dist.<digest>.snarls.pkl
+    """
+    return f"{index_path}.{index_digest[:16]}.snarls.pkl"
+
+
+def dump_snarl_cache(cache_path: str, snarl_cache: dict) -> None:
+    """
+    Writes the snarl sidecar. The file is written under a temporary name and then moved, so that builds running in parallel on the same index never read a partial file.
+    """
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as out_f:
+        pickle.dump(snarl_cache, out_f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+
+def snarl_cache_entry_matches(cache_entry: dict, extend: bool, snarl_id_offset: int, graph_digest: str) -> bool:
+    """
+    Whether a sidecar entry was computed with these parameters. The extended boundaries also depend on the graph topology and on MIN_ANCHOR_LENGTH (the extension length and the chain index steps), so both are part of the match.
+    """
+    return (
+        cache_entry["extend"] == extend
+        and cache_entry["snarl_id_offset"] == snarl_id_offset
+        and cache_entry.get("graph_digest") == graph_digest
+        and cache_entry.get("min_anchor_length") == constants.MIN_ANCHOR_LENGTH
+    )
+
+
+def load_snarl_cache(index_path: str, extend: bool = False, snarl_id_offset: int = 0, index_digest: str = None, graph_digest: str = None) -> dict:
+    """
+    Loads the snarl sidecar of a distance index, if it exists and was computed with the same extend flag, snarl id offset, graph and MIN_ANCHOR_LENGTH.
+
+    Parameters
+    ----------
+    index_path : string
+        Path to SnarlIndex object (.dist)
+    extend : bool
+        Whether the boundaries were extended to reach MIN_ANCHOR_LENGTH
+    snarl_id_offset : int
+        Offset added to the snarl ids (sharded builds)
+    index_digest : string
+        Digest of the index, computed if not given
+    graph_digest : string
+        Digest of the graph (or GFA) file the boundaries are computed on
+
+    Returns
+    -------
+    snarl_cache : dict
+        Contains the keys "index_digest", "graph_digest", "min_anchor_length", "extend", "snarl_id_offset", "leaf_snarl_bounds", "snarl_boundaries", "num_usable_bubbles", "leaf_snarl_boundary_counts" and "extension_stats", None if there is no valid sidecar
+    """
+    if index_digest is None:
+        index_digest = file_digest(index_path)
+    cache_path = snarl_cache_path(index_path, index_digest)
+    if not os.path.exists(cache_path):
+        return None
+
+    with open(cache_path, "rb") as in_f:
+        snarl_cache = pickle.load(in_f)
+    for cache_entry in snarl_cache.get("entries", []):
+        if snarl_cache_entry_matches(cache_entry, extend, snarl_id_offset, graph_digest):
+            return cache_entry
+    return None
+
+
+def store_snarl_cache(index_path: str, cache_entry: dict) -> str:
+    """
+    Adds an entry (one per extend flag, snarl id offset, graph and MIN_ANCHOR_LENGTH) to the snarl sidecar of a distance index, replacing an older entry computed with the same parameters.
+
+    Returns
+    -------
+    cache_path : string
+        The path of the sidecar
+    """
+    cache_path = snarl_cache_path(index_path, cache_entry["index_digest"])
+    snarl_cache = {"entries": []}
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as in_f:
+            snarl_cache = pickle.load(in_f)
+    snarl_cache["entries"] = [
+        entry
+        for entry in snarl_cache["entries"]
+        if not snarl_cache_entry_matches(entry, cache_entry["extend"], cache_entry["snarl_id_offset"], cache_entry["graph_digest"])
+    ]
+    snarl_cache["entries"].append(cache_entry)
+    dump_snarl_cache(cache_path, snarl_cache)
+    return cache_path
+
+
+class BuildCache:
+    """
+    This class stores the outputs of `build` in a cache directory, keyed by the content of the graph and index files, the build constants and the build options, so that a build with the same inputs is served by copying the cached files.
+    The digests of the input files are memoized in digests.json by path, size and modification time, so that unchanged files are not hashed again.
+    Each entry is a directory named after its key, containing the dictionary files (dictionary.pkl, dictionary.boundaries.pkl, ...) and a meta.json written last, which marks the entry as complete.
+    """
+
+    def __init__(self, cache_dir: str) -> None:
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.digests_path = os.path.join(cache_dir, "digests.json")
+        self.digests: dict = {}
+        if os.path.exists(self.digests_path):
+            with open(self.digests_path) as in_f:
+                self.digests = json.load(in_f)
+
+    def digest(self, file_path: str) -> str:
+        file_path = os.path.abspath(file_path)
+        file_stat = os.stat(file_path)
+        memo = self.digests.get(file_path)
+        if memo is not None and memo["size"] == file_stat.st_size and memo["mtime_ns"] == file_stat.st_mtime_ns:
+            return memo["digest"]
+
+        digest = file_digest(file_path)
+        self.digests[file_path] = {"size": file_stat.st_size, "mtime_ns": file_stat.st_mtime_ns, "digest": digest}
+        tmp_path = f"{self.digests_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as out_f:
+            json.dump(self.digests, out_f, indent=4)
+        os.replace(tmp_path, self.digests_path)
+        return digest
+
+    def key(self, input_paths: list, options: dict) -> str:
+        """
+        Computes the key of a build.
+
+        Parameters
+        ----------
+        input_paths : list
+            The files the dictionary is built from (graph or GFA, index, previous dictionary)
+        options : dict
+            The build options changing the dictionary (path prefixes, references...)
+
+        Returns
+        -------
+        key : string
+            Hex digest of the input digests, of the BUILD_CONSTANTS values and of the options
+        """
+        fingerprint = {
+            "inputs": [self.digest(input_path) for input_path in input_paths],
+            "constants": {constant_name: getattr(constants, constant_name) for constant_name in BUILD_CONSTANTS},
+            "options": options,
+        }
+        return hashlib.blake2b(json.dumps(fingerprint, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+    def dictionary_key(self, graph_path: str, index_path: str, path_prefixes: list = (), reference_names: list = ("CHM13",), previous_dictionary: str = None, extend: bool = True) -> str:
+        """
+        Computes the key of a single (not sharded) dictionary build, as used by both `build` and `get_anchors`.
+        """
+        input_paths = [graph_path, index_path] + ([previous_dictionary] if previous_dictionary else [])
+        return self.key(input_paths, {"path_prefixes": list(path_prefixes), "reference_names": list(reference_names), "extend": extend})
+
+    def entry_prefix(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key, "dictionary")
+
+    def lookup(self, key: str) -> str:
+        """
+        Returns the prefix of the cached dictionary files of a key, None if the key is not cached.
+        """
+        if os.path.exists(os.path.join(self.cache_dir, key, "meta.json")):
+            return self.entry_prefix(key)
+        return None
+
+    def store(self, key: str, output_prefix: str, suffixes: list, meta: dict) -> str:
+        entry_dir = os.path.join(self.cache_dir, key)
+        os.makedirs(entry_dir, exist_ok=True)
+        for suffix in suffixes:
+            if os.path.exists(output_prefix + suffix):
+                shutil.copy2(output_prefix + suffix, self.entry_prefix(key) + suffix)
+        with open(os.path.join(entry_dir, "meta.json"), "w") as out_f:
+            json.dump(meta, out_f, indent=4)
+        return self.entry_prefix(key)
+
+    def restore(self, key: str, output_prefix: str, suffixes: list) -> None:
+        """
+        Copies the cached files of a key to output_prefix. They are copied and not linked, as later builds overwrite their outputs in place.
+        """
+        for suffix in suffixes:
+            cached_path = self.entry_prefix(key) + suffix
+            if os.path.exists(cached_path):
+                shutil.copy2(cached_path, output_prefix + suffix)
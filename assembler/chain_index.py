@@ -0,0 +1,183 @@
+import numpy as np
+
+RIGHT_SIDE = 0
+LEFT_SIDE = 1
+
+
+class UnitigChainIndex:
+    """
+    This class stores, for the nodes of a bidirected graph, their length and, on each side, their degree and their only neighbor when the degree is 1, so that unitig (degree 1) chains can be walked with array lookups instead of follow_edges callbacks.
+    Sides are given for the forward orientation of the node: the right side is the one followed with go_left=False. The neighbor is stored as a signed node id, negative if the neighbor is entered in reverse orientation, 0 if the degree is not 1.
+    A node traversed in reverse orientation has its sides swapped and its neighbors flipped.
+
+    The index can cover the whole graph or, with seed nodes, only the unitig chains reachable from them within max_steps nodes, which is enough for the boundary extension of the snarls.
+    """
+
+    def __init__(self) -> None:
+        self.node_rows: dict = {}
+        self.lengths = np.zeros(0, dtype=np.int64)
+        self.degrees = np.zeros((0, 2), dtype=np.int64)
+        self.neighbors = np.zeros((0, 2), dtype=np.int64)
+
+    def build(self, graph, seed_node_ids: list = None, max_steps: int = 0) -> None:
+        """
+        Builds the index from a graph (PackedGraph).
+
+        Parameters
+        ----------
+        graph : PackedGraph
+            The graph
+        seed_node_ids : list
+            If given, only the nodes reachable from these nodes following degree 1 sides for at most max_steps nodes are indexed, else the whole graph is
+        max_steps : int
+            Number of degree 1 steps explored from each seed
+        """
+        lengths, degrees, neighbors = [], [], []
+
+        def add_node(node_id):
+            handle = graph.get_handle(node_id, False)
+            node_degrees = [graph.get_degree(handle, False), graph.get_degree(handle, True)]
+            node_neighbors = [0, 0]
+            for side, go_left in ((RIGHT_SIDE, False), (LEFT_SIDE, True)):
+                if node_degrees[side] == 1:
+                    next_handles = []
+                    graph.follow_edges(handle, go_left, lambda next_handle: next_handles.append(next_handle) or False)
+                    next_handle = next_handles[0]
+                    node_neighbors[side] = -graph.get_id(next_handle) if graph.get_is_reverse(next_handle) else graph.get_id(next_handle)
+            self.node_rows[node_id] = len(lengths)
+            lengths.append(graph.get_length(handle))
+            degrees.append(node_degrees)
+            neighbors.append(node_neighbors)
+            return node_neighbors
+
+        if seed_node_ids is None:
+            graph.for_each_handle(lambda handle: add_node(graph.get_id(handle)) or True)
+        else:
+            frontier = list(dict.fromkeys(seed_node_ids))
+            for _ in range(max_steps + 1):
+                next_frontier = []
+                for node_id in frontier:
+                    if node_id in self.node_rows:
+                        continue
+                    for neighbor in add_node(node_id):
+                        if neighbor != 0 and abs(neighbor) not in self.node_rows:
+                            next_frontier.append(abs(neighbor))
+                frontier = next_frontier
+
+        self.lengths = np.array(lengths, dtype=np.int64)
+        self.degrees = np.array(degrees, dtype=np.int64).reshape(-1, 2)
+        self.neighbors = np.array(neighbors, dtype=np.int64).reshape(-1, 2)
+
+    def __contains__(self, node_id: int) -> bool:
+        return node_id in self.node_rows
+
+    def length(self, node_id: int) -> int:
+        return int(self.lengths[self.node_rows[node_id]])
+
+    def degree(self, node_id: int, is_reverse: bool, go_left: bool) -> int:
+        """
+        Returns the number of edges on the go_left side of the node traversed in the is_reverse orientation, as graph.get_degree(handle, go_left).
+        """
+        side = LEFT_SIDE if go_left != is_reverse else RIGHT_SIDE
+        return int(self.degrees[self.node_rows[node_id], side])
+
+    def follow(self, node_id: int, is_reverse: bool, go_left: bool) -> tuple:
+        """
+        Returns the only neighbor (node_id, is_reverse) on the go_left side of the node traversed in the is_reverse orientation, as graph.follow_edges(handle, go_left), None if the degree of that side is not 1.
+        """
+        side = LEFT_SIDE if go_left != is_reverse else RIGHT_SIDE
+        neighbor = int(self.neighbors[self.node_rows[node_id], side])
+        if neighbor == 0:
+            return None
+        return (abs(neighbor), (neighbor < 0) != is_reverse)
+
+    def dump(self, out_file_path: str) -> None:
+        node_ids = np.zeros(len(self.node_rows), dtype=np.int64)
+        for node_id, row in self.node_rows.items():
+            node_ids[row] = node_id
+        np.savez(out_file_path, node_ids=node_ids, lengths=self.lengths, degrees=self.degrees, neighbors=self.neighbors)
+
+    @classmethod
+    def merge(cls, chain_indexes: list):
+        """
+        Returns the union of several indexes of the same graph (e.g. the topologies of the shards of a dictionary). A node indexed by several of them is taken from the first one.
+        """
+        merged_chain_index = cls()
+        rows = []
+        for chain_index_idx, chain_index in enumerate(chain_indexes):
+            for node_id, row in chain_index.node_rows.items():
+                if node_id not in merged_chain_index.node_rows:
+                    merged_chain_index.node_rows[node_id] = len(rows)
+                    rows.append((chain_index_idx, row))
+        for attr_name in ("lengths", "degrees", "neighbors"):
+            attr_values = [getattr(chain_indexes[chain_index_idx], attr_name)[row] for chain_index_idx, row in rows]
+            empty_value = getattr(merged_chain_index, attr_name)
+            setattr(merged_chain_index, attr_name, np.array(attr_values, dtype=np.int64).reshape(-1, *empty_value.shape[1:]))
+        return merged_chain_index
+
+    @classmethod
+    def load(cls, in_file_path: str):
+        chain_index = cls()
+        with np.load(in_file_path) as in_f:
+            chain_index.node_rows = {node_id: row for row, node_id in enumerate(in_f["node_ids"].tolist())}
+            chain_index.lengths = in_f["lengths"]
+            chain_index.degrees = in_f["degrees"]
+            chain_index.neighbors = in_f["neighbors"]
+        return chain_index
+
+
+class TopologyGraph:
+    """
+    This class answers the handle graph calls of the anchor extension (get_handle, get_id, get_is_reverse, get_length, get_degree, follow_edges) from a UnitigChainIndex, so that the PackedGraph does not need to stay loaded once the alignments are matched.
+    Handles are (node_id, is_reverse) pairs. The calls on a node missing from the index, or following a side of degree larger than 1, are answered by the PackedGraph, deserialized from packed_graph_path the first time it is needed.
+    """
+
+    def __init__(self, chain_index: UnitigChainIndex, packed_graph_path: str = None) -> None:
+        self.chain_index = chain_index
+        self.packed_graph_path = packed_graph_path
+        self.graph = None
+
+    def _packed_graph(self):
+        if self.graph is None:
+            if self.packed_graph_path is None:
+                raise KeyError("node not in the topology index and no packed graph to fall back to")
+            from bdsg.bdsg import PackedGraph
+
+            self.graph = PackedGraph()
+            self.graph.deserialize(self.packed_graph_path)
+        return self.graph
+
+    def has_node(self, node_id: int) -> bool:
+        return node_id in self.chain_index or self._packed_graph().has_node(node_id)
+
+    def get_handle(self, node_id: int, is_reverse: bool = False) -> tuple:
+        return (node_id, is_reverse)
+
+    def get_id(self, handle: tuple) -> int:
+        return handle[0]
+
+    def get_is_reverse(self, handle: tuple) -> bool:
+        return handle[1]
+
+    def get_length(self, handle: tuple) -> int:
+        if handle[0] in self.chain_index:
+            return self.chain_index.length(handle[0])
+        graph = self._packed_graph()
+        return graph.get_length(graph.get_handle(*handle))
+
+    def get_degree(self, handle: tuple, go_left: bool) -> int:
+        if handle[0] in self.chain_index:
+            return self.chain_index.degree(handle[0], handle[1], go_left)
+        graph = self._packed_graph()
+        return graph.get_degree(graph.get_handle(*handle), go_left)
+
+    def follow_edges(self, handle: tuple, go_left: bool, iteratee) -> bool:
+        if handle[0] in self.chain_index:
+            next_handle = self.chain_index.follow(handle[0], handle[1], go_left)
+            if next_handle is not None:
+                iteratee(next_handle)
+                return True
+            if self.chain_index.degree(handle[0], handle[1], go_left) == 0:
+                return True
+        graph = self._packed_graph()
+        return graph.follow_edges(graph.get_handle(*handle), go_left, lambda next_handle: iteratee((graph.get_id(next_handle), graph.get_is_reverse(next_handle))))
@@ -4,12 +4,21 @@ import os.path
 from datetime import datetime
 import sys
 import re
+import json
+import signal
 
 import assembler.constants as constants
 from assembler.handler import Orchestrator
-from assembler.builder import AnchorDictionary
+from assembler.builder import AnchorDictionary, build_sharded_dictionary
+from assembler.cache import BuildCache
+from assembler.flat_dictionary import FlatAnchorDictionary
+from assembler.compatibility_cache import SnarlPairCache
 import assembler.qc
 import assembler.helpers
+import assembler.stats
+
+# files written by a single build, stored in the build cache
+BUILD_OUTPUT_SUFFIXES = [".pkl", ".boundaries.pkl", ".coords.npz", ".topology.npz", ".bed", ".bandage.csv", ".sizes.tsv", ".forward_dict.csv", ".reverse_dict.csv", ".extension_stats.tsv"]
 
 
 @click.group()
@@ -21,15 +30,21 @@ def cli():
 @cli.command()
 @click.option(
     "--graph",
-    required=True,
+    multiple=True,
+    type=click.Path(exists=True),
+    help="Input packedgraph file (.vg). Repeat it, together with --index, to build one shard per graph",
+)
+@click.option(
+    "--gfa",
     type=click.Path(exists=True),
-    help="Input packedgraph file (.vg)",
+    help="Input GFA file (.gfa or .gfa.gz) the index was built from, used instead of --graph. Its P/W lines are streamed and the packedgraph is not loaded",
 )
 @click.option(
     "--index",
     required=True,
+    multiple=True,
     type=click.Path(exists=True),
-    help="Input distance index file (.dist)",
+    help="Input distance index file (.dist), one for each --graph",
 )
 @click.option(
     "--output-prefix",
@@ -37,14 +52,76 @@ def cli():
     type=click.Path(),
     help="Output prefix for the anchor dictionary",
 )
+@click.option(
+    "--path-prefix",
+    multiple=True,
+    help="Only scan the paths named as this prefix or starting with it followed by one of #:.[| (chr1 does not match chr10). On a single graph, a shard is built for each prefix",
+)
+@click.option(
+    "--threads",
+    default=1,
+    type=int,
+    help="Number of shards built in parallel",
+)
+@click.option(
+    "--reference",
+    multiple=True,
+    default=["CHM13"],
+    show_default=True,
+    help="Reference whose paths (matched by name, case insensitive) are used to place the anchors. Repeat it to index several references; the first one gives the anchor genomic position",
+)
+@click.option(
+    "--extend/--no-extend",
+    default=None,
+    help="Extend the boundaries of the snarls whose boundary nodes are too short for an anchor along degree 1 nodes, writing per-snarl statistics to prefix.extension_stats.tsv. Default: on with --graph, off with --gfa (it needs the graph)",
+)
+@click.option(
+    "--update-from",
+    type=click.Path(exists=True),
+    help="Dictionary (.pkl) of a previous build on the same index. Only the paths not covered by it are scanned and the new anchors are merged in",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    help="Build cache directory. A build with the same graph, index, constants and options is copied from the cache instead of being recomputed",
+)
 # @click.option("--anchors-json", type=click.Path(), help="Output file for the anchors in the dictionary (.json)")
 # @click.option("--bandage-csv", type=click.Path(), help="Output CSV file for Bandage")
 # @click.option("--sizes-csv", type=click.Path(), help="Output CSV file for anchor sizes")
 # @click.option(
 #     "--positioned-dict", type=click.Path(), help="Output file for positioned dictionary"
 # )
-def build(graph, index, output_prefix):
+def build(graph, gfa, index, output_prefix, path_prefix, threads, reference, extend, update_from, cache_dir):
+    if extend is None:
+        extend = not gfa
+    if gfa:
+        if graph:
+            raise click.UsageError("Use either --graph or --gfa, not both")
+        if extend:
+            raise click.UsageError("--extend needs the graph, it cannot be used with --gfa")
+        if len(index) != 1 or len(path_prefix) > 1:
+            raise click.UsageError("--gfa builds take a single --index and are not sharded")
+    elif not graph:
+        raise click.UsageError("One of --graph or --gfa is required")
+    elif len(graph) != len(index):
+        raise click.UsageError("--graph and --index must be given the same number of times")
+
+    if len(graph) > 1 or len(path_prefix) > 1:
+        if update_from or cache_dir:
+            raise click.UsageError("--update-from and --cache-dir are not supported for sharded builds")
+        t0 = time.time()
+        manifest_path = build_sharded_dictionary(list(graph), list(index), list(path_prefix), output_prefix, threads, list(reference), extend)
+        print(f"Sharded dictionary built in {time.time()-t0:.2f}", flush=True, file=sys.stderr)
+        click.echo(f"Anchor dictionary shards built, manifest saved to {manifest_path}")
+        return
+
+    index = index[0]
     output_dictionary = output_prefix + ".pkl"
+    output_boundaries = output_prefix + ".boundaries.pkl"
+    output_coordinates = output_prefix + ".coords.npz"
+    output_topology = output_prefix + ".topology.npz"
+    output_bed = output_prefix + ".bed"
+    output_extension_stats = output_prefix + ".extension_stats.tsv"
     bandage_csv = output_prefix + ".bandage.csv"
     sizes_csv = output_prefix + ".sizes.tsv"
     # paths_file = output_prefix + ".used_pathnames.txt"
@@ -52,16 +129,43 @@ def build(graph, index, output_prefix):
 
     """Build an anchor dictionary from graph and index files."""
     t0 = time.time()
+    if cache_dir:
+        build_cache = BuildCache(cache_dir)
+        cache_key = build_cache.dictionary_key(gfa or graph[0], index, path_prefix, reference, update_from, extend)
+        if build_cache.lookup(cache_key):
+            build_cache.restore(cache_key, output_prefix, BUILD_OUTPUT_SUFFIXES)
+            print(f"Build cache hit {cache_key}, served in {time.time()-t0:.2f}", flush=True, file=sys.stderr)
+            click.echo(f"Anchor dictionary restored from the build cache and saved to {output_dictionary}")
+            return
+
     dictionary_builder = AnchorDictionary()
-    dictionary_builder.build(graph, index)
-    dictionary_builder.fill_anchor_dictionary(extend = False)
+    dictionary_builder.path_prefixes = list(path_prefix)
+    dictionary_builder.reference_names = list(reference)
+    if gfa:
+        dictionary_builder.build_from_gfa(gfa, index)
+    else:
+        dictionary_builder.build(graph[0], index)
+    if update_from:
+        previous_boundaries = os.path.splitext(update_from)[0] + ".boundaries.pkl"
+        if not os.path.exists(previous_boundaries):
+            print(f"WARNING: {previous_boundaries} not found, snarl boundaries will be recomputed", file=sys.stderr)
+            previous_boundaries = None
+        dictionary_builder.load_previous_dictionary(update_from, previous_boundaries, extend)
+    dictionary_builder.fill_anchor_dictionary(extend = extend)
     print(
-        f"Anchors dictionary from {len(dictionary_builder.leaf_snarls)} snarls, containing {len(dictionary_builder.sentinel_to_anchor)} sentinels built in {time.time()-t0:.2f}",
+        f"Anchors dictionary from {dictionary_builder.num_usable_bubbles} snarls, containing {len(dictionary_builder.sentinel_to_anchor)} sentinels built in {time.time()-t0:.2f}",
         flush=True,
         file=sys.stderr,
     )
     dictionary_builder.add_positions_to_anchors()
     dictionary_builder.dump_dictionary(output_dictionary)
+    dictionary_builder.dump_snarl_boundaries(output_boundaries)
+    dictionary_builder.dump_coordinate_index(output_coordinates)
+    if not gfa:
+        dictionary_builder.dump_topology(output_topology)
+    dictionary_builder.print_anchors_bed(output_bed)
+    if extend:
+        dictionary_builder.print_extension_stats(output_extension_stats)
     dictionary_builder.print_anchor_boundaries_dict(output_prefix)
 
     if bandage_csv:
@@ -76,24 +180,72 @@ def build(graph, index, output_prefix):
     # if positioned_dict:
     #     dictionary_builder.generate_positioned_dictionary("", positioned_dict)
 
+    if cache_dir:
+        build_cache.store(
+            cache_key,
+            output_prefix,
+            BUILD_OUTPUT_SUFFIXES,
+            {"graph": gfa or graph[0], "index": index, "path_prefixes": list(path_prefix), "reference_names": list(reference), "extend": extend, "update_from": update_from},
+        )
+        print(f"Dictionary stored in the build cache as {cache_key}", file=sys.stderr)
+
     click.echo(f"Anchor dictionary built and saved to {output_dictionary}")
 
 
 @cli.command()
 @click.option(
     "--dictionary",
-    required=True,
     type=click.Path(exists=True),
-    help="Input anchor dictionary file",
+    help="Input anchor dictionary file (.pkl), or the manifest (.manifest.json) of a sharded dictionary. If not given, it is taken from --cache-dir",
 )
 @click.option(
     "--graph", required=True, type=click.Path(exists=True), help="Input graph file"
 )
+@click.option(
+    "--index",
+    type=click.Path(exists=True),
+    help="Distance index (.dist) the dictionary was built with, used with --cache-dir to find the dictionary built from --graph",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    help="Build cache directory used by build --cache-dir",
+)
+@click.option(
+    "--gfa",
+    type=click.Path(exists=True),
+    help="GFA file the cached dictionary was built from with build --gfa, used with --cache-dir instead of --graph to find it",
+)
+@click.option(
+    "--path-prefix",
+    multiple=True,
+    help="--path-prefix of the build, used with --cache-dir to find the dictionary",
+)
+@click.option(
+    "--reference",
+    multiple=True,
+    default=["CHM13"],
+    show_default=True,
+    help="--reference of the build, used with --cache-dir to find the dictionary",
+)
+@click.option(
+    "--extend/--no-extend",
+    default=None,
+    help="--extend/--no-extend of the build, used with --cache-dir to find the dictionary. Default: on, off with --gfa, as in build",
+)
+@click.option(
+    "--update-from",
+    type=click.Path(exists=True),
+    help="--update-from of the build, used with --cache-dir to find the dictionary",
+)
+@click.option(
+    "--shared-dict",
+    help="Name of a dictionary held in shared memory by share-dict, used instead of --dictionary",
+)
 @click.option(
     "--alignment",
-    required=True,
     type=click.Path(exists=True),
-    help="Input alignment file",
+    help="Input alignment file, required unless --resume-from is given",
 )
 @click.option(
     "--fasta",
@@ -102,10 +254,62 @@ def build(graph, index, output_prefix):
     help="Input fasta file"
 )
 @click.option(
-    "--output", required=True, type=click.Path(), help="Output basename. Used by anchors (jsonl) and pkl count (.count.pkl)"
+    "--output", required=True, type=click.Path(), help="Output basename. Used by anchors (jsonl), pkl count (.count.pkl) and the checkpoint written after the alignment matching (.checkpoint.pkl)"
+)
+@click.option(
+    "--resume-from",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Checkpoint (<output>.checkpoint.pkl) of a previous run: only the anchor post-processing (extension, merging, pruning) is run again, without reading the dictionary and the alignments",
+)
+@click.option(
+    "--threads",
+    default=1,
+    type=int,
+    help="Number of processes used to find the reliable snarls",
 )
-def get_anchors(dictionary, graph, alignment, fasta, output):
+@click.option(
+    "--linkage-mode",
+    type=click.Choice(["reads", "window"]),
+    default="reads",
+    show_default=True,
+    help="How snarls sharing reads are found: from the reads of each snarl, or among the snarls within the longest read length on the reference",
+)
+@click.option(
+    "--snarl-pairs",
+    is_flag=True,
+    help="Also store the read partition summaries of the snarl pairs in <output>.snarl_pairs.npz, to re-evaluate the reliable snarls with reliable-snarls",
+)
+@click.option(
+    "--read-drops",
+    is_flag=True,
+    help="Also write the reads dropped by the anchor extension to <output>.read_drops.jsonl, one (snarl_id, anchor_idx, anchor, iteration, read_id, reason) event per line",
+)
+def get_anchors(dictionary, graph, index, cache_dir, gfa, path_prefix, reference, extend, update_from, shared_dict, alignment, fasta, output, resume_from, threads, linkage_mode, snarl_pairs, read_drops):
     """Process alignment and get anchors."""
+    if resume_from:
+        if dictionary or cache_dir or shared_dict or alignment:
+            raise click.UsageError("--resume-from cannot be used with --dictionary, --cache-dir, --shared-dict or --alignment")
+    elif not alignment:
+        raise click.UsageError("--alignment is required unless --resume-from is given")
+    elif shared_dict:
+        if dictionary or cache_dir:
+            raise click.UsageError("--shared-dict cannot be used with --dictionary or --cache-dir")
+    elif dictionary is None:
+        if not (cache_dir and index):
+            raise click.UsageError("Either --dictionary or both --cache-dir and --index are required")
+        if len(path_prefix) > 1:
+            raise click.UsageError("Sharded builds are not cached, use --dictionary with their manifest")
+        if extend is None:
+            extend = not gfa
+        build_cache = BuildCache(cache_dir)
+        # the key of the build, which also depends on its options
+        cache_key = build_cache.dictionary_key(gfa or graph, index, path_prefix, reference, update_from, extend)
+        cached_prefix = build_cache.lookup(cache_key)
+        if cached_prefix is None:
+            raise click.UsageError(f"No dictionary built from {gfa or graph} and {index} with these build options in {cache_dir}, run build --cache-dir first")
+        dictionary = cached_prefix + ".pkl"
+        print(f"Using the cached dictionary {dictionary}", file=sys.stderr)
+
     anchors_dir = os.path.dirname(output)
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     log_path = os.path.join(anchors_dir, "params_run.log")
@@ -133,17 +337,22 @@ def get_anchors(dictionary, graph, alignment, fasta, output):
     ERROR_TOLERANCE_IN_COMPATIBILITY_CHECK = {constants.ERROR_TOLERANCE_IN_COMPATIBILITY_CHECK}
     ENABLE_UNEQUAL_SET_COMPATIBILITY = {constants.ENABLE_UNEQUAL_SET_COMPATIBILITY}
     MIN_READS_FOR_PARTITION_COMPATIBILITY = {constants.MIN_READS_FOR_PARTITION_COMPATIBILITY}
+    LINKAGE_WINDOW_SLACK = {constants.LINKAGE_WINDOW_SLACK}
     """
 
     with open(log_path, "w") as log_file:
         log_file.write(log_content.strip())
 
     t1 = time.time()
-    orchestrator = Orchestrator(dictionary, graph, alignment, fasta)
-    orchestrator.process(f"{output}")
-    print(
-        f"GAF alignment processed in {time.time()-t1:.2f}", flush=True, file=sys.stderr
+    orchestrator = Orchestrator(
+        dictionary, graph, alignment, fasta, shared_dict, threads, linkage_mode, f"{output}.snarl_pairs.npz" if snarl_pairs else None, f"{output}.read_drops.jsonl" if read_drops else None, resume_from
     )
+    if not resume_from:
+        orchestrator.process(f"{output}")
+        print(
+            f"GAF alignment processed in {time.time()-t1:.2f}", flush=True, file=sys.stderr
+        )
+        orchestrator.dump_checkpoint(f"{output}.checkpoint.pkl")
 
     orchestrator.dump_anchors(f"{output}.jsonl", f"{output}.extended.jsonl", f"{output}.anchor_reads_tracker.jsonl", f"{output}.independent_extension.jsonl", f"{output}.extended.pruned.jsonl", f"{output}.reliable_snarls.tsv", f"{output}.snarl_variant_type.jsonl", f"{output}.snarl_compatibility.jsonl", f"{output}.snarl_2_snarl_common_reads.jsonl", f"{output}.snarl_2_snarl_read_partitions.jsonl", f"{output}.snarl_coverage.jsonl", f"{output}.snarl_allelic_coverage.jsonl", f"{output}.snarl_coverage_extended.jsonl", f"{output}.snarl_allelic_coverage_extended.jsonl")
     orchestrator.dump_dict_size_extended(f"{output}.subgraph.sizes.extended.tsv")
@@ -151,6 +360,118 @@ def get_anchors(dictionary, graph, alignment, fasta, output):
     # orchestrator.dump_dictionary_with_counts(output + ".count.pkl") #dictionary.rstrip("pkl")
     # click.echo(f"Anchors processed and saved to {output}.jsonl; anchors info on {output}.count.pkl")
 
+@cli.command(name="share-dict")
+@click.option(
+    "--dictionary",
+    required=True,
+    type=click.Path(exists=True),
+    help="Input anchor dictionary file (.pkl)",
+)
+@click.option(
+    "--name",
+    required=True,
+    help="Name of the shared memory segment, given to get_anchors --shared-dict",
+)
+def share_dict(dictionary, name):
+    """Hold an anchor dictionary in shared memory for concurrent get_anchors runs, until interrupted."""
+    if dictionary.endswith(".json"):
+        raise click.UsageError("Sharded dictionaries cannot be shared, their shards are already loaded on demand by get_anchors")
+    # SIGTERM exits through the finally clause below as SIGINT does, so that the segment is unlinked
+    def stop(signum, frame):
+        raise SystemExit(0)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    t0 = time.time()
+    flat_dictionary = FlatAnchorDictionary.from_pickle(dictionary)
+    segment = flat_dictionary.to_shared_memory(name)
+    num_sentinels = len(flat_dictionary)
+    del flat_dictionary
+    print(f"Dictionary with {num_sentinels} sentinels shared as {name} ({segment.size / 2**20:.1f} MiB) in {time.time()-t0:.2f}", file=sys.stderr, flush=True)
+    try:
+        while True:
+            signal.pause()
+    finally:
+        segment.close()
+        segment.unlink()
+        print(f"Shared dictionary {name} released", file=sys.stderr)
+
+
+@cli.command(name="dict-stats")
+@click.option(
+    "--dictionary",
+    required=True,
+    type=click.Path(exists=True),
+    help="Input anchor dictionary file (.pkl), or the manifest (.manifest.json) of a sharded dictionary",
+)
+@click.option(
+    "--output",
+    type=click.Path(),
+    help="Also write the statistics to this file (.json)",
+)
+def dict_stats(dictionary, output):
+    """Report the size and distribution of an anchor dictionary."""
+    t0 = time.time()
+    stats = assembler.stats.dictionary_stats(dictionary)
+    assembler.stats.print_dictionary_stats(stats, sys.stdout)
+    if output:
+        with open(output, "w") as out_f:
+            json.dump(stats, out_f, indent=4)
+    print(f"Dictionary statistics computed in {time.time()-t0:.2f}", file=sys.stderr)
+
+
+@cli.command(name="reliable-snarls")
+@click.option(
+    "--snarl-pairs",
+    required=True,
+    type=click.Path(exists=True),
+    help="Snarl pair summaries (.snarl_pairs.npz) stored by get_anchors --snarl-pairs",
+)
+@click.option(
+    "--linkage-threshold",
+    type=int,
+    default=constants.MIN_SNARL_LINKAGE_THRESHOLD,
+    show_default=True,
+    help="MIN_SNARL_LINKAGE_THRESHOLD, at least 1",
+)
+@click.option(
+    "--error-tolerance",
+    type=float,
+    default=constants.ERROR_TOLERANCE_IN_COMPATIBILITY_CHECK,
+    show_default=True,
+    help="ERROR_TOLERANCE_IN_COMPATIBILITY_CHECK",
+)
+@click.option(
+    "--reliable-fraction",
+    type=float,
+    default=constants.RELIABLE_SNARL_FRACTION_THRESHOLD,
+    show_default=True,
+    help="RELIABLE_SNARL_FRACTION_THRESHOLD",
+)
+@click.option(
+    "--output",
+    type=click.Path(),
+    help="Output file (.tsv, as <output>.reliable_snarls.tsv of get_anchors), stdout if not given",
+)
+def reliable_snarls(snarl_pairs, linkage_threshold, error_tolerance, reliable_fraction, output):
+    """Re-evaluate the reliable snarls of a get_anchors run with other thresholds, from its snarl pair summaries."""
+    if linkage_threshold < 1:
+        raise click.UsageError("--linkage-threshold must be at least 1")
+    t0 = time.time()
+    snarl_pair_cache = SnarlPairCache.load(snarl_pairs)
+    snarl_decisions = snarl_pair_cache.evaluate(linkage_threshold, error_tolerance, reliable_fraction)
+    out_f = open(output, "w") if output else sys.stdout
+    try:
+        print("snarl_id\tzygosity\tis_reliable\tlinked_snarls", file=out_f)
+        for snarl_id, zygosity, is_reliable, _, linked_snarl_ids in snarl_decisions:
+            print(f"{snarl_id}\t{zygosity}\t{is_reliable}\t{linked_snarl_ids}", file=out_f)
+    finally:
+        if output:
+            out_f.close()
+    num_kept = sum(1 for decision in snarl_decisions if decision[3])
+    print(f"{num_kept} of {len(snarl_decisions)} snarls kept ({len(snarl_pair_cache.pairs)} snarl pairs) in {time.time()-t0:.2f}", file=sys.stderr)
+
+
 @cli.command()
 @click.option(
     "--anchors",
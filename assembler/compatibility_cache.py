@@ -0,0 +1,149 @@
+import numpy as np
+
+import assembler.constants as constants
+
+
+def are_partitions_compatible(primary_sizes: list, other_sizes: list, intersection_sizes, error_tolerance: float = None, min_reads: int = None) -> tuple:
+    """
+    Checks if the partitions of the reads shared by two snarls are the "same" in both, from the sizes of the partitions and of their intersections only.
+    Each primary partition is matched, in order, to the unmatched other partition with the largest intersection among the ones differing from it by at most error_tolerance of their reads.
+
+    Parameters
+    ----------
+    primary_sizes : list
+        Number of shared reads of each non empty partition (anchor) of the primary snarl
+    other_sizes : list
+        Number of shared reads of each non empty partition of the other snarl
+    intersection_sizes : array_like
+        intersection_sizes[i][j] is the number of reads in both the i-th primary and the j-th other partition
+    error_tolerance : float
+        Fraction of the reads of a partition allowed to be missing from its match, ERROR_TOLERANCE_IN_COMPATIBILITY_CHECK if None
+    min_reads : int
+        Minimum size of the primary partitions, MIN_READS_FOR_PARTITION_COMPATIBILITY if None
+
+    Returns
+    -------
+    tuple
+        (is_compatible, desc) with desc "True", "False" or "False_lowCov"
+    """
+    if error_tolerance is None:
+        error_tolerance = constants.ERROR_TOLERANCE_IN_COMPATIBILITY_CHECK
+    if min_reads is None:
+        min_reads = constants.MIN_READS_FOR_PARTITION_COMPATIBILITY
+
+    if len(primary_sizes) != len(other_sizes):
+        return (False, "False")
+    unmatched_other_idxs = list(range(len(other_sizes)))
+    for primary_idx, primary_size in enumerate(primary_sizes):
+        best_matched_intersection_size = 0
+        best_matched_position = None
+        for position, other_idx in enumerate(unmatched_other_idxs):
+            other_size = other_sizes[other_idx]
+            intersection_size = intersection_sizes[primary_idx][other_idx]
+            if (primary_size - intersection_size <= primary_size * error_tolerance) and (other_size - intersection_size <= other_size * error_tolerance):
+                if intersection_size > best_matched_intersection_size:
+                    best_matched_intersection_size = intersection_size
+                    best_matched_position = position
+        if best_matched_intersection_size == 0:
+            return (False, "False")
+        unmatched_other_idxs.pop(best_matched_position)
+    # Check if all read sets are above a coverage threshold
+    for primary_size in primary_sizes:
+        if primary_size < min_reads:
+            return (False, "False_lowCov")
+    return (True, "True")
+
+
+class SnarlPairCache:
+    """
+    This class stores the summary of the read partitions of every pair of snarls sharing reads, with at least two partitions in both snarls (the linkage conditions that do not depend on MIN_SNARL_LINKAGE_THRESHOLD): the number of shared reads, the size of each partition and the sizes of their intersections.
+    It is enough to decide which snarls are reliable under other values of MIN_SNARL_LINKAGE_THRESHOLD, ERROR_TOLERANCE_IN_COMPATIBILITY_CHECK and RELIABLE_SNARL_FRACTION_THRESHOLD (vg_anchor reliable-snarls) without the alignments.
+
+    The pairs are stored as (earlier, later) positions in snarl_ids, and their compatibility is the one checked from the later snarl, as in AlignAnchor.find_reliable_snarls.
+    """
+
+    def __init__(self) -> None:
+        self.snarl_ids: list = []
+        self.zygosity: list = []
+        self.pairs: list = []   # [(earlier_idx, later_idx, shared_reads, earlier_sizes, later_sizes, intersections (later x earlier))]
+
+    def add_pair(self, earlier_idx: int, later_idx: int, shared_reads: int, earlier_sizes: list, later_sizes: list, intersection_sizes: list) -> None:
+        self.pairs.append((earlier_idx, later_idx, shared_reads, earlier_sizes, later_sizes, intersection_sizes))
+
+    def dump(self, out_file_path: str) -> None:
+        earlier_counts = np.array([len(pair[3]) for pair in self.pairs], dtype=np.int64)
+        later_counts = np.array([len(pair[4]) for pair in self.pairs], dtype=np.int64)
+        np.savez_compressed(
+            out_file_path,
+            snarl_ids=np.array(self.snarl_ids, dtype=np.int64),
+            zygosity=np.array(self.zygosity, dtype=np.int64),
+            earlier=np.array([pair[0] for pair in self.pairs], dtype=np.int64),
+            later=np.array([pair[1] for pair in self.pairs], dtype=np.int64),
+            shared_reads=np.array([pair[2] for pair in self.pairs], dtype=np.int64),
+            earlier_counts=earlier_counts,
+            later_counts=later_counts,
+            earlier_sizes=np.array([size for pair in self.pairs for size in pair[3]], dtype=np.int64),
+            later_sizes=np.array([size for pair in self.pairs for size in pair[4]], dtype=np.int64),
+            intersections=np.array([size for pair in self.pairs for row in pair[5] for size in row], dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, in_file_path: str):
+        cache = cls()
+        with np.load(in_file_path) as in_f:
+            cache.snarl_ids = in_f["snarl_ids"].tolist()
+            cache.zygosity = in_f["zygosity"].tolist()
+            earlier_counts, later_counts = in_f["earlier_counts"], in_f["later_counts"]
+            earlier_starts = np.concatenate(([0], np.cumsum(earlier_counts)))
+            later_starts = np.concatenate(([0], np.cumsum(later_counts)))
+            intersection_starts = np.concatenate(([0], np.cumsum(earlier_counts * later_counts)))
+            earlier_sizes, later_sizes, intersections = in_f["earlier_sizes"], in_f["later_sizes"], in_f["intersections"]
+            for pair_idx, (earlier_idx, later_idx, shared_reads) in enumerate(zip(in_f["earlier"].tolist(), in_f["later"].tolist(), in_f["shared_reads"].tolist())):
+                pair_intersections = intersections[intersection_starts[pair_idx]:intersection_starts[pair_idx + 1]].reshape(later_counts[pair_idx], earlier_counts[pair_idx])
+                cache.add_pair(
+                    earlier_idx,
+                    later_idx,
+                    shared_reads,
+                    earlier_sizes[earlier_starts[pair_idx]:earlier_starts[pair_idx + 1]].tolist(),
+                    later_sizes[later_starts[pair_idx]:later_starts[pair_idx + 1]].tolist(),
+                    pair_intersections.tolist(),
+                )
+        return cache
+
+    def evaluate(self, linkage_threshold: int = None, error_tolerance: float = None, reliable_fraction: float = None, add_back_homo_snarls: bool = None, min_reads: int = None) -> list:
+        """
+        Decides which snarls are reliable, as AlignAnchor.find_reliable_snarls, for the given thresholds (the constants.py values if None).
+
+        Returns
+        -------
+        list
+            For each snarl, in snarl_ids order, (snarl_id, zygosity, is_reliable, is_kept, linked_snarl_ids), where is_kept tells if the snarl is in the reliable snarls list (reliable, or homozygous with add_back_homo_snarls)
+        """
+        if linkage_threshold is None:
+            linkage_threshold = constants.MIN_SNARL_LINKAGE_THRESHOLD
+        if reliable_fraction is None:
+            reliable_fraction = constants.RELIABLE_SNARL_FRACTION_THRESHOLD
+        if add_back_homo_snarls is None:
+            add_back_homo_snarls = constants.ADD_BACK_HOMO_SNARLS
+
+        linked_snarls = [[] for _ in self.snarl_ids]
+        compatibility = [dict() for _ in self.snarl_ids]
+        for earlier_idx, later_idx, shared_reads, earlier_sizes, later_sizes, intersection_sizes in self.pairs:
+            if shared_reads < linkage_threshold:
+                continue
+            _, desc = are_partitions_compatible(later_sizes, earlier_sizes, intersection_sizes, error_tolerance, min_reads)
+            linked_snarls[earlier_idx].append(later_idx)
+            linked_snarls[later_idx].append(earlier_idx)
+            compatibility[earlier_idx][later_idx] = compatibility[later_idx][earlier_idx] = desc
+
+        snarl_decisions = []
+        for snarl_idx, snarl_id in enumerate(self.snarl_ids):
+            descs = compatibility[snarl_idx].values()
+            num_compatible_linked_snarls = sum(1 for desc in descs if desc == "True")
+            num_non_hom_total_linked_snarls = sum(1 for desc in descs if desc in ("True", "False"))
+            fraction_compatible_linked_snarls = (num_compatible_linked_snarls / num_non_hom_total_linked_snarls) if num_non_hom_total_linked_snarls > 0 else 0
+            is_reliable = fraction_compatible_linked_snarls > reliable_fraction
+            is_kept = is_reliable or (self.zygosity[snarl_idx] == 1 if add_back_homo_snarls else False)
+            linked_snarl_ids = [self.snarl_ids[linked_idx] for linked_idx in sorted(linked_snarls[snarl_idx])]
+            snarl_decisions.append((snarl_id, self.zygosity[snarl_idx], is_reliable, is_kept, linked_snarl_ids))
+        return snarl_decisions
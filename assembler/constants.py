@@ -2,6 +2,7 @@
 MAX_PATHS_IN_SNARLS = 1000
 MIN_ANCHOR_LENGTH = 16
 MIN_NODES_IN_ANCHOR = 2
+TOPOLOGY_MAX_STEPS = 2 * MIN_ANCHOR_LENGTH   # degree 1 steps from the snarl boundaries covered by prefix.topology.npz, the anchor extension never walks further
 
 #ANCHOR DICTIONARY CONSTRUCTION CONSTANTS
 FORWARD_DICTIONARY = 0
@@ -9,6 +10,9 @@ REVERSE_DICTIONARY = 1
 PEEK_SIZE = 100000000
 END_NODE_POS = 0
 SNARL_ID_POS = 1
+SHARD_SNARL_ID_OFFSET = 1000000000  # snarl ids of the i-th graph shard start at i * SHARD_SNARL_ID_OFFSET, so they stay unique after merging
+SHARD_NODE_INTERVAL_GAP = 10000  # node ids of a shard less than this apart are stored in the same node id interval of the manifest
+PATH_NAME_DELIMITERS = "#:.[|"  # a --path-prefix matches a path name equal to it or followed by one of these (PanSN "#", ranges ":" and "[", versions "."), so chr1 does not match chr10
 
 #SHASTA CONSTANTS
 MIN_SHASTA_REVIO = 0
@@ -75,3 +79,7 @@ RELIABLE_SNARL_FRACTION_THRESHOLD = 0.1
 ERROR_TOLERANCE_IN_COMPATIBILITY_CHECK = 0
 ENABLE_UNEQUAL_SET_COMPATIBILITY = False
 MIN_READS_FOR_PARTITION_COMPATIBILITY = 1
+LINKAGE_WINDOW_SLACK = 0.1   # the linkage window (--linkage-mode window) spans the longest read length plus this fraction, for the indels between the reads and the reference
+RELIABLE_SNARL_CHUNKS_PER_THREAD = 4   # chunks of snarls per worker in find_reliable_snarls, so that dense regions do not leave the other workers idle
+EXTENSION_CHUNKS_PER_THREAD = 4   # chunks of snarl blocks per worker in each extension round of extend_and_merge_snarls
+CHECKPOINT_VERSION = 1   # format of the checkpoint written by get_anchors after the alignment matching (<output>.checkpoint.pkl), see AlignAnchor.dump_checkpoint
@@ -0,0 +1,103 @@
+import numpy as np
+
+
+class ReferenceCoordinateIndex:
+    """
+    This class maps the nodes of the graph to their offset on one or more reference paths (e.g. the CHM13 and GRCh38 chromosomes).
+    For each indexed path it keeps two NumPy arrays, the sorted node ids and the offset of the end of each node in the path, so that the offsets of many nodes are found with a single searchsorted.
+    A node visited more than once by a path keeps the offset of its last visit.
+    Paths are grouped by reference name, the name requested by the user (e.g. "CHM13") that is matched, case insensitive, in the path names.
+    """
+
+    def __init__(self) -> None:
+        self.path_node_ids: dict = {}
+        self.path_end_offsets: dict = {}
+        self.reference_paths: dict = {}   # {reference_name: [path_name1, path_name2, ...]}
+
+    def add_path(self, reference_name: str, path_name: str, node_ids, end_offsets) -> None:
+        """
+        Indexes a reference path.
+
+        Parameters
+        ----------
+        reference_name : string
+            Name of the reference the path belongs to
+        path_name : string
+            Name of the path in the graph
+        node_ids : array_like
+            Node ids of the path steps, in path order
+        end_offsets : array_like
+            Offset in the path of the end of each step, i.e. the cumulative sum of the node lengths
+        """
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        end_offsets = np.asarray(end_offsets, dtype=np.int64)
+        order = np.argsort(node_ids, kind="stable")
+        sorted_node_ids = node_ids[order]
+        # keeping the last visit of each node
+        is_last_visit = np.ones(len(sorted_node_ids), dtype=bool)
+        is_last_visit[:-1] = sorted_node_ids[1:] != sorted_node_ids[:-1]
+
+        self.path_node_ids[path_name] = sorted_node_ids[is_last_visit]
+        self.path_end_offsets[path_name] = end_offsets[order][is_last_visit]
+        self.reference_paths.setdefault(reference_name, []).append(path_name)
+
+    def lookup(self, path_name: str, node_ids) -> np.ndarray:
+        """
+        Returns the end offset in the path of each of the given nodes, -1 for the nodes that are not in the path.
+        """
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        path_node_ids = self.path_node_ids[path_name]
+        offsets = np.full(len(node_ids), -1, dtype=np.int64)
+        if len(path_node_ids) == 0:
+            return offsets
+        idx = np.minimum(np.searchsorted(path_node_ids, node_ids), len(path_node_ids) - 1)
+        found = path_node_ids[idx] == node_ids
+        offsets[found] = self.path_end_offsets[path_name][idx[found]]
+        return offsets
+
+    def anchor_positions(self, path_name: str, node_ids, anchor_starts) -> np.ndarray:
+        """
+        Computes the position of a batch of anchors on a path. An anchor whose first and last nodes are both in the path is placed at the middle of their offsets, else at the largest offset of its nodes.
+
+        Parameters
+        ----------
+        path_name : string
+            Name of the indexed path
+        node_ids : array_like
+            Node ids of all the anchors, concatenated
+        anchor_starts : array_like
+            Index in node_ids of the first node of each anchor
+
+        Returns
+        -------
+        positions : np.ndarray
+            The position of each anchor, -1 if none of its nodes are in the path
+        """
+        anchor_starts = np.asarray(anchor_starts, dtype=np.int64)
+        offsets = self.lookup(path_name, node_ids)
+        anchor_ends = np.append(anchor_starts[1:], len(offsets)) - 1
+        first_offsets = offsets[anchor_starts]
+        last_offsets = offsets[anchor_ends]
+        max_offsets = np.maximum.reduceat(offsets, anchor_starts)
+        both_boundaries_found = (first_offsets > 0) & (last_offsets > 0)
+        return np.where(both_boundaries_found, (first_offsets + last_offsets) // 2, max_offsets)
+
+    def dump(self, out_file_path: str) -> None:
+        arrays = {}
+        path_names = []
+        for reference_name, reference_path_names in self.reference_paths.items():
+            for path_name in reference_path_names:
+                arrays[f"node_ids_{len(path_names)}"] = self.path_node_ids[path_name]
+                arrays[f"end_offsets_{len(path_names)}"] = self.path_end_offsets[path_name]
+                path_names.append((reference_name, path_name))
+        np.savez(out_file_path, path_names=np.array(path_names, dtype=str).reshape(-1, 2), **arrays)
+
+    @classmethod
+    def load(cls, in_file_path: str):
+        coordinate_index = cls()
+        with np.load(in_file_path) as in_f:
+            for i, (reference_name, path_name) in enumerate(in_f["path_names"]):
+                coordinate_index.path_node_ids[str(path_name)] = in_f[f"node_ids_{i}"]
+                coordinate_index.path_end_offsets[str(path_name)] = in_f[f"end_offsets_{i}"]
+                coordinate_index.reference_paths.setdefault(str(reference_name), []).append(str(path_name))
+        return coordinate_index
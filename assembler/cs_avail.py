@@ -0,0 +1,74 @@
+import numpy as np
+
+from assembler.constants import READ_STRAND, ANCHOR_START, ANCHOR_END, CS_LEFT_AVAIL, CS_RIGHT_AVAIL
+
+
+class CsAvailability:
+    """
+    This class keeps the basepairs available for extending an anchor on one side (cs_avail) in each of its reads, sorted, with the basepairs the anchor was extended by so far as a running offset.
+    The reads whose cs_avail is below the offset are dropped by the extension: they are a prefix of the sorted cs_avail, so the max extension allowed after d read drops and the reads dropped by an extension of b basepairs are found in O(log n), without updating the reads at every extended node.
+    The reads are updated once, with apply_to_reads, when the extension on that side is done.
+
+    The cs_avail of a read on the left side of the anchor is its CS_LEFT_AVAIL on the forward strand and its CS_RIGHT_AVAIL on the reverse strand (and the other way round on the right side).
+    """
+
+    __slots__ = ("extend_left", "cs_avail_idxs", "read_order", "sorted_cs_avail", "offset", "num_dropped")
+
+    def __init__(self, reads: list, extend_left: bool) -> None:
+        self.extend_left = extend_left
+        if extend_left:
+            self.cs_avail_idxs = [(CS_LEFT_AVAIL if read[READ_STRAND] == 0 else CS_RIGHT_AVAIL) for read in reads]
+        else:
+            self.cs_avail_idxs = [(CS_RIGHT_AVAIL if read[READ_STRAND] == 0 else CS_LEFT_AVAIL) for read in reads]
+        cs_avail = np.fromiter((read[cs_avail_idx] for read, cs_avail_idx in zip(reads, self.cs_avail_idxs)), dtype=np.int64, count=len(reads))
+        self.read_order = np.argsort(cs_avail, kind="stable")    # positions of the reads in increasing cs_avail
+        self.sorted_cs_avail = cs_avail[self.read_order]
+        self.offset = 0
+        self.num_dropped = 0
+
+    def __len__(self) -> int:
+        return len(self.sorted_cs_avail) - self.num_dropped
+
+    def max_bps_after_drops(self, read_drops_allowed: int) -> int:
+        """
+        Returns the basepairs the anchor can still be extended by if read_drops_allowed of its remaining reads may be dropped.
+        """
+        return int(self.sorted_cs_avail[self.num_dropped + read_drops_allowed]) - self.offset
+
+    def extend(self, bps: int) -> list:
+        """
+        Extends the anchor by bps basepairs.
+
+        Returns
+        -------
+        list
+            The positions of the reads dropped by this extension, in increasing order
+        """
+        self.offset += bps
+        end = int(np.searchsorted(self.sorted_cs_avail, self.offset, side="left"))
+        dropped_positions = sorted(self.read_order[self.num_dropped:end].tolist())
+        self.num_dropped = max(self.num_dropped, end)
+        return dropped_positions
+
+    def apply_to_reads(self, reads: list) -> list:
+        """
+        Moves the anchor boundary and takes the extension off the cs_avail of the remaining reads (the reads the instance was built with).
+
+        Returns
+        -------
+        list
+            The remaining reads, in their original order
+        """
+        is_dropped = np.zeros(len(reads), dtype=bool)
+        is_dropped[self.read_order[:self.num_dropped]] = True
+        remaining_reads = []
+        for read, cs_avail_idx, read_is_dropped in zip(reads, self.cs_avail_idxs, is_dropped.tolist()):
+            if read_is_dropped:
+                continue
+            if self.extend_left:
+                read[ANCHOR_START] -= self.offset
+            else:
+                read[ANCHOR_END] += self.offset
+            read[cs_avail_idx] -= self.offset
+            remaining_reads.append(read)
+        return remaining_reads
@@ -0,0 +1,77 @@
+import json
+
+
+class ReadDropLog:
+    """
+    This class records the reads dropped from the anchors during the extension as a columnar event log: one (snarl_id, anchor_idx, iteration, read_id, reason) event per dropped read, in the order of the drops.
+    The anchor of an event is also stored as its string form at the time of the drop (its nodes change during the extension), interned in anchor_labels so that it is computed once per anchor and extension step and not once per dropped read.
+
+    to_tracking_dict gives the {snarl_id: {anchor: {iteration: [read_id, ...]}}} form written to the anchor reads tracker.
+    """
+
+    def __init__(self) -> None:
+        self.snarl_ids: list = []
+        self.anchor_idxs: list = []
+        self.anchor_label_idxs: list = []
+        self.iterations: list = []
+        self.read_ids: list = []
+        self.reasons: list = []
+        self.anchor_labels: list = []
+        self.anchor_label_positions: dict = {}   # {anchor label: position in anchor_labels}
+
+    def __len__(self) -> int:
+        return len(self.read_ids)
+
+    def add(self, snarl_id, anchor_idx: int, anchor_label: str, iteration: int, read_ids: list, reason: str) -> None:
+        """
+        Records the reads dropped from an anchor at once.
+        """
+        anchor_label_idx = self.anchor_label_positions.get(anchor_label)
+        if anchor_label_idx is None:
+            anchor_label_idx = self.anchor_label_positions[anchor_label] = len(self.anchor_labels)
+            self.anchor_labels.append(anchor_label)
+        for read_id in read_ids:
+            self.snarl_ids.append(snarl_id)
+            self.anchor_idxs.append(anchor_idx)
+            self.anchor_label_idxs.append(anchor_label_idx)
+            self.iterations.append(iteration)
+            self.read_ids.append(read_id)
+            self.reasons.append(reason)
+
+    def events(self, start: int = 0):
+        """
+        Iterates over the events from the start-th one, as (snarl_id, anchor_idx, anchor_label, iteration, read_id, reason).
+        """
+        for event_idx in range(start, len(self.read_ids)):
+            yield (
+                self.snarl_ids[event_idx],
+                self.anchor_idxs[event_idx],
+                self.anchor_labels[self.anchor_label_idxs[event_idx]],
+                self.iterations[event_idx],
+                self.read_ids[event_idx],
+                self.reasons[event_idx],
+            )
+
+    def extend(self, events) -> None:
+        """
+        Appends events given as by events(), e.g. the ones recorded by a worker process.
+        """
+        for snarl_id, anchor_idx, anchor_label, iteration, read_id, reason in events:
+            self.add(snarl_id, anchor_idx, anchor_label, iteration, [read_id], reason)
+
+    def to_tracking_dict(self) -> dict:
+        tracking_dict = {}
+        for snarl_id, _, anchor_label, iteration, read_id, _ in self.events():
+            tracking_dict.setdefault(snarl_id, {}).setdefault(anchor_label, {}).setdefault(iteration, []).append(read_id)
+        return tracking_dict
+
+    def dump_jsonl(self, out_file_path: str) -> None:
+        """
+        Writes one event per line.
+        """
+        with open(out_file_path, "w", encoding="utf-8") as out_f:
+            for snarl_id, anchor_idx, anchor_label, iteration, read_id, reason in self.events():
+                print(
+                    json.dumps({"snarl_id": snarl_id, "anchor_idx": anchor_idx, "anchor": anchor_label, "iteration": iteration, "read_id": read_id, "reason": reason}, ensure_ascii=False),
+                    file=out_f,
+                )
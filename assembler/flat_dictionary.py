@@ -0,0 +1,223 @@
+import json
+import pickle
+from collections.abc import Mapping
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from assembler.anchor import Anchor, assign_anchor_ids
+from assembler.node import Node
+
+# integer attributes of the anchors stored as one array each
+ANCHOR_INT_FIELDS = ("anchor_id", "snarl_id", "genomic_position", "basepairlength", "sentinel_length", "num_sequences", "bp_occupied_start_node", "bp_occupied_end_node")
+# bytes before the JSON header, holding its length
+HEADER_LENGTH_BYTES = 8
+ARRAY_ALIGNMENT = 8
+
+
+class FlatAnchorDictionary(Mapping):
+    """
+    This class stores a sentinel_to_anchor dictionary as flat NumPy arrays (node ids, lengths and orientations of all the anchors, one array per anchor attribute, offsets of the anchors of each sentinel...) plus a table of the reference path names.
+    The arrays can be placed in a single multiprocessing.shared_memory segment, so that several get_anchors processes running on the same machine attach to one copy of the dictionary instead of unpickling their own.
+
+    The object behaves as the read-only sentinel_to_anchor dictionary: the Anchor objects of a sentinel are built from the arrays the first time the sentinel is accessed and kept, so that the reads added to them by the aligner are not lost. Only the sentinels hit by the alignments are materialized in each process.
+    Sentinels are iterated in the order of the original dictionary.
+    """
+
+    def __init__(self, arrays: dict, strings: list, shared_memory_segment: shared_memory.SharedMemory = None) -> None:
+        self.arrays = arrays
+        self.strings = strings
+        self.shared_memory = shared_memory_segment
+        self.materialized: dict = {}
+
+    @classmethod
+    def from_dictionary(cls, sentinel_to_anchor: dict):
+        """
+        Flattens a sentinel_to_anchor dictionary built by AnchorDictionary.
+        The anchors without an anchor_id (dictionaries pickled before the ids existed) are given one by assign_anchor_ids, after the largest id of the dictionary, as when the pickle is loaded by AlignAnchor.build.
+        """
+        assign_anchor_ids(sentinel_to_anchor)
+        string_ids = {}
+
+        def string_id(string):
+            return string_ids.setdefault(string, len(string_ids))
+
+        sentinel_ids, sentinel_anchor_starts = [], [0]
+        node_ids, node_lengths, node_orientations, anchor_node_starts = [], [], [], [0]
+        int_fields = {field: [] for field in ANCHOR_INT_FIELDS}
+        chromosomes = []
+        reference_paths, reference_path_starts = [], [0]
+        position_paths, position_values, position_starts = [], [], [0]
+
+        for sentinel, anchors in sentinel_to_anchor.items():
+            sentinel_ids.append(sentinel)
+            for anchor in anchors:
+                for node in anchor:
+                    node_ids.append(node.id)
+                    node_lengths.append(node.length)
+                    node_orientations.append(node.orientation)
+                anchor_node_starts.append(len(node_ids))
+                for field in ANCHOR_INT_FIELDS:
+                    int_fields[field].append(getattr(anchor, field))
+                chromosomes.append(string_id(anchor.chromosome))
+                reference_paths.extend(string_id(path_name) for path_name in anchor.reference_paths_covered)
+                reference_path_starts.append(len(reference_paths))
+                for path_name, position in getattr(anchor, "reference_positions", {}).items():
+                    position_paths.append(string_id(path_name))
+                    position_values.append(position)
+                position_starts.append(len(position_paths))
+            sentinel_anchor_starts.append(len(chromosomes))
+
+        sentinel_ids = np.array(sentinel_ids, dtype=np.int64)
+        sorted_sentinel_rows = np.argsort(sentinel_ids, kind="stable")
+        arrays = {
+            "sentinel_ids": sentinel_ids,
+            "sorted_sentinel_ids": sentinel_ids[sorted_sentinel_rows],
+            "sorted_sentinel_rows": sorted_sentinel_rows.astype(np.int64),
+            "sentinel_anchor_starts": np.array(sentinel_anchor_starts, dtype=np.int64),
+            "anchor_node_starts": np.array(anchor_node_starts, dtype=np.int64),
+            "node_ids": np.array(node_ids, dtype=np.int64),
+            "node_lengths": np.array(node_lengths, dtype=np.int64),
+            "node_orientations": np.array(node_orientations, dtype=np.uint8),
+            "chromosomes": np.array(chromosomes, dtype=np.int32),
+            "reference_paths": np.array(reference_paths, dtype=np.int32),
+            "reference_path_starts": np.array(reference_path_starts, dtype=np.int64),
+            "position_paths": np.array(position_paths, dtype=np.int32),
+            "position_values": np.array(position_values, dtype=np.int64),
+            "position_starts": np.array(position_starts, dtype=np.int64),
+        }
+        for field in ANCHOR_INT_FIELDS:
+            arrays[field] = np.array(int_fields[field], dtype=np.int64)
+        strings = [None] * len(string_ids)
+        for string, idx in string_ids.items():
+            strings[idx] = string
+        return cls(arrays, strings)
+
+    @classmethod
+    def from_pickle(cls, dictionary_path: str):
+        with open(dictionary_path, "rb") as in_f:
+            sentinel_to_anchor = pickle.load(in_f)
+        return cls.from_dictionary(sentinel_to_anchor)
+
+    def to_shared_memory(self, name: str) -> shared_memory.SharedMemory:
+        """
+        Copies the arrays in a new shared memory segment.
+        The segment starts with the length of a JSON header (string table and dtype, offset and length of each array), followed by the header and the arrays.
+        The caller owns the segment and has to close() and unlink() it.
+
+        Parameters
+        ----------
+        name : string
+            Name of the segment, the one given to get_anchors --shared-dict
+
+        Returns
+        -------
+        segment : SharedMemory
+        """
+        layout = {}
+        offset = 0
+        for array_name, array in self.arrays.items():
+            layout[array_name] = [array.dtype.str, offset, len(array)]
+            offset += -(-array.nbytes // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+        header = json.dumps({"strings": self.strings, "arrays": layout}).encode()
+        data_start = -(-(HEADER_LENGTH_BYTES + len(header)) // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+        segment = shared_memory.SharedMemory(name=name, create=True, size=max(1, data_start + offset))
+        segment.buf[:HEADER_LENGTH_BYTES] = len(header).to_bytes(HEADER_LENGTH_BYTES, "little")
+        segment.buf[HEADER_LENGTH_BYTES:HEADER_LENGTH_BYTES + len(header)] = header
+        for array_name, (dtype, array_offset, length) in layout.items():
+            shared_array = np.ndarray(length, dtype=dtype, buffer=segment.buf, offset=data_start + array_offset)
+            shared_array[:] = self.arrays[array_name]
+            del shared_array
+        return segment
+
+    @classmethod
+    def attach(cls, name: str):
+        """
+        Attaches to a segment created by to_shared_memory (vg_anchor share-dict). The arrays are read-only views of the segment, nothing is copied.
+        The segment is not registered with the resource tracker of this process, so that it is not unlinked when the process exits.
+        """
+        try:
+            segment = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 registers every attached segment
+            segment = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(segment._name, "shared_memory")
+
+        header_length = int.from_bytes(bytes(segment.buf[:HEADER_LENGTH_BYTES]), "little")
+        header = json.loads(bytes(segment.buf[HEADER_LENGTH_BYTES:HEADER_LENGTH_BYTES + header_length]))
+        data_start = -(-(HEADER_LENGTH_BYTES + header_length) // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+        arrays = {}
+        for array_name, (dtype, array_offset, length) in header["arrays"].items():
+            arrays[array_name] = np.ndarray(length, dtype=dtype, buffer=segment.buf, offset=data_start + array_offset)
+            arrays[array_name].flags.writeable = False
+        return cls(arrays, header["strings"], segment)
+
+    def close(self) -> None:
+        """
+        Detaches from the shared memory segment. The materialized anchors are kept.
+        """
+        self.arrays = {}
+        if self.shared_memory is not None:
+            self.shared_memory.close()
+            self.shared_memory = None
+
+    def _sentinel_row(self, sentinel: int) -> int:
+        sorted_sentinel_ids = self.arrays["sorted_sentinel_ids"]
+        idx = int(np.searchsorted(sorted_sentinel_ids, sentinel))
+        if idx == len(sorted_sentinel_ids) or sorted_sentinel_ids[idx] != sentinel:
+            return -1
+        return int(self.arrays["sorted_sentinel_rows"][idx])
+
+    def _build_anchor(self, anchor_idx: int) -> Anchor:
+        arrays = self.arrays
+        anchor = Anchor()
+        node_start, node_end = arrays["anchor_node_starts"][anchor_idx:anchor_idx + 2]
+        for node_id, node_length, node_orientation in zip(
+            arrays["node_ids"][node_start:node_end].tolist(),
+            arrays["node_lengths"][node_start:node_end].tolist(),
+            arrays["node_orientations"][node_start:node_end].tolist(),
+        ):
+            anchor.add(Node(node_id, node_length, bool(node_orientation)))
+        for field in ANCHOR_INT_FIELDS:
+            setattr(anchor, field, int(arrays[field][anchor_idx]))
+        anchor.chromosome = self.strings[arrays["chromosomes"][anchor_idx]]
+        path_start, path_end = arrays["reference_path_starts"][anchor_idx:anchor_idx + 2]
+        anchor.reference_paths_covered = [self.strings[path_id] for path_id in arrays["reference_paths"][path_start:path_end].tolist()]
+        position_start, position_end = arrays["position_starts"][anchor_idx:anchor_idx + 2]
+        anchor.reference_positions = {
+            self.strings[path_id]: position
+            for path_id, position in zip(arrays["position_paths"][position_start:position_end].tolist(), arrays["position_values"][position_start:position_end].tolist())
+        }
+        if len(anchor):
+            anchor.compute_snarl_boundary()
+        return anchor
+
+    def __getitem__(self, sentinel: int) -> list:
+        anchors = self.materialized.get(sentinel)
+        if anchors is None:
+            row = self._sentinel_row(sentinel)
+            if row < 0:
+                raise KeyError(sentinel)
+            anchor_start, anchor_end = self.arrays["sentinel_anchor_starts"][row:row + 2]
+            anchors = [self._build_anchor(anchor_idx) for anchor_idx in range(anchor_start, anchor_end)]
+            self.materialized[sentinel] = anchors
+        return anchors
+
+    def __contains__(self, sentinel) -> bool:
+        return sentinel in self.materialized or self._sentinel_row(sentinel) >= 0
+
+    def __iter__(self):
+        return iter(self.arrays["sentinel_ids"].tolist())
+
+    def __len__(self) -> int:
+        return len(self.arrays["sentinel_ids"])
+
+    def num_anchors(self, sentinel: int) -> int:
+        """
+        Returns the number of anchors of a sentinel without materializing them.
+        """
+        row = self._sentinel_row(sentinel)
+        if row < 0:
+            raise KeyError(sentinel)
+        return int(self.arrays["sentinel_anchor_starts"][row + 1] - self.arrays["sentinel_anchor_starts"][row])
@@ -0,0 +1,108 @@
+import gzip
+import re
+from array import array
+
+
+WALK_STEP_PATTERN = re.compile(rb"([<>])([^<>\s]+)")
+
+
+def walk_path_name(sample: bytes, haplotype: bytes, sequence_id: bytes, start: bytes, end: bytes) -> str:
+    """
+    Returns the name given to a W line when the GFA is converted by vg, sample#haplotype#sequence_id, with the [start-end] subrange appended when the walk does not start at 0.
+    """
+    path_name = f"{sample.decode()}#{haplotype.decode()}#{sequence_id.decode()}"
+    if start not in (b"0", b"*"):
+        path_name += f"[{start.decode()}-{end.decode()}]"
+    return path_name
+
+
+class GfaReader:
+    """
+    This class streams a GFA file (plain or gzipped) and gives access to its paths without building the graph in memory.
+    A first pass (index) records the length of each segment and the byte offset of each P and W line, so that each path can then be read on its own by seeking to its line.
+    Segment names have to be the integer node ids used by the distance index, as in the GFA used to build the .vg/.dist.
+    Paths are returned as two lists, the node ids and the orientations (True for forward), in the same order they are visited by for_each_step_in_path.
+    """
+
+    def __init__(self, gfa_path: str):
+        self.gfa_path = gfa_path
+        self.path_offsets: dict = {}
+        self.node_lengths = array("I")
+        # kept open between read_path calls, so that a gzipped file is not decompressed again from the start for each path read in file order
+        self.path_file = None
+
+    def open(self):
+        if self.gfa_path.endswith(".gz"):
+            return gzip.open(self.gfa_path, "rb")
+        return open(self.gfa_path, "rb")
+
+    def index(self) -> None:
+        """
+        Reads the whole file once, storing the segment lengths and the offset of the path lines.
+        """
+        offset = 0
+        with self.open() as in_f:
+            for line in in_f:
+                record_type = line[:1]
+                if record_type == b"S":
+                    fields = line.rstrip(b"\n").split(b"\t")
+                    try:
+                        node_id = int(fields[1])
+                    except ValueError:
+                        raise ValueError(f"GFA segment name {fields[1].decode()} is not an integer node id")
+                    node_length = len(fields[2])
+                    if fields[2] == b"*":
+                        node_length = next(int(tag[5:]) for tag in fields[3:] if tag.startswith(b"LN:i:"))
+                    if node_id >= len(self.node_lengths):
+                        self.node_lengths.extend([0] * (node_id + 1 - len(self.node_lengths)))
+                    self.node_lengths[node_id] = node_length
+                elif record_type == b"P":
+                    path_name = line.split(b"\t", 2)[1].decode()
+                    self.path_offsets[path_name] = offset
+                elif record_type == b"W":
+                    fields = line.split(b"\t", 6)
+                    self.path_offsets[walk_path_name(*fields[1:6])] = offset
+                offset += len(line)
+
+    def close(self) -> None:
+        if self.path_file is not None:
+            self.path_file.close()
+            self.path_file = None
+
+    def get_path_names(self) -> list:
+        return list(self.path_offsets)
+
+    def has_path(self, path_name: str) -> bool:
+        return path_name in self.path_offsets
+
+    def get_node_length(self, node_id: int) -> int:
+        return self.node_lengths[node_id]
+
+    def read_path(self, path_name: str) -> tuple:
+        """
+        Reads the P or W line of a path and tokenizes its steps.
+
+        Parameters
+        ----------
+        path_name : string
+            Name of the path as returned by get_path_names
+
+        Returns
+        -------
+        path : tuple
+            The list of node ids and the list of node orientations (True if forward) of the path
+        """
+        if self.path_file is None:
+            self.path_file = self.open()
+        self.path_file.seek(self.path_offsets[path_name])
+        line = self.path_file.readline().rstrip(b"\n")
+
+        if line[:1] == b"P":
+            steps = line.split(b"\t", 3)[2].split(b",")
+            node_ids = [int(step[:-1]) for step in steps]
+            orientations = [step[-1:] == b"+" for step in steps]
+        else:
+            steps = WALK_STEP_PATTERN.findall(line.split(b"\t", 7)[6])
+            node_ids = [int(node_id) for _, node_id in steps]
+            orientations = [orientation == b">" for orientation, _ in steps]
+        return node_ids, orientations
@@ -10,11 +10,12 @@ import os
 class Orchestrator:
 
     def __init__(
-        self, dictionary_path: str, graph_path: str, gaf_path: str, fasta_path: str
+        self, dictionary_path: str, graph_path: str, gaf_path: str, fasta_path: str, shared_dictionary_name: str = None, threads: int = 1, linkage_mode: str = "reads", snarl_pairs_path: str = None, read_drops_path: str = None, checkpoint_path: str = None
     ):
         """
         It initiailzes the AlignAnchor object with the packedgraph path and the dictionary generated by the assembler.builder.AnchorDictionrary object.
         It initializes the GafReader object that reads the gaf file.
+        When resuming from a checkpoint, the state of the AlignAnchor after the alignment matching is loaded from it instead, and only the dump methods are to be called.
 
         Parameters
         ----------
@@ -26,10 +27,30 @@ class Orchestrator:
             The filepath of the gaf alignment file
         fasta_path: string
             The filepath of the reads fasta file
+        shared_dictionary_name: string
+            Name of the shared memory dictionary (vg_anchor share-dict) to attach to instead of loading dictionary_path
+        threads: int
+            Number of processes used by the parallel steps of the anchor post-processing
+        linkage_mode: string
+            How the snarls linked by common reads are found: "reads" (read index) or "window" (snarls within a read length on the reference)
+        snarl_pairs_path: string
+            Where to store the read partition summaries of the snarl pairs (compatibility_cache.SnarlPairCache), not stored if None
+        read_drops_path: string
+            Where to write the reads dropped by the anchor extension, one event per line (drop_log.ReadDropLog), not written if None
+        checkpoint_path: string
+            Checkpoint written by dump_checkpoint to resume from, the dictionary and the gaf are then not read
         """
         self.alignment_processor = AlignAnchor()
-        self.alignment_processor.build(dictionary_path, graph_path)
-        self.gaf_reader = GafReader(gaf_path)
+        self.alignment_processor.threads = threads
+        self.alignment_processor.linkage_mode = linkage_mode
+        self.alignment_processor.snarl_pairs_out_file_path = snarl_pairs_path
+        self.alignment_processor.read_drops_out_file_path = read_drops_path
+        if checkpoint_path is not None:
+            self.alignment_processor.load_checkpoint(checkpoint_path, graph_path)
+            self.gaf_reader = None
+        else:
+            self.alignment_processor.build(dictionary_path, graph_path, shared_dictionary_name)
+            self.gaf_reader = GafReader(gaf_path)
         self.alignment_processor.readFasta(fasta_path)
 
     def process(self, debug_outfile):
@@ -67,6 +88,12 @@ class Orchestrator:
         if (self.alignment_processor.reads_matching_anchor_path != 0): 
             print(f"Ratio = {(self.alignment_processor.reads_matching_anchor_sequence/self.alignment_processor.reads_matching_anchor_path):.2f}")
 
+    def dump_checkpoint(self, out_file: str):
+        """
+        It stores the state of the alignment matching, to resume from with checkpoint_path
+        """
+        self.alignment_processor.dump_checkpoint(out_file)
+
     def dump_anchors(self, out_file: str, extended_out_file: str, anchor_read_tracking_file_path: str, independent_anchor_read_tracking_file_path: str, extended_pruned_out_file: str, reliable_snarls_out_file_path: str, snarl_variant_type_out_file_path: str, snarl_compatibility_out_file_path: str, snarl_common_reads_out_file_path: str, snarl_read_partitions_out_file_path: str, snarl_coverage_out_file_path: str, snarl_allelic_coverage_out_file_path: str, snarl_coverage_extended_out_file_path: str, snarl_allelic_coverage_extended_out_file_path: str):
         """
         It dumps the anchors by json
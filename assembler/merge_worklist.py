@@ -0,0 +1,55 @@
+import heapq
+from itertools import count
+
+
+class SnarlAdjacency:
+    """
+    This class describes two consecutive snarls of the snarl order for merge_anchors: the node they share (the end node of the left snarl, if it is the start node of the right snarl), the degree of that node on its left and right side, whether the basepairs occupied in it by the two snarls add up to its length and the number of reads the two snarls have in common.
+    """
+
+    __slots__ = ("shared_node_id", "left_degree", "right_degree", "bp_occupied_fits", "common_reads")
+
+    def __init__(self, shared_node_id=None, left_degree: int = 0, right_degree: int = 0, bp_occupied_fits: bool = False, common_reads: int = 0) -> None:
+        self.shared_node_id = shared_node_id
+        self.left_degree = left_degree
+        self.right_degree = right_degree
+        self.bp_occupied_fits = bp_occupied_fits
+        self.common_reads = common_reads
+
+    def can_merge(self, extend_left: bool) -> bool:
+        """
+        Whether the right snarl can be merged with the left one (extend_left) or the left snarl with the right one: the two snarls meet on a node of degree 2 on the side of the merge, which they occupy fully.
+        """
+        degree = self.left_degree if extend_left else self.right_degree
+        return self.shared_node_id is not None and degree == 2 and self.bp_occupied_fits
+
+
+class MergeWorklist:
+    """
+    This class orders the merge candidates of merge_anchors, (current snarl, other snarl, extend_left), by the number of reads of the current snarl lost by the merge, lowest first, and in the order they were added for equal drops.
+    The candidates are not removed when one of their snarls is merged: pop() skips the ones whose snarls are no longer next to each other in the snarl order (lazy invalidation). A merge gives a new snarl id, so a candidate still valid when popped was computed on the current anchors of both snarls.
+    """
+
+    def __init__(self, snarl_order) -> None:
+        self.snarl_order = snarl_order
+        self._heap: list = []   # [(read_drop, insertion number, current_snarl_id, other_snarl_id, extend_left)]
+        self._insertion_counter = count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, read_drop: int, current_snarl_id, other_snarl_id, extend_left: bool) -> None:
+        heapq.heappush(self._heap, (read_drop, next(self._insertion_counter), current_snarl_id, other_snarl_id, extend_left))
+
+    def pop(self):
+        """
+        Returns the next valid candidate as (current_snarl_id, other_snarl_id, extend_left), None when there are none left.
+        """
+        while self._heap:
+            _, _, current_snarl_id, other_snarl_id, extend_left = heapq.heappop(self._heap)
+            if current_snarl_id not in self.snarl_order or other_snarl_id not in self.snarl_order:
+                continue
+            neighbor_snarl_id = self.snarl_order.prev(current_snarl_id) if extend_left else self.snarl_order.next(current_snarl_id)
+            if neighbor_snarl_id == other_snarl_id:
+                return (current_snarl_id, other_snarl_id, extend_left)
+        return None
@@ -0,0 +1,57 @@
+from multiprocessing import get_context
+
+# object whose method is called by the forked workers of map_on_fork, inherited from the parent process
+_FORK_STATE = None
+
+
+def _call_fork_state_method(method_args: tuple):
+    method_name, chunk = method_args
+    return getattr(_FORK_STATE, method_name)(chunk)
+
+
+def split_in_chunks(items: list, num_chunks: int) -> list:
+    """
+    Splits a list in at most num_chunks contiguous chunks of (almost) the same size.
+    """
+    num_chunks = max(1, min(num_chunks, len(items)))
+    chunk_size, remainder = divmod(len(items), num_chunks)
+    chunks, start = [], 0
+    for chunk_idx in range(num_chunks):
+        end = start + chunk_size + (1 if chunk_idx < remainder else 0)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+def map_on_fork(state, method_name: str, chunks: list, threads: int = 1) -> list:
+    """
+    Calls state.method_name(chunk) for each chunk and returns the results in chunk order.
+    With more than one thread the calls run in a pool of forked processes, which inherit state from the parent instead of receiving it pickled, so that large objects (e.g. an AlignAnchor with its read index) are shared copy-on-write. Changes made to state by the workers are lost, only the returned values reach the parent.
+    With one thread the calls run in the current process.
+
+    Parameters
+    ----------
+    state : object
+        The object whose method is called
+    method_name : string
+        Name of the method, taking a chunk and returning a picklable value
+    chunks : list
+        The arguments of the calls
+    threads : int
+        Number of worker processes
+
+    Returns
+    -------
+    results : list
+        The value returned for each chunk
+    """
+    global _FORK_STATE
+    if threads <= 1 or len(chunks) <= 1:
+        return [getattr(state, method_name)(chunk) for chunk in chunks]
+
+    _FORK_STATE = state
+    try:
+        with get_context("fork").Pool(processes=min(threads, len(chunks))) as pool:
+            return pool.map(_call_fork_state_method, [(method_name, chunk) for chunk in chunks], chunksize=1)
+    finally:
+        _FORK_STATE = None
@@ -0,0 +1,89 @@
+class ReadInterner:
+    """
+    This class assigns consecutive integer ids to read names, in the order they are first seen, so that sets of reads can be stored as bitsets.
+    """
+
+    def __init__(self) -> None:
+        self.read_ids: dict = {}
+        self.read_names: list = []
+
+    def intern(self, read_name: str) -> int:
+        read_id = self.read_ids.get(read_name)
+        if read_id is None:
+            read_id = len(self.read_names)
+            self.read_ids[read_name] = read_id
+            self.read_names.append(read_name)
+        return read_id
+
+    def names(self, read_bitset) -> list:
+        """
+        Returns the names of the reads of a bitset, in id order.
+        """
+        return [self.read_names[read_id] for read_id in read_bitset.ids()]
+
+
+class ReadBitset:
+    """
+    This class stores a set of interned read ids as a Python integer whose bit i is set if the read offset + i is in the set.
+    The offset is the smallest id of the set, so that the integer only spans the ids between the smallest and the largest read of the set. As the reads are interned walking the snarls in order, the reads of an anchor have close ids and its bitset stays small.
+    Intersections are an AND of the integers, after aligning their offsets, and the size of a set is the popcount of its integer.
+    """
+
+    __slots__ = ("offset", "bits")
+
+    def __init__(self, offset: int = 0, bits: int = 0) -> None:
+        self.offset = offset
+        self.bits = bits
+
+    @classmethod
+    def from_ids(cls, read_ids):
+        read_ids = list(read_ids)
+        if not read_ids:
+            return cls()
+        offset = min(read_ids)
+        bit_bytes = bytearray((max(read_ids) - offset) // 8 + 1)
+        for read_id in read_ids:
+            bit_bytes[(read_id - offset) >> 3] |= 1 << ((read_id - offset) & 7)
+        return cls(offset, int.from_bytes(bit_bytes, "little"))
+
+    def __and__(self, other):
+        if self.offset <= other.offset:
+            return ReadBitset(other.offset, (self.bits >> (other.offset - self.offset)) & other.bits)
+        return ReadBitset(self.offset, self.bits & (other.bits >> (self.offset - other.offset)))
+
+    def __or__(self, other):
+        if not self.bits:
+            return other
+        if not other.bits:
+            return self
+        offset = min(self.offset, other.offset)
+        return ReadBitset(offset, (self.bits << (self.offset - offset)) | (other.bits << (other.offset - offset)))
+
+    def __len__(self) -> int:
+        return bin(self.bits).count("1")
+
+    def __bool__(self) -> bool:
+        return self.bits != 0
+
+    def issubset(self, other) -> bool:
+        return len(self & other) == len(self)
+
+    def ids(self) -> list:
+        """
+        Returns the read ids of the set, in increasing order.
+        """
+        # lowest bit first
+        bit_string = bin(self.bits)[:1:-1]
+        read_ids = []
+        position = bit_string.find("1")
+        while position >= 0:
+            read_ids.append(self.offset + position)
+            position = bit_string.find("1", position + 1)
+        return read_ids
+
+    @classmethod
+    def union(cls, read_bitsets):
+        union_bitset = cls()
+        for read_bitset in read_bitsets:
+            union_bitset = union_bitset | read_bitset
+        return union_bitset
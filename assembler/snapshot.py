@@ -0,0 +1,58 @@
+from assembler.anchor import Anchor
+from assembler.node import Node
+
+# attributes of the anchors changed by the extension and stored explicitly in AnchorSnapshot, the others are shared with the live anchor
+SNAPSHOT_ANCHOR_FIELDS = ("_nodes", "bp_occupied_start_node", "bp_occupied_end_node", "basepairlength", "bp_matched_reads", "snarl_start_node", "snarl_end_node", "_repr")
+
+
+class AnchorSnapshot:
+    """
+    This class stores the state of an anchor before the extension: its nodes as (id, length, orientation) tuples, the basepairs occupied in its boundary nodes, its basepair length and its reads as tuples.
+    The extension changes the nodes and the boundaries of the anchors and the fields of their reads in place, so these are copied as immutable tuples. The attributes the extension does not change (chromosome, reference paths...) are shared with the live anchor.
+    """
+
+    __slots__ = ("nodes", "bp_occupied_start_node", "bp_occupied_end_node", "basepairlength", "bp_matched_reads", "attributes")
+
+    def __init__(self, anchor: Anchor) -> None:
+        self.nodes = tuple((node.id, node.length, node.orientation) for node in anchor)
+        self.bp_occupied_start_node = anchor.bp_occupied_start_node
+        self.bp_occupied_end_node = anchor.bp_occupied_end_node
+        # as Anchor.compute_bp_length, without updating the live anchor
+        self.basepairlength = self.bp_occupied_start_node + self.bp_occupied_end_node + sum(length for _, length, _ in self.nodes[1:-1])
+        self.bp_matched_reads = tuple(tuple(read) for read in anchor.bp_matched_reads)
+        self.attributes = {name: value for name, value in anchor.__dict__.items() if name not in SNAPSHOT_ANCHOR_FIELDS}
+
+    def __repr__(self) -> str:
+        return "".join((">" if orientation else "<") + str(node_id) for node_id, _, orientation in self.nodes)
+
+    def to_anchor(self) -> Anchor:
+        """
+        Builds a new Anchor in the state of the snapshot, with new Node objects and reads.
+        """
+        anchor = Anchor()
+        anchor.__dict__.update(self.attributes)
+        for node_id, length, orientation in self.nodes:
+            anchor.add(Node(node_id, length, orientation))
+        anchor.bp_occupied_start_node = self.bp_occupied_start_node
+        anchor.bp_occupied_end_node = self.bp_occupied_end_node
+        anchor.basepairlength = self.basepairlength
+        anchor.bp_matched_reads = [list(read) for read in self.bp_matched_reads]
+        if len(anchor):
+            anchor.compute_snarl_boundary()
+        return anchor
+
+
+class SnarlSnapshot:
+    """
+    This class stores the state of the anchors of a snarl before the extension, and the left and right boundaries of the snarl as (node_id, bp_occupied).
+    """
+
+    __slots__ = ("anchors", "left_boundary", "right_boundary")
+
+    def __init__(self, anchors: tuple, left_boundary: tuple, right_boundary: tuple) -> None:
+        self.anchors = anchors
+        self.left_boundary = left_boundary
+        self.right_boundary = right_boundary
+
+    def min_basepairlength(self) -> int:
+        return min(anchor.basepairlength for anchor in self.anchors)
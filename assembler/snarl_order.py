@@ -0,0 +1,111 @@
+class OrderedSnarlList:
+    """
+    This class keeps the snarl ids in their order along the graph as a doubly linked list stored in two dictionaries (previous and next snarl of each snarl), for the extension, merging and pruning passes which replace, merge and remove snarls while walking them.
+    Finding the neighbors of a snarl, inserting a snarl before another one, replacing and removing a snarl take O(1), where a list needs O(n) for index(), insert() and remove().
+
+    The snarls are walked either with a cursor (first(), next(snarl_id)) or by iterating the object. Iterating is stable when the list is changed during the iteration: a removed snarl keeps its link to the snarl that followed it, so the iteration goes on from there, and the snarls inserted after the current one are reached.
+    """
+
+    def __init__(self, snarl_ids=()) -> None:
+        self._prev: dict = {}   # {snarl_id: previous snarl_id or None}, only for the snarls in the list
+        self._next: dict = {}   # {snarl_id: next snarl_id or None}, kept for the removed snarls
+        self._first = None
+        self._last = None
+        for snarl_id in snarl_ids:
+            self.append(snarl_id)
+
+    def __len__(self) -> int:
+        return len(self._prev)
+
+    def __contains__(self, snarl_id) -> bool:
+        return snarl_id in self._prev
+
+    def __iter__(self):
+        snarl_id = self._first
+        while snarl_id is not None:
+            if snarl_id in self._prev:
+                yield snarl_id
+            snarl_id = self._next[snarl_id]
+
+    def __repr__(self) -> str:
+        return f"OrderedSnarlList({list(self)!r})"
+
+    def first(self):
+        return self._first
+
+    def last(self):
+        return self._last
+
+    def next(self, snarl_id):
+        """
+        Returns the snarl after snarl_id, None for the last one. For a removed snarl, the first snarl still in the list after the one that followed it.
+        """
+        next_snarl_id = self._next[snarl_id]
+        while next_snarl_id is not None and next_snarl_id not in self._prev:
+            next_snarl_id = self._next[next_snarl_id]
+        return next_snarl_id
+
+    def prev(self, snarl_id):
+        """
+        Returns the snarl before snarl_id, None for the first one.
+        """
+        return self._prev[snarl_id]
+
+    def neighborhood(self, snarl_id, before: int, after: int) -> list:
+        """
+        Returns up to before snarls before snarl_id, snarl_id and up to after - 1 snarls after it, in order.
+        """
+        snarl_ids = [snarl_id]
+        prev_snarl_id = self._prev[snarl_id]
+        while prev_snarl_id is not None and len(snarl_ids) <= before:
+            snarl_ids.insert(0, prev_snarl_id)
+            prev_snarl_id = self._prev[prev_snarl_id]
+        next_snarl_id = self.next(snarl_id)
+        for _ in range(after - 1):
+            if next_snarl_id is None:
+                break
+            snarl_ids.append(next_snarl_id)
+            next_snarl_id = self.next(next_snarl_id)
+        return snarl_ids
+
+    def append(self, snarl_id) -> None:
+        if snarl_id in self._prev:
+            raise ValueError(f"Snarl {snarl_id} is already in the list")
+        self._prev[snarl_id] = self._last
+        self._next[snarl_id] = None
+        if self._last is None:
+            self._first = snarl_id
+        else:
+            self._next[self._last] = snarl_id
+        self._last = snarl_id
+
+    def insert_before(self, snarl_id, new_snarl_id) -> None:
+        if new_snarl_id in self._prev:
+            raise ValueError(f"Snarl {new_snarl_id} is already in the list")
+        prev_snarl_id = self._prev[snarl_id]
+        self._prev[new_snarl_id] = prev_snarl_id
+        self._next[new_snarl_id] = snarl_id
+        self._prev[snarl_id] = new_snarl_id
+        if prev_snarl_id is None:
+            self._first = new_snarl_id
+        else:
+            self._next[prev_snarl_id] = new_snarl_id
+
+    def remove(self, snarl_id) -> None:
+        prev_snarl_id = self._prev.pop(snarl_id)
+        next_snarl_id = self._next[snarl_id]
+        if prev_snarl_id is None:
+            self._first = next_snarl_id
+        else:
+            self._next[prev_snarl_id] = next_snarl_id
+        if next_snarl_id is None:
+            self._last = prev_snarl_id
+        else:
+            self._prev[next_snarl_id] = prev_snarl_id
+
+    def replace(self, snarl_id, new_snarl_id) -> None:
+        """
+        Puts new_snarl_id in the place of snarl_id.
+        """
+        self.insert_before(snarl_id, new_snarl_id)
+        self.remove(snarl_id)
@@ -0,0 +1,143 @@
+import json
+import pickle
+import time
+from collections import Counter
+from sys import getsizeof, stderr
+
+import numpy as np
+
+# anchors sampled per dictionary to estimate the memory taken by each component
+MEMORY_SAMPLE_SIZE = 10000
+# upper bounds of the basepair length histogram bins
+BP_LENGTH_BINS = [0, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384]
+
+
+def iter_dictionaries(dictionary_path: str):
+    """
+    Yields the sentinel_to_anchor dictionaries stored at dictionary_path, one for a dictionary (.pkl) or one per shard, loaded one at a time, for a manifest (.json).
+    """
+    if dictionary_path.endswith(".json"):
+        with open(dictionary_path) as in_f:
+            shard_paths = [shard["dictionary"] for shard in json.load(in_f)["shards"]]
+    else:
+        shard_paths = [dictionary_path]
+
+    for shard_path in shard_paths:
+        with open(shard_path, "rb") as in_f:
+            yield pickle.load(in_f)
+
+
+def estimate_memory(sentinel_to_anchor: dict, sample_size: int = MEMORY_SAMPLE_SIZE) -> dict:
+    """
+    Estimates the memory (bytes) taken by each component of a dictionary: the sentinel dictionary itself, the anchor lists, the Anchor objects, their Node objects and their reference path lists.
+    The containers are measured exactly, the anchors on an evenly spaced sample and the result extrapolated to all of them. Strings shared by several anchors (the reference path names) are counted once.
+    """
+    memory = {"sentinel_dict": getsizeof(sentinel_to_anchor), "anchor_lists": 0, "anchors": 0, "nodes": 0, "reference_paths": 0}
+    num_anchors = 0
+    for sentinel, anchor_list in sentinel_to_anchor.items():
+        memory["sentinel_dict"] += getsizeof(sentinel)
+        memory["anchor_lists"] += getsizeof(anchor_list)
+        num_anchors += len(anchor_list)
+
+    step = max(1, num_anchors // sample_size)
+    sampled, anchor_idx = 0, 0
+    path_names = {}
+    for anchor_list in sentinel_to_anchor.values():
+        for anchor in anchor_list:
+            if anchor_idx % step == 0:
+                sampled += 1
+                memory["anchors"] += getsizeof(anchor) + getsizeof(anchor.__dict__)
+                memory["nodes"] += getsizeof(anchor._nodes) + sum(getsizeof(node) + getsizeof(node.__dict__) for node in anchor._nodes)
+                memory["reference_paths"] += getsizeof(anchor.reference_paths_covered)
+                for path_name in anchor.reference_paths_covered:
+                    path_names[id(path_name)] = getsizeof(path_name)
+            anchor_idx += 1
+
+    scale = num_anchors / sampled if sampled else 0
+    for component in ("anchors", "nodes", "reference_paths"):
+        memory[component] = int(memory[component] * scale)
+    memory["reference_paths"] += sum(path_names.values())
+    memory["total"] = sum(memory.values())
+    return memory
+
+
+def dictionary_stats(dictionary_path: str) -> dict:
+    """
+    Computes the statistics of a dictionary (.pkl) or of a sharded dictionary (manifest .json), loading one shard at a time.
+
+    Parameters
+    ----------
+    dictionary_path : string
+        Path to the dictionary or to the manifest
+
+    Returns
+    -------
+    stats : dict
+        Counts, histograms (as lists of [value, count] or [bin_upper_bound, count]), memory estimate by component and number of anchors and snarls covered by each reference path
+    """
+    anchors_per_sentinel = []
+    snarl_ids, bp_lengths, node_counts = [], [], []
+    path_anchor_counts, path_snarls = Counter(), {}
+    memory = Counter()
+    num_shards = 0
+
+    for sentinel_to_anchor in iter_dictionaries(dictionary_path):
+        t0 = time.time()
+        num_shards += 1
+        anchors = [anchor for anchor_list in sentinel_to_anchor.values() for anchor in anchor_list]
+        anchors_per_sentinel.append(np.fromiter((len(anchor_list) for anchor_list in sentinel_to_anchor.values()), dtype=np.int64, count=len(sentinel_to_anchor)))
+        snarl_ids.append(np.fromiter((anchor.snarl_id for anchor in anchors), dtype=np.int64, count=len(anchors)))
+        bp_lengths.append(np.fromiter((anchor.basepairlength for anchor in anchors), dtype=np.int64, count=len(anchors)))
+        node_counts.append(np.fromiter((len(anchor) for anchor in anchors), dtype=np.int64, count=len(anchors)))
+        for anchor in anchors:
+            path_anchor_counts.update(anchor.reference_paths_covered)
+            for path_name in anchor.reference_paths_covered:
+                path_snarls.setdefault(path_name, set()).add(anchor.snarl_id)
+        memory.update(estimate_memory(sentinel_to_anchor))
+        print(f"Dictionary shard {num_shards} with {len(sentinel_to_anchor)} sentinels processed in {time.time()-t0:.2f}", file=stderr)
+        del sentinel_to_anchor, anchors
+
+    anchors_per_sentinel = np.concatenate(anchors_per_sentinel)
+    snarl_ids = np.concatenate(snarl_ids)
+    bp_lengths = np.concatenate(bp_lengths)
+    node_counts = np.concatenate(node_counts)
+    _, anchors_per_snarl = np.unique(snarl_ids, return_counts=True)
+
+    def value_histogram(values):
+        counts = np.bincount(values) if len(values) else np.zeros(0, dtype=np.int64)
+        return [[int(value), int(counts[value])] for value in np.flatnonzero(counts)]
+
+    bp_bins = np.searchsorted(BP_LENGTH_BINS, bp_lengths, side="left")
+    bp_bin_counts = np.bincount(bp_bins, minlength=len(BP_LENGTH_BINS) + 1)
+    bp_bin_labels = [str(bound) for bound in BP_LENGTH_BINS] + [f">{BP_LENGTH_BINS[-1]}"]
+
+    return {
+        "shards": num_shards,
+        "sentinels": int(len(anchors_per_sentinel)),
+        "anchors": int(len(snarl_ids)),
+        "snarls": int(len(anchors_per_snarl)),
+        "anchors_per_sentinel": value_histogram(anchors_per_sentinel),
+        "anchors_per_snarl": value_histogram(anchors_per_snarl),
+        "nodes_per_anchor": value_histogram(node_counts),
+        "bp_length": [[label, int(count)] for label, count in zip(bp_bin_labels, bp_bin_counts)],
+        "bp_length_mean": float(bp_lengths.mean()) if len(bp_lengths) else 0.0,
+        "memory_bytes": dict(memory),
+        "reference_paths": {
+            path_name: {"anchors": path_anchor_counts[path_name], "snarls": len(path_snarls[path_name])}
+            for path_name in sorted(path_anchor_counts)
+        },
+    }
+
+
+def print_dictionary_stats(stats: dict, out_f) -> None:
+    print(f"Shards\t{stats['shards']}\nSentinels\t{stats['sentinels']}\nAnchors\t{stats['anchors']}\nSnarls\t{stats['snarls']}", file=out_f)
+    for histogram_name in ("anchors_per_sentinel", "anchors_per_snarl", "nodes_per_anchor", "bp_length"):
+        print(f"\n# {histogram_name}", file=out_f)
+        for value, count in stats[histogram_name]:
+            print(f"{value}\t{count}", file=out_f)
+    print(f"\n# memory_bytes (estimated)", file=out_f)
+    for component, size in stats["memory_bytes"].items():
+        print(f"{component}\t{size}\t{size / 2**20:.1f} MiB", file=out_f)
+    print(f"\n# reference_paths\npath\tanchors\tsnarls", file=out_f)
+    for path_name, coverage in stats["reference_paths"].items():
+        print(f"{path_name}\t{coverage['anchors']}\t{coverage['snarls']}", file=out_f)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import copy
+import pickle
+import unittest
+from assembler.anchor import Anchor, assign_anchor_ids
+from assembler.flat_dictionary import FlatAnchorDictionary
+from assembler.node import Node
+
+
+def make_anchor(nodes) -> Anchor:
+    anchor = Anchor()
+    for node_id, orientation in nodes:
+        anchor.add(Node(node_id, 1, orientation))
+    return anchor
+
+
+class TestAnchorRepr(unittest.TestCase):
+    def test_repr_follows_node_changes(self):
+        anchor = make_anchor([(1, True), (2, True), (4, True)])
+        self.assertEqual(repr(anchor), ">1>2>4")
+        anchor.insert_node_through_extension(Node(5, 1, True), insert_left=False)
+        self.assertEqual(repr(anchor), ">1>2>4>5")
+        anchor.merge_anchor(make_anchor([(0, True), (1, True)]), insert_left=True)
+        self.assertEqual(repr(anchor), ">0>1>2>4>5")
+        anchor.flip_anchor()
+        self.assertEqual(repr(anchor), "<5<4<2<1<0")
+
+    def test_flip_of_anchor_sharing_nodes(self):
+        """merge_anchor shares the nodes of the merged anchor, flipping it leaves the path of the other one unchanged."""
+        anchor = make_anchor([(1, True), (2, True)])
+        other_anchor = make_anchor([(2, True), (3, True)])
+        anchor.merge_anchor(other_anchor)
+        self.assertEqual(repr(anchor), ">1>2>3")
+        other_anchor.flip_anchor()
+        self.assertEqual(repr(other_anchor), "<3<2")
+        self.assertEqual(repr(anchor), ">1>2>3")
+
+    def test_cache_not_pickled(self):
+        anchor = make_anchor([(1, True), (2, False)])
+        repr(anchor)
+        self.assertNotIn("_repr", pickle.loads(pickle.dumps(anchor)).__dict__)
+        new_anchor = copy.deepcopy(anchor)
+        new_anchor.insert_node_through_extension(Node(3, 1, False), insert_left=False)
+        self.assertEqual(repr(anchor), ">1<2")
+        self.assertEqual(repr(new_anchor), ">1<2<3")
+
+
+class TestAssignAnchorIds(unittest.TestCase):
+    def test_ids_kept_and_new_ones_after(self):
+        sentinel_to_anchor = {2: [make_anchor([(1, True), (2, True), (3, True)])], 5: [make_anchor([(4, True), (5, True), (6, True)])]}
+        self.assertEqual(assign_anchor_ids(sentinel_to_anchor, 10), 12)
+        self.assertEqual([anchors[0].anchor_id for anchors in sentinel_to_anchor.values()], [10, 11])
+        sentinel_to_anchor[8] = [make_anchor([(7, True), (8, True), (9, True)])]
+        self.assertEqual(assign_anchor_ids(sentinel_to_anchor), 13)
+        self.assertEqual([anchors[0].anchor_id for anchors in sentinel_to_anchor.values()], [10, 11, 12])
+
+    def test_flat_dictionary_ids_after_the_largest(self):
+        sentinel_to_anchor = {2: [make_anchor([(1, True), (2, True), (3, True)])], 5: [make_anchor([(4, True), (5, True), (6, True)])]}
+        sentinel_to_anchor[5][0].anchor_id = 0
+        flat_dictionary = FlatAnchorDictionary.from_dictionary(sentinel_to_anchor)
+        self.assertEqual([flat_dictionary[sentinel][0].anchor_id for sentinel in (2, 5)], [1, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
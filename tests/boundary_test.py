@@ -172,6 +172,28 @@ class TestVerifyBoundaryExtension(unittest.TestCase):
 
         self.verify_dictionary_concordance(expected_boundary_backward, self.dictionary_builder.snarl_boundaries[REVERSE_DICTIONARY] )
 
+    def test_gfa_build_matches_graph_build(self):
+        test_filename = "test_go_left"
+        graph_filename =  FILES_PATH + test_filename + ".vg"
+        gfa_filename =  FILES_PATH + test_filename + ".gfa"
+        distance_index_filename = FILES_PATH + test_filename + ".dist"
+        print(f"\n----\nTESTING {test_filename} GFA build\n-----",flush=True)
+
+        self.dictionary_builder.build(graph_filename, distance_index_filename)
+        self.dictionary_builder.fill_anchor_dictionary(extend=False)
+
+        gfa_dictionary_builder = AnchorDictionary()
+        gfa_dictionary_builder.build_from_gfa(gfa_filename, distance_index_filename)
+        gfa_dictionary_builder.fill_anchor_dictionary(extend=False)
+
+        # verify correctness
+        self.assertEqual(self.dictionary_builder.snarl_boundaries, gfa_dictionary_builder.snarl_boundaries)
+        self.assertEqual(self.dictionary_builder.sentinel_to_anchor.keys(), gfa_dictionary_builder.sentinel_to_anchor.keys())
+        for sentinel, anchor_list in self.dictionary_builder.sentinel_to_anchor.items():
+            gfa_anchor_list = gfa_dictionary_builder.sentinel_to_anchor[sentinel]
+            self.assertEqual([repr(anchor) for anchor in anchor_list], [repr(anchor) for anchor in gfa_anchor_list])
+            self.assertEqual([anchor.reference_paths_covered for anchor in anchor_list], [anchor.reference_paths_covered for anchor in gfa_anchor_list])
+
 
 
 if __name__ == "__main__":
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+from assembler.compatibility_cache import SnarlPairCache
+
+
+def make_cache() -> SnarlPairCache:
+    cache = SnarlPairCache()
+    cache.snarl_ids = [10, 20, 30]
+    cache.zygosity = [2, 2, 1]
+    # (earlier_idx, later_idx, shared_reads, earlier_sizes, later_sizes, intersections (later x earlier))
+    cache.add_pair(0, 1, 6, [3, 3], [3, 3], [[0, 3], [3, 0]])
+    cache.add_pair(1, 2, 4, [2, 2], [3, 1], [[2, 1], [0, 1]])
+    cache.add_pair(0, 2, 2, [1, 1], [1, 1], [[1, 0], [0, 1]])
+    return cache
+
+
+class TestSnarlPairCache(unittest.TestCase):
+    def test_dump_load_round_trip(self):
+        cache = make_cache()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_path = os.path.join(tmp_dir, "anc.snarl_pairs.npz")
+            cache.dump(cache_path)
+            loaded_cache = SnarlPairCache.load(cache_path)
+        self.assertEqual(loaded_cache.snarl_ids, cache.snarl_ids)
+        self.assertEqual(loaded_cache.zygosity, cache.zygosity)
+        self.assertEqual(loaded_cache.pairs, cache.pairs)
+        self.assertEqual(loaded_cache.evaluate(), cache.evaluate())
+
+    def test_evaluate(self):
+        cache = make_cache()
+        self.assertEqual(
+            cache.evaluate(linkage_threshold=3, error_tolerance=0, reliable_fraction=0.1, add_back_homo_snarls=True, min_reads=1),
+            [(10, 2, True, True, [20]), (20, 2, True, True, [10, 30]), (30, 1, False, True, [20])],
+        )
+        # the pair (10, 30) is linked, and compatible
+        self.assertEqual(
+            [decision[2] for decision in cache.evaluate(linkage_threshold=2, error_tolerance=0, reliable_fraction=0.1, add_back_homo_snarls=False, min_reads=1)],
+            [True, True, True],
+        )
+        # the partitions of (20, 30) differ by one read
+        self.assertEqual(
+            [decision[2] for decision in cache.evaluate(linkage_threshold=3, error_tolerance=0.5, reliable_fraction=0.6, add_back_homo_snarls=False, min_reads=1)],
+            [True, True, True],
+        )
+        self.assertEqual(
+            [decision[2:4] for decision in cache.evaluate(linkage_threshold=3, error_tolerance=0, reliable_fraction=0.6, add_back_homo_snarls=False, min_reads=1)],
+            [(True, True), (False, False), (False, False)],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+from assembler.cs_avail import CsAvailability
+
+
+class TestCsAvailability(unittest.TestCase):
+    def setUp(self):
+        # [READ_ID, READ_STRAND, ANCHOR_START, ANCHOR_END, MATCH_LIMIT, CS_LEFT_AVAIL, CS_RIGHT_AVAIL]
+        self.reads = [
+            ["read1", 0, 100, 120, 0, 5, 1],
+            ["read2", 1, 200, 220, 0, 2, 8],
+            ["read3", 0, 300, 320, 0, 3, 4],
+        ]
+
+    def test_max_bps_after_drops(self):
+        cs_avail = CsAvailability(self.reads, extend_left=True)
+        self.assertEqual([cs_avail.max_bps_after_drops(drops) for drops in range(3)], [3, 5, 8])
+        cs_avail.extend(2)
+        self.assertEqual(cs_avail.max_bps_after_drops(0), 1)
+
+    def test_extend_and_apply_to_reads(self):
+        cs_avail = CsAvailability(self.reads, extend_left=False)
+        self.assertEqual(cs_avail.extend(1), [])
+        self.assertEqual(cs_avail.extend(2), [0, 1])
+        self.assertEqual(len(cs_avail), 1)
+        self.assertEqual(cs_avail.apply_to_reads(self.reads), [["read3", 0, 300, 323, 0, 3, 1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+from assembler.drop_log import ReadDropLog
+
+
+class TestReadDropLog(unittest.TestCase):
+    def test_to_tracking_dict(self):
+        read_drop_log = ReadDropLog()
+        read_drop_log.add(4, 1, ">10>12>13", 1, ["read5", "read7"], "boundary_extension")
+        read_drop_log.add(6, 0, ">16>18>19", 1, ["read352"], "boundary_extension")
+        read_drop_log.add(4, 1, ">10>12>13", 2, ["read356"], "boundary_extension")
+
+        self.assertEqual(len(read_drop_log), 4)
+        self.assertEqual(read_drop_log.anchor_labels, [">10>12>13", ">16>18>19"])
+        self.assertEqual(
+            read_drop_log.to_tracking_dict(),
+            {4: {">10>12>13": {1: ["read5", "read7"], 2: ["read356"]}}, 6: {">16>18>19": {1: ["read352"]}}},
+        )
+
+    def test_extend(self):
+        read_drop_log = ReadDropLog()
+        read_drop_log.add(4, 1, ">10>12>13", 1, ["read5"], "boundary_extension")
+        other_read_drop_log = ReadDropLog()
+        other_read_drop_log.extend(read_drop_log.events())
+        self.assertEqual(list(other_read_drop_log.events()), [(4, 1, ">10>12>13", 1, "read5", "boundary_extension")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,8 +4,14 @@ import unittest
 from assembler.aligner import AlignAnchor
 from assembler.anchor import Anchor
 from assembler.node import Node
+from assembler.snarl_order import OrderedSnarlList
+from assembler.snapshot import AnchorSnapshot
+from assembler.constants import MIN_ANCHOR_LENGTH
+from assembler.chain_index import UnitigChainIndex, TopologyGraph
 from bdsg.bdsg import PackedGraph
+import numpy as np
 import os
+import random
 import tempfile
 
 class TestAnchorExtension(unittest.TestCase):
@@ -63,33 +69,33 @@ class TestAnchorExtension(unittest.TestCase):
     def test_extending_anchors_by_merging(self):
         """Test merging of anchors from adjacent snarls."""
         # Set up test data
-        snarl_ids = ["snarl1", "snarl2"]
+        snarl_order = OrderedSnarlList(["snarl1", "snarl2"])
         current_snarl_anchors = [self.anchor1]
         anchors_to_discard = []
         
         # Test merging
-        new_anchors, updated_idx = self.aligner._extending_anchors_by_merging(
-            snarl_ids, 0, "snarl1", "snarl2",
-            current_snarl_anchors, True, anchors_to_discard, True
+        new_anchors, cursor_snarl_id = self.aligner._extending_anchors_by_merging(
+            snarl_order, "snarl1", "snarl2",
+            current_snarl_anchors, True, anchors_to_discard, True, 0
         )
         
         # Verify results
         self.assertIsNotNone(new_anchors)
         self.assertGreater(len(new_anchors), 0)
-        self.assertIsInstance(updated_idx, int)
+        self.assertIn(cursor_snarl_id, snarl_order)
     
     def test_extending_anchors_to_1_degree_node(self):
         """Test extension of anchors into 1-degree nodes."""
         # Set up test data
         current_snarl_anchors = [self.anchor1]
         anchors_to_discard = []
-        snarl_ids = ["snarl1"]
+        snarl_order = OrderedSnarlList(["snarl1"])
         
         # Test extension
         extended_anchors = self.aligner._extending_anchors_to_1_degree_node(
             self.node3, self.node2, "snarl1",
             current_snarl_anchors, True, anchors_to_discard,
-            snarl_ids, 0
+            snarl_order
         )
         
         # Verify results
@@ -118,13 +124,13 @@ class TestAnchorExtension(unittest.TestCase):
         # Set up test data
         current_snarl_anchors = [self.anchor1]
         anchors_to_discard = []
-        snarl_ids = ["snarl1"]
+        snarl_order = OrderedSnarlList(["snarl1"])
         
         # Test extension with different iterations
         for iteration in range(3):
             self.aligner._extending_snarl_boundaries(
                 current_snarl_anchors, "snarl1",
-                snarl_ids, 0, anchors_to_discard, iteration
+                snarl_order, anchors_to_discard, iteration
             )
             
             # Verify results after each iteration
@@ -136,22 +142,169 @@ class TestAnchorExtension(unittest.TestCase):
         # Record initial coverage
         for read in self.test_reads:
             self.aligner.anchor_coverage.record_initial_coverage(
-                f"{self.anchor1!r}", read[0]
+                self.anchor1, read[0]
             )
         
         # Verify initial coverage
-        initial_coverage = self.aligner.anchor_coverage.initial_coverage[f"{self.anchor1!r}"]
+        initial_coverage = self.aligner.anchor_coverage.initial_coverage[self.anchor1.anchor_id]
         self.assertEqual(initial_coverage, len(self.test_reads))
         
         # Simulate extension and record final coverage
         for read in self.test_reads:
             self.aligner.anchor_coverage.record_final_coverage(
-                f"{self.anchor1!r}", read[0]
+                self.anchor1, read[0]
             )
         
         # Verify final coverage
-        final_coverage = self.aligner.anchor_coverage.final_coverage[f"{self.anchor1!r}"]
+        final_coverage = self.aligner.anchor_coverage.final_coverage[self.anchor1.anchor_id]
         self.assertEqual(final_coverage, len(self.test_reads))
 
+
+class TestIndependentExtensionOffset(unittest.TestCase):
+    def test_find_best_subsequence_left_side_offset(self):
+        """Test that the offset supported by the most reads is selected, reverse strand reads having their cs_avail swapped."""
+        anchor = Anchor()
+        anchor.add(Node(1, 100, True))
+        anchor.add(Node(2, 150, True))
+        anchor.bp_occupied_start_node = 1
+        anchor.bp_occupied_end_node = 1
+        snapshot = AnchorSnapshot(anchor)
+        missing_bps = MIN_ANCHOR_LENGTH - snapshot.basepairlength
+        # (read_id, strand, ..., cs_left_avail, cs_right_avail)
+        snapshot.bp_matched_reads = (
+            ("read1", 0, 0, 0, 0, missing_bps, 0),
+            ("read2", 1, 0, 0, 0, 0, missing_bps),
+            ("read3", 0, 0, 0, 0, 0, missing_bps),
+        )
+
+        offset, supporting_reads = AlignAnchor()._helper_find_best_subsequence_left_side_offset(snapshot, missing_bps, missing_bps)
+        self.assertEqual(offset, missing_bps)
+        self.assertEqual([read[0] for read in supporting_reads], ["read1", "read2"])
+
+        # no bps available on either side
+        self.assertEqual(AlignAnchor()._helper_find_best_subsequence_left_side_offset(snapshot, 0, 0), (MIN_ANCHOR_LENGTH, []))
+
+
+
+class TestExtensionBlocks(unittest.TestCase):
+    def test_find_extension_blocks(self):
+        """Test that the snarls extended in a het round are split in runs between the guard snarls."""
+        aligner = AlignAnchor()
+        snarl_anchor_lengths = {"s1": [1, 1], "s2": [1, 1], "s3": [1], "s4": [1, 1], "s5": [MIN_ANCHOR_LENGTH, MIN_ANCHOR_LENGTH], "s6": [1, 1]}
+        for snarl_id, lengths in snarl_anchor_lengths.items():
+            anchors = []
+            for length in lengths:
+                anchor = Anchor()
+                anchor.basepairlength = length
+                anchors.append(anchor)
+            aligner.snarl_to_anchors_dictionary[snarl_id] = anchors
+
+        blocks = aligner._helper_find_extension_blocks(OrderedSnarlList(snarl_anchor_lengths), is_het_round=True)
+        self.assertEqual(blocks, [["s1", "s2", "s3"], ["s3", "s4", "s5"], ["s5", "s6"]])
+        blocks = aligner._helper_find_extension_blocks(OrderedSnarlList(snarl_anchor_lengths), is_het_round=False)
+        self.assertEqual(blocks, [["s2", "s3", "s4"]])
+
+    def make_aligner(self, threads: int) -> AlignAnchor:
+        """
+        An aligner on a TopologyGraph of 5 bubbles (snarls 0 to 4), the het ones (0, 2, 4) with two anchors and the hom ones with one, joined by chains of 3 degree 1 nodes.
+        The nodes of snarl k are 100k + 1 (start, 4 bp), 100k + 2 and 100k + 3 (alleles, 5 bp), 100k + 4 (end, 4 bp) and 100k + 5 to 100k + 7 (chain to the next snarl, 6 bp).
+        """
+        rng = random.Random(0)
+        topology = UnitigChainIndex()
+        lengths, degrees, neighbors = [], [], []
+
+        def add_node(node_id, length, right_neighbors, left_neighbors):
+            topology.node_rows[node_id] = len(lengths)
+            lengths.append(length)
+            degrees.append([len(right_neighbors), len(left_neighbors)])
+            neighbors.append([right_neighbors[0] if len(right_neighbors) == 1 else 0, left_neighbors[0] if len(left_neighbors) == 1 else 0])
+
+        aligner = AlignAnchor()
+        aligner.threads = threads
+        num_snarls = 5
+        for snarl_id in range(num_snarls):
+            base = 100 * snarl_id
+            add_node(base + 1, 4, [base + 2, base + 3], [base - 93] if snarl_id > 0 else [])
+            add_node(base + 2, 5, [base + 4], [base + 1])
+            add_node(base + 3, 5, [base + 4], [base + 1])
+            add_node(base + 4, 4, [base + 5] if snarl_id < num_snarls - 1 else [], [base + 2, base + 3])
+            if snarl_id < num_snarls - 1:
+                add_node(base + 5, 6, [base + 6], [base + 4])
+                add_node(base + 6, 6, [base + 7], [base + 5])
+                add_node(base + 7, 6, [base + 101], [base + 6])
+            for allele_node_id in ((base + 2, base + 3) if snarl_id % 2 == 0 else (base + 2,)):
+                anchor = Anchor()
+                for node_id, length in ((base + 1, 4), (allele_node_id, 5), (base + 4, 4)):
+                    anchor.add(Node(node_id, length, True))
+                anchor.snarl_id = snarl_id
+                anchor.bp_occupied_start_node = anchor.bp_occupied_end_node = 1
+                anchor.compute_bp_length()
+                anchor.compute_snarl_boundary()
+                for read_idx in range(14):
+                    anchor.bp_matched_reads.append([f"read{snarl_id}_{allele_node_id}_{read_idx}", rng.randint(0, 1), 0, 0, 0, rng.randint(0, 40), rng.randint(0, 40)])
+                aligner.snarl_to_anchors_dictionary[snarl_id].append(anchor)
+        topology.lengths = np.array(lengths, dtype=np.int64)
+        topology.degrees = np.array(degrees, dtype=np.int64)
+        topology.neighbors = np.array(neighbors, dtype=np.int64)
+        aligner.graph = TopologyGraph(topology)
+        return aligner
+
+    def test_parallel_round_same_as_serial(self):
+        """Test that the extension rounds give the same anchors and read drops with the blocks extended in parallel."""
+        aligner_results = []
+        for threads in (1, 2):
+            aligner = self.make_aligner(threads)
+            snarl_order = OrderedSnarlList(range(5))
+            if threads > 1:
+                self.assertEqual(aligner._helper_find_extension_blocks(snarl_order, is_het_round=True), [[0, 1], [1, 2, 3], [3, 4]])
+            for is_het_round in (True, False):
+                for extension_iteration in range(3):
+                    aligner._helper_extension_loop(snarl_order, [], extension_iteration, is_het_round)
+            aligner_results.append((
+                [
+                    (repr(anchor), anchor.bp_occupied_start_node, anchor.bp_occupied_end_node, anchor.basepairlength, anchor.bp_matched_reads)
+                    for snarl_id in snarl_order
+                    for anchor in aligner.snarl_to_anchors_dictionary[snarl_id]
+                ],
+                list(aligner.read_drop_log.events()),
+            ))
+        serial_results, parallel_results = aligner_results
+        self.assertEqual(parallel_results, serial_results)
+        # the anchors were extended and some reads dropped
+        self.assertGreater(len(serial_results[0][0][0]), len(">1>2>4"))
+        self.assertGreater(len(serial_results[1]), 0)
+
+
+class TestCheckpoint(unittest.TestCase):
+    def test_checkpoint_round_trip(self):
+        """Test that only the matched sentinels are stored, and restored with their reads and the counters."""
+        aligner = AlignAnchor()
+        for sentinel, node_ids in ((2, (1, 2, 3)), (5, (4, 5, 6))):
+            anchor = Anchor()
+            for node_id in node_ids:
+                anchor.add(Node(node_id, 10, True))
+            aligner.sentinel_to_anchor[sentinel] = [anchor]
+            aligner.anchor_reads_dict[sentinel] = [[]]
+        aligner.sentinel_to_anchor[5][0].bp_matched_reads.append(["read1", 0, 5, 25, 0, 3, 3])
+        aligner.anchor_reads_dict[5][0].append(["read1", True, 5, 25])
+        aligner.reads_matching_anchor_path = aligner.reads_matching_anchor_sequence = 1
+        aligner.max_read_length = 100
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # an existing topology, so that the graph is not deserialized
+            aligner.topology_path = os.path.join(tmp_dir, "dict.topology.npz")
+            open(aligner.topology_path, "wb").close()
+            checkpoint_path = os.path.join(tmp_dir, "anc.checkpoint.pkl")
+            aligner.dump_checkpoint(checkpoint_path)
+            resumed_aligner = AlignAnchor()
+            resumed_aligner.load_checkpoint(checkpoint_path, os.path.join(tmp_dir, "graph.vg"))
+
+        self.assertEqual(list(resumed_aligner.sentinel_to_anchor), [5])
+        self.assertEqual(repr(resumed_aligner.sentinel_to_anchor[5][0]), ">4>5>6")
+        self.assertEqual(resumed_aligner.sentinel_to_anchor[5][0].bp_matched_reads, [["read1", 0, 5, 25, 0, 3, 3]])
+        self.assertEqual(resumed_aligner.anchor_reads_dict, {5: [[["read1", True, 5, 25]]]})
+        self.assertEqual((resumed_aligner.reads_matching_anchor_sequence, resumed_aligner.max_read_length), (1, 100))
+
+
 if __name__ == '__main__':
     unittest.main()
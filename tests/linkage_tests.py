@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import random
+import unittest
+from assembler.aligner import AlignAnchor
+from assembler.anchor import Anchor
+
+
+def make_aligner(seed: int = 0) -> AlignAnchor:
+    """
+    An aligner with 6 snarls of 2 anchors each, on chromosome chr1 (snarls 1-4) and chr2 (snarls 5-6), 1000 bp apart. Each read matches one anchor of up to 2 consecutive snarls of the same chromosome.
+    """
+    rng = random.Random(seed)
+    aligner = AlignAnchor()
+    snarl_positions = {1: ("chr1", 1000), 2: ("chr1", 2000), 3: ("chr1", 3000), 4: ("chr1", 4000), 5: ("chr2", 1000), 6: ("chr2", 2000)}
+    for snarl_id, (chromosome, position) in snarl_positions.items():
+        for _ in range(2):
+            anchor = Anchor()
+            anchor.snarl_id = snarl_id
+            anchor.chromosome = chromosome
+            anchor.genomic_position = position
+            aligner.snarl_to_anchors_dictionary[snarl_id].append(anchor)
+    snarl_runs = [[1, 2], [2, 3], [3, 4], [4], [5, 6], [6]]
+    for read_idx in range(120):
+        for snarl_id in rng.choice(snarl_runs):
+            rng.choice(aligner.snarl_to_anchors_dictionary[snarl_id]).bp_matched_reads.append([f"read{read_idx}", 0, 0, 0, 0, 0, 0])
+    aligner.snarl_ids_sorted = sorted(aligner.snarl_to_anchors_dictionary)
+    aligner.max_read_length = 1500
+    aligner.build_read_to_snarl_index()
+    return aligner
+
+
+def linked_snarls_from_sets(aligner: AlignAnchor, current_snarl_id, linkage_threshold: int) -> dict:
+    """
+    The linked snarls of a snarl, comparing the read sets of its anchors with the ones of every other snarl.
+    """
+    anchor_reads = {
+        snarl_id: [{read[0] for read in anchor.bp_matched_reads} for anchor in anchors]
+        for snarl_id, anchors in aligner.snarl_to_anchors_dictionary.items()
+    }
+    current_reads = set().union(*anchor_reads[current_snarl_id])
+    linked_snarl_counts = {}
+    for other_snarl_id in aligner.snarl_ids_sorted:
+        if other_snarl_id == current_snarl_id:
+            continue
+        shared_reads = current_reads & set().union(*anchor_reads[other_snarl_id])
+        current_partitions = sum(1 for reads in anchor_reads[current_snarl_id] if reads & shared_reads)
+        other_partitions = sum(1 for reads in anchor_reads[other_snarl_id] if reads & shared_reads)
+        if len(shared_reads) >= linkage_threshold and current_partitions >= 2 and other_partitions >= 2:
+            linked_snarl_counts[other_snarl_id] = len(shared_reads)
+    return linked_snarl_counts
+
+
+class TestReadToSnarlIndex(unittest.TestCase):
+    def test_linked_snarls_from_the_read_index(self):
+        for seed in range(5):
+            aligner = make_aligner(seed)
+            for snarl_id in aligner.snarl_ids_sorted:
+                linked_snarl_counts = aligner._find_linked_snarls_for_current_snarl(snarl_id, linkage_threshold=3)
+                self.assertEqual(linked_snarl_counts, linked_snarls_from_sets(aligner, snarl_id, 3))
+                self.assertEqual(list(linked_snarl_counts), sorted(linked_snarl_counts))
+                self.assertEqual(aligner.snarl_coverage_dict[snarl_id], len(aligner.snarl_read_bitsets[snarl_id]))
+
+
+
+class TestSnarlWindows(unittest.TestCase):
+    def test_window_bounds_across_chromosomes(self):
+        aligner = make_aligner()
+        aligner.build_snarl_windows()
+        window_snarl_ids = {
+            snarl_id: aligner.window_snarl_ids[window_start:window_end]
+            for snarl_id, (window_start, window_end) in aligner.snarl_window_ranges.items()
+        }
+        # windows of 1650 bp around each snarl, not crossing to the other chromosome
+        self.assertEqual(window_snarl_ids, {1: [1, 2], 2: [1, 2, 3], 3: [2, 3, 4], 4: [3, 4], 5: [5, 6], 6: [5, 6]})
+        self.assertEqual(aligner.unplaced_snarl_ids, [])
+
+    def test_unplaced_snarls_in_every_window(self):
+        aligner = make_aligner()
+        for anchor in aligner.snarl_to_anchors_dictionary[2]:
+            anchor.genomic_position = 0
+        aligner.build_snarl_windows()
+        self.assertEqual(aligner.unplaced_snarl_ids, [2])
+        self.assertEqual(aligner._window_candidate_snarls(1), [1, 2])
+        self.assertEqual(aligner._window_candidate_snarls(3), [3, 4, 2])
+        self.assertEqual(aligner._window_candidate_snarls(2), aligner.snarl_ids_sorted)
+
+    def test_same_linked_snarls_as_reads_mode(self):
+        for seed in range(5):
+            aligner = make_aligner(seed)
+            if seed % 2:
+                for anchor in aligner.snarl_to_anchors_dictionary[3]:
+                    anchor.genomic_position = 0
+            aligner.build_snarl_windows()
+            for snarl_id in aligner.snarl_ids_sorted:
+                aligner.linkage_mode = "reads"
+                reads_linked_snarl_counts = aligner._find_linked_snarls_for_current_snarl(snarl_id, linkage_threshold=3)
+                aligner.linkage_mode = "window"
+                self.assertEqual(aligner._find_linked_snarls_for_current_snarl(snarl_id, linkage_threshold=3), reads_linked_snarl_counts)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import unittest
+from assembler.merge_worklist import SnarlAdjacency, MergeWorklist
+from assembler.snarl_order import OrderedSnarlList
+
+
+class TestMergeWorklist(unittest.TestCase):
+    def setUp(self):
+        self.snarl_order = OrderedSnarlList([1, 2, 3, 4])
+        self.merge_worklist = MergeWorklist(self.snarl_order)
+
+    def test_lowest_read_drop_first(self):
+        self.merge_worklist.push(3, 2, 1, True)
+        self.merge_worklist.push(1, 2, 3, False)
+        self.merge_worklist.push(1, 3, 4, False)
+        self.assertEqual(self.merge_worklist.pop(), (2, 3, False))
+        self.assertEqual(self.merge_worklist.pop(), (3, 4, False))
+        self.assertEqual(self.merge_worklist.pop(), (2, 1, True))
+        self.assertIsNone(self.merge_worklist.pop())
+
+    def test_candidates_of_merged_snarls_are_skipped(self):
+        self.merge_worklist.push(0, 2, 3, False)
+        self.merge_worklist.push(1, 3, 2, True)
+        self.merge_worklist.push(2, 4, 3, True)
+        self.merge_worklist.push(3, 1, 2, False)
+        # 2 merged with 3, as _extending_anchors_by_merging does
+        self.assertEqual(self.merge_worklist.pop(), (2, 3, False))
+        self.snarl_order.replace(2, "2-3")
+        self.snarl_order.remove(3)
+        self.merge_worklist.push(5, 4, "2-3", True)
+        self.assertEqual(self.merge_worklist.pop(), (4, "2-3", True))
+        self.assertIsNone(self.merge_worklist.pop())
+
+
+class TestSnarlAdjacency(unittest.TestCase):
+    def test_can_merge(self):
+        adjacency = SnarlAdjacency(shared_node_id=5, left_degree=2, right_degree=1, bp_occupied_fits=True, common_reads=4)
+        self.assertTrue(adjacency.can_merge(extend_left=True))
+        self.assertFalse(adjacency.can_merge(extend_left=False))
+        self.assertFalse(SnarlAdjacency(common_reads=4).can_merge(extend_left=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+import unittest
+from assembler.parallel import split_in_chunks, map_on_fork
+
+
+class SquareSum:
+    def __init__(self, offset: int) -> None:
+        self.offset = offset
+
+    def sum_chunk(self, chunk: list) -> int:
+        return sum(self.offset + item * item for item in chunk)
+
+
+class TestSplitInChunks(unittest.TestCase):
+    def test_contiguous_chunks_in_order(self):
+        items = list(range(10))
+        chunks = split_in_chunks(items, 4)
+        self.assertEqual(chunks, [[0, 1, 2], [3, 4, 5], [6, 7], [8, 9]])
+        self.assertEqual([item for chunk in chunks for item in chunk], items)
+
+    def test_more_chunks_than_items(self):
+        self.assertEqual(split_in_chunks([1, 2], 5), [[1], [2]])
+        self.assertEqual(split_in_chunks([], 3), [[]])
+
+
+class TestMapOnFork(unittest.TestCase):
+    def test_results_in_chunk_order(self):
+        state = SquareSum(1)
+        chunks = split_in_chunks(list(range(20)), 6)
+        serial_results = map_on_fork(state, "sum_chunk", chunks, threads=1)
+        self.assertEqual(serial_results, [sum(1 + item * item for item in chunk) for chunk in chunks])
+        self.assertEqual(map_on_fork(state, "sum_chunk", chunks, threads=3), serial_results)
+
+
+if __name__ == '__main__':
+    unittest.main()
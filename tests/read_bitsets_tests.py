@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import random
+import unittest
+from assembler.compatibility_cache import are_partitions_compatible
+from assembler.read_bitsets import ReadBitset, ReadInterner
+
+
+def are_sets_compatible(primary_sets: list, other_sets: list, error_tolerance: float, min_reads: int) -> tuple:
+    """
+    The set-based check of AlignAnchor._are_snarls_compatible before the read partitions were stored as bitsets.
+    """
+    if len(primary_sets) != len(other_sets):
+        return (False, "False")
+    other_sets_copy = list(other_sets)
+    for primary_set in primary_sets:
+        best_matched_intersection_set_size = 0
+        best_matched_other_set = None
+        for other_set in other_sets_copy:
+            intersection_set = primary_set & other_set
+            if (len(primary_set) - len(intersection_set) <= len(primary_set) * error_tolerance) and (len(other_set) - len(intersection_set) <= len(other_set) * error_tolerance):
+                if len(intersection_set) > best_matched_intersection_set_size:
+                    best_matched_intersection_set_size = len(intersection_set)
+                    best_matched_other_set = other_set
+        if best_matched_intersection_set_size == 0:
+            return (False, "False")
+        other_sets_copy.remove(best_matched_other_set)
+    for primary_set in primary_sets:
+        if len(primary_set) < min_reads:
+            return (False, "False_lowCov")
+    return (True, "True")
+
+
+class TestReadBitset(unittest.TestCase):
+    def test_operations_with_different_offsets(self):
+        low_ids, high_ids = {3, 5, 9, 20}, {9, 20, 21, 70}
+        low_bitset, high_bitset = ReadBitset.from_ids(low_ids), ReadBitset.from_ids(high_ids)
+        self.assertEqual((low_bitset.offset, high_bitset.offset), (3, 9))
+        for first_bitset, second_bitset in ((low_bitset, high_bitset), (high_bitset, low_bitset)):
+            self.assertEqual((first_bitset & second_bitset).ids(), sorted(low_ids & high_ids))
+            self.assertEqual((first_bitset | second_bitset).ids(), sorted(low_ids | high_ids))
+        self.assertEqual(len(low_bitset), 4)
+        self.assertEqual(len(low_bitset & ReadBitset.from_ids([100])), 0)
+        self.assertFalse(low_bitset & ReadBitset.from_ids([100]))
+        self.assertEqual((ReadBitset() | high_bitset).ids(), sorted(high_ids))
+        self.assertTrue(ReadBitset.from_ids([9, 20]).issubset(high_bitset))
+        self.assertEqual(ReadBitset.union([low_bitset, high_bitset, ReadBitset()]).ids(), sorted(low_ids | high_ids))
+
+    def test_interner(self):
+        read_interner = ReadInterner()
+        read_ids = [read_interner.intern(read_name) for read_name in ("read2", "read1", "read2")]
+        self.assertEqual(read_ids, [0, 1, 0])
+        self.assertEqual(read_interner.names(ReadBitset.from_ids([1, 0])), ["read2", "read1"])
+
+
+class TestArePartitionsCompatible(unittest.TestCase):
+    def test_same_result_as_set_check(self):
+        """Compares the check on partition sizes with the set-based one on random partitions of the shared reads."""
+        rng = random.Random(0)
+        for _ in range(500):
+            shared_reads = list(range(rng.randint(2, 30)))
+            primary_sets = [set(rng.sample(shared_reads, rng.randint(1, len(shared_reads)))) for _ in range(rng.randint(1, 3))]
+            other_sets = [set(rng.sample(shared_reads, rng.randint(1, len(shared_reads)))) for _ in range(rng.randint(1, 3))]
+            if rng.random() < 0.3:
+                # partitions differing by at most one read
+                other_sets = [set(primary_set) for primary_set in reversed(primary_sets)]
+                other_sets[0].discard(rng.choice(shared_reads))
+                other_sets = [other_set for other_set in other_sets if other_set]
+            error_tolerance, min_reads = rng.choice((0.0, 0.1, 0.3)), rng.choice((1, 3))
+
+            primary_bitsets = [ReadBitset.from_ids(primary_set) for primary_set in primary_sets]
+            other_bitsets = [ReadBitset.from_ids(other_set) for other_set in other_sets]
+            intersection_sizes = [[len(primary_bitset & other_bitset) for other_bitset in other_bitsets] for primary_bitset in primary_bitsets]
+            self.assertEqual(
+                are_partitions_compatible([len(primary_bitset) for primary_bitset in primary_bitsets], [len(other_bitset) for other_bitset in other_bitsets], intersection_sizes, error_tolerance, min_reads),
+                are_sets_compatible(primary_sets, other_sets, error_tolerance, min_reads),
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+import unittest
+from assembler.aligner import shard_overlaps_node_range
+from assembler.builder import path_has_prefix
+from assembler.chain_index import UnitigChainIndex
+import numpy as np
+
+
+class TestPathHasPrefix(unittest.TestCase):
+    def test_prefix_followed_by_delimiter(self):
+        self.assertTrue(path_has_prefix("chr1", "chr1"))
+        self.assertTrue(path_has_prefix("CHM13#0#chr1", "CHM13"))
+        self.assertTrue(path_has_prefix("chr1:100-200", "chr1"))
+        self.assertTrue(path_has_prefix("HG002#1#chr1", "HG002#"))
+        self.assertFalse(path_has_prefix("chr10", "chr1"))
+        self.assertFalse(path_has_prefix("chr2", "chr1"))
+
+
+class TestShardOverlapsNodeRange(unittest.TestCase):
+    def test_node_id_intervals(self):
+        shard = {"min_node_id": 1, "max_node_id": 500, "node_id_intervals": [[1, 100], [300, 500]]}
+        self.assertTrue(shard_overlaps_node_range(shard, 50, 60))
+        self.assertTrue(shard_overlaps_node_range(shard, 150, 300))
+        self.assertFalse(shard_overlaps_node_range(shard, 150, 250))
+        self.assertFalse(shard_overlaps_node_range(shard, 501, 600))
+
+    def test_manifest_without_intervals(self):
+        shard = {"min_node_id": 1, "max_node_id": 500}
+        self.assertTrue(shard_overlaps_node_range(shard, 150, 250))
+        self.assertFalse(shard_overlaps_node_range(shard, 501, 600))
+
+
+
+class TestMergeShardTopologies(unittest.TestCase):
+    def test_union_of_the_nodes(self):
+        shard0_topology = UnitigChainIndex()
+        shard0_topology.node_rows = {1: 0, 2: 1}
+        shard0_topology.lengths = np.array([10, 20])
+        shard0_topology.degrees = np.array([[1, 0], [0, 1]])
+        shard0_topology.neighbors = np.array([[2, 0], [0, 1]])
+        shard1_topology = UnitigChainIndex()
+        shard1_topology.node_rows = {3: 0, 2: 1}
+        shard1_topology.lengths = np.array([30, 20])
+        shard1_topology.degrees = np.array([[2, 1], [0, 1]])
+        shard1_topology.neighbors = np.array([[0, -2], [0, 1]])
+
+        topology = UnitigChainIndex.merge([shard0_topology, shard1_topology])
+        self.assertEqual(sorted(topology.node_rows), [1, 2, 3])
+        self.assertEqual([topology.length(node_id) for node_id in (1, 2, 3)], [10, 20, 30])
+        self.assertEqual(topology.follow(1, False, False), (2, False))
+        self.assertEqual(topology.follow(3, False, True), (2, True))
+        self.assertEqual(topology.degree(3, False, False), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+import unittest
+from assembler.snarl_order import OrderedSnarlList
+
+
+class TestOrderedSnarlList(unittest.TestCase):
+    def setUp(self):
+        self.snarl_order = OrderedSnarlList([1, 2, 3, 4, 5])
+
+    def test_neighbors(self):
+        self.assertEqual(self.snarl_order.first(), 1)
+        self.assertEqual(self.snarl_order.last(), 5)
+        self.assertIsNone(self.snarl_order.prev(1))
+        self.assertEqual(self.snarl_order.next(3), 4)
+        self.assertIsNone(self.snarl_order.next(5))
+        self.assertEqual(self.snarl_order.neighborhood(3, 1, 2), [2, 3, 4])
+
+    def test_merge_replaces_both_snarls(self):
+        """Merging 3 with its left snarl, as _extending_anchors_by_merging does."""
+        self.snarl_order.replace(3, "2-3")
+        self.snarl_order.remove(2)
+        self.assertEqual(list(self.snarl_order), [1, "2-3", 4, 5])
+        self.assertEqual(self.snarl_order.prev("2-3"), 1)
+        self.assertEqual(self.snarl_order.next("2-3"), 4)
+        self.assertEqual(len(self.snarl_order), 4)
+        self.assertNotIn(2, self.snarl_order)
+
+    def test_remove_ends(self):
+        self.snarl_order.remove(1)
+        self.snarl_order.remove(5)
+        self.assertEqual(list(self.snarl_order), [2, 3, 4])
+        self.assertEqual(self.snarl_order.first(), 2)
+        self.assertEqual(self.snarl_order.last(), 4)
+
+    def test_iteration_during_removal(self):
+        visited = []
+        for snarl_id in self.snarl_order:
+            visited.append(snarl_id)
+            if snarl_id in (2, 3):
+                self.snarl_order.remove(snarl_id)
+        self.assertEqual(visited, [1, 2, 3, 4, 5])
+        self.assertEqual(list(self.snarl_order), [1, 4, 5])
+
+    def test_duplicate_snarl(self):
+        with self.assertRaises(ValueError):
+            self.snarl_order.insert_before(3, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
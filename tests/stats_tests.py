@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import pickle
+import tempfile
+import unittest
+from assembler.anchor import Anchor
+from assembler.node import Node
+from assembler.stats import dictionary_stats
+
+
+def make_anchor(snarl_id: int, num_nodes: int, basepairlength: int, reference_paths: list) -> Anchor:
+    anchor = Anchor()
+    for node_id in range(num_nodes):
+        anchor.add(Node(100 * snarl_id + node_id, 10, True))
+    anchor.snarl_id = snarl_id
+    anchor.basepairlength = basepairlength
+    anchor.reference_paths_covered = list(reference_paths)
+    return anchor
+
+
+class TestDictionaryStats(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        shard_dictionaries = [
+            {
+                2: [make_anchor(1, 3, 10, ["CHM13#0#chr1", "HG1#1#chr1"]), make_anchor(1, 3, 20, ["HG1#1#chr1"])],
+                5: [make_anchor(2, 4, 40, ["CHM13#0#chr1"])],
+            },
+            {
+                8: [make_anchor(3, 3, 16, ["CHM13#0#chr1"])],
+            },
+        ]
+        shards = []
+        for shard_id, sentinel_to_anchor in enumerate(shard_dictionaries):
+            shard_path = os.path.join(self.tmp_dir.name, f"dict.shard{shard_id}.pkl")
+            with open(shard_path, "wb") as out_f:
+                pickle.dump(sentinel_to_anchor, out_f)
+            shards.append({"shard_id": shard_id, "dictionary": shard_path})
+        self.dictionary_path = shards[0]["dictionary"]
+        self.manifest_path = os.path.join(self.tmp_dir.name, "dict.manifest.json")
+        with open(self.manifest_path, "w") as out_f:
+            json.dump({"shards": shards}, out_f)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_dictionary(self):
+        stats = dictionary_stats(self.dictionary_path)
+        self.assertEqual((stats["shards"], stats["sentinels"], stats["anchors"], stats["snarls"]), (1, 2, 3, 2))
+        self.assertEqual(stats["anchors_per_sentinel"], [[1, 1], [2, 1]])
+        self.assertEqual(stats["anchors_per_snarl"], [[1, 1], [2, 1]])
+        self.assertEqual(stats["nodes_per_anchor"], [[3, 2], [4, 1]])
+        self.assertEqual([bp_bin for bp_bin in stats["bp_length"] if bp_bin[1]], [["16", 1], ["32", 1], ["64", 1]])
+        self.assertAlmostEqual(stats["bp_length_mean"], 70 / 3)
+        self.assertEqual(stats["reference_paths"], {"CHM13#0#chr1": {"anchors": 2, "snarls": 2}, "HG1#1#chr1": {"anchors": 2, "snarls": 1}})
+        self.assertGreater(stats["memory_bytes"]["total"], 0)
+
+    def test_manifest(self):
+        stats = dictionary_stats(self.manifest_path)
+        self.assertEqual((stats["shards"], stats["sentinels"], stats["anchors"], stats["snarls"]), (2, 3, 4, 3))
+        self.assertEqual(stats["anchors_per_snarl"], [[1, 2], [2, 1]])
+        self.assertEqual([bp_bin for bp_bin in stats["bp_length"] if bp_bin[1]], [["16", 2], ["32", 1], ["64", 1]])
+        self.assertEqual(stats["reference_paths"]["CHM13#0#chr1"], {"anchors": 3, "snarls": 3})
+
+
+if __name__ == '__main__':
+    unittest.main()